@@ -0,0 +1,299 @@
+# app/attendance_counters.py
+"""
+Live "X of Y reported" attendance counters per miqaat, team and duty
+
+A miqaat's active assignments and attendance are read once (two queries)
+and folded into counters; after that every committed attendance insert
+and guard duty assignment/removal adjusts them in O(1). A snapshot is
+built once per change and shared by every reader, so a dashboard
+refresh costs the same however many guards have reported.
+
+Counters are per worker: changes committed by other workers show up at
+the next reload, after ATTENDANCE_COUNTERS_RESYNC_SECONDS. Async readers
+go through load_counters(), which runs that reload in the threadpool
+once per miqaat however many requests and streams are waiting on it.
+"""
+from app.config import pg_table
+from app.db import get_sync_db_connection
+from app.events import EVENTS_HEARTBEAT_SECONDS
+from psycopg2.extras import RealDictCursor
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, Dict
+from datetime import datetime
+import asyncio
+import threading
+import itertools
+import time
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ATTENDANCE_COUNTERS_RESYNC_SECONDS = int(os.getenv("ATTENDANCE_COUNTERS_RESYNC_SECONDS", "60"))
+ATTENDANCE_COUNTERS_PUSH_SECONDS = float(os.getenv("ATTENDANCE_COUNTERS_PUSH_SECONDS", "2"))
+
+
+class AttendanceCounters:
+    """
+    miqaat_id -> reported/expected totals, per team and per duty
+
+    expected is the number of active guard assignments; reported counts
+    guards with attendance (by the team they scanned in with, and by the
+    duty they are assigned to). A guard is assumed to hold at most one
+    active assignment per miqaat.
+    """
+
+    def __init__(self, resync_seconds: int = ATTENDANCE_COUNTERS_RESYNC_SECONDS):
+        self.resync_seconds = resync_seconds
+        self._lock = threading.Lock()
+        self._miqaats: Dict[int, dict] = {}
+        self._versions = itertools.count(1)
+
+    # ----- loading -----
+
+    def _load(self, conn, miqaat_id: int) -> dict:
+        """Fold one miqaat's assignments and attendance into fresh counters"""
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(
+                f"""
+                SELECT its_id, team_id, duty_id
+                FROM {pg_table('guard_duty')}
+                WHERE miqaat_id = %s AND status = 1
+                """,
+                (miqaat_id,)
+            )
+            assignments = cursor.fetchall()
+
+            cursor.execute(
+                f"""
+                SELECT its_id, MIN(team_id) AS team_id
+                FROM {pg_table('attendance')}
+                WHERE miqaat_id = %s
+                GROUP BY its_id
+                """,
+                (miqaat_id,)
+            )
+            attendance = cursor.fetchall()
+        conn.commit()
+
+        entry = {
+            "loaded_at": time.monotonic(),
+            "synced_at": datetime.now(),
+            "version": next(self._versions),
+            "snapshot": None,
+            "assigned": {},
+            "attended": {},
+            "teams": {},
+            "duties": {},
+            "reported": 0,
+            "expected": 0
+        }
+        for row in assignments:
+            self._assign(entry, row["its_id"], row["team_id"], row["duty_id"])
+        for row in attendance:
+            self._attend(entry, row["its_id"], row["team_id"])
+
+        logger.debug(
+            f"Attendance counters loaded for miqaat {miqaat_id}: "
+            f"{entry['reported']} reported, {entry['expected']} expected"
+        )
+        return entry
+
+    def warm(self, conn) -> int:
+        """Load counters for every miqaat that is running now; returns how many"""
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT miqaat_id
+                FROM {pg_table('miqaat')}
+                WHERE is_active AND now() BETWEEN start_date AND end_date
+                """
+            )
+            miqaat_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+
+        for miqaat_id in miqaat_ids:
+            entry = self._load(conn, miqaat_id)
+            with self._lock:
+                self._miqaats[miqaat_id] = entry
+        return len(miqaat_ids)
+
+    # ----- counter updates (caller holds the lock or owns the entry) -----
+
+    @staticmethod
+    def _bucket(entry: dict, kind: str, key, **extra) -> dict:
+        bucket = entry[kind].get(key)
+        if bucket is None:
+            bucket = entry[kind][key] = {**extra, "reported": 0, "expected": 0}
+        return bucket
+
+    def _assign(self, entry: dict, its_id, team_id, duty_id) -> None:
+        if its_id in entry["assigned"]:
+            return
+        entry["assigned"][its_id] = (team_id, duty_id)
+        reported = 1 if its_id in entry["attended"] else 0
+        entry["expected"] += 1
+        self._bucket(entry, "teams", team_id)["expected"] += 1
+        duty = self._bucket(entry, "duties", duty_id, team_id=team_id)
+        duty["expected"] += 1
+        duty["reported"] += reported
+
+    def _unassign(self, entry: dict, its_id) -> None:
+        assignment = entry["assigned"].pop(its_id, None)
+        if assignment is None:
+            return
+        team_id, duty_id = assignment
+        reported = 1 if its_id in entry["attended"] else 0
+        entry["expected"] -= 1
+        self._bucket(entry, "teams", team_id)["expected"] -= 1
+        duty = self._bucket(entry, "duties", duty_id, team_id=team_id)
+        duty["expected"] -= 1
+        duty["reported"] -= reported
+
+    def _attend(self, entry: dict, its_id, team_id) -> bool:
+        if its_id in entry["attended"]:
+            return False
+        entry["attended"][its_id] = team_id
+        entry["reported"] += 1
+        self._bucket(entry, "teams", team_id)["reported"] += 1
+        assignment = entry["assigned"].get(its_id)
+        if assignment:
+            self._bucket(entry, "duties", assignment[1], team_id=assignment[0])["reported"] += 1
+        return True
+
+    def _changed(self, entry: dict) -> None:
+        entry["version"] = next(self._versions)
+        entry["snapshot"] = None
+
+    # ----- write path -----
+
+    def record_attendance(self, miqaat_id: int, its_id: int, team_id: int) -> None:
+        """Count one committed attendance insert (ignored if the miqaat is not loaded)"""
+        with self._lock:
+            entry = self._miqaats.get(miqaat_id)
+            if entry and self._attend(entry, its_id, team_id):
+                self._changed(entry)
+
+    def record_assignment(self, flag: str, miqaat_id, its_id, team_id=None, duty_id=None) -> None:
+        """Apply one committed guard duty insert (I) or removal (D)"""
+        with self._lock:
+            entry = self._miqaats.get(miqaat_id)
+            if not entry or not its_id:
+                return
+            if flag == 'I':
+                self._assign(entry, its_id, team_id, duty_id)
+            else:
+                self._unassign(entry, its_id)
+            self._changed(entry)
+
+    def invalidate(self, *miqaat_ids: Optional[int]) -> None:
+        """Drop counters (duties edited or deleted) so they are rebuilt on next read"""
+        with self._lock:
+            for miqaat_id in miqaat_ids:
+                self._miqaats.pop(miqaat_id, None)
+
+    # ----- read path -----
+
+    def _snapshot(self, miqaat_id: int, entry: dict) -> dict:
+        """Serialisable view of an entry, built once per version; caller holds the lock"""
+        if entry["snapshot"] is None:
+            entry["snapshot"] = {
+                "miqaat_id": miqaat_id,
+                "version": entry["version"],
+                "synced_at": entry["synced_at"],
+                "reported": entry["reported"],
+                "expected": entry["expected"],
+                "teams": [
+                    {"team_id": team_id, **counts}
+                    for team_id, counts in sorted(entry["teams"].items(), key=lambda i: str(i[0]))
+                ],
+                "duties": [
+                    {"duty_id": duty_id, **counts}
+                    for duty_id, counts in sorted(entry["duties"].items(), key=lambda i: str(i[0]))
+                ]
+            }
+        return entry["snapshot"]
+
+    def assignment(self, conn, miqaat_id: int, its_id: int) -> Optional[tuple]:
+        """(team_id, duty_id) of the guard's active assignment in the miqaat, or None (loads it if needed)"""
+        self.get(conn, miqaat_id)
+        with self._lock:
+            entry = self._miqaats.get(miqaat_id)
+            return entry["assigned"].get(its_id) if entry else None
+
+    def peek(self, miqaat_id: int) -> Optional[dict]:
+        """Current snapshot without touching the database, or None if it needs a (re)load"""
+        with self._lock:
+            entry = self._miqaats.get(miqaat_id)
+            if entry and time.monotonic() - entry["loaded_at"] < self.resync_seconds:
+                return self._snapshot(miqaat_id, entry)
+        return None
+
+    def get(self, conn, miqaat_id: int) -> dict:
+        """Current snapshot, loading or resyncing the miqaat first if needed"""
+        snapshot = self.peek(miqaat_id)
+        if snapshot is not None:
+            return snapshot
+
+        entry = self._load(conn, miqaat_id)
+        with self._lock:
+            self._miqaats[miqaat_id] = entry
+            return self._snapshot(miqaat_id, entry)
+
+
+attendance_counters = AttendanceCounters()
+
+# miqaat_id -> reload in progress, shared by every reader on this event loop
+_reloads: Dict[int, asyncio.Future] = {}
+
+
+def _reload(miqaat_id: int) -> dict:
+    with get_sync_db_connection() as conn:
+        return attendance_counters.get(conn, miqaat_id)
+
+
+async def load_counters(miqaat_id: int) -> dict:
+    """
+    A miqaat's snapshot without blocking the event loop
+
+    Fresh counters are served from memory. Otherwise a single reload runs
+    in the threadpool and concurrent callers await that same reload; it
+    is shielded so a client disconnecting does not cancel it for others.
+    """
+    snapshot = attendance_counters.peek(miqaat_id)
+    if snapshot is not None:
+        return snapshot
+
+    reload = _reloads.get(miqaat_id)
+    if reload is None:
+        reload = asyncio.ensure_future(run_in_threadpool(_reload, miqaat_id))
+        _reloads[miqaat_id] = reload
+        reload.add_done_callback(lambda _: _reloads.pop(miqaat_id, None))
+    return await asyncio.shield(reload)
+
+
+async def counter_stream(request, miqaat_id: int):
+    """
+    Server-Sent Events generator of one miqaat's counters
+
+    Checks the in-memory version every ATTENDANCE_COUNTERS_PUSH_SECONDS
+    and sends a snapshot only when it changed, so bursts of scans are
+    coalesced into one update per interval.
+    """
+    last_version = None
+    idle = 0.0
+    yield "retry: 5000\n\n"
+    while not await request.is_disconnected():
+        snapshot = await load_counters(miqaat_id)
+
+        if snapshot["version"] != last_version:
+            last_version = snapshot["version"]
+            idle = 0.0
+            yield f"event: attendance.counters\ndata: {json.dumps(snapshot, default=str)}\n\n"
+        elif idle >= EVENTS_HEARTBEAT_SECONDS:
+            idle = 0.0
+            yield ": keep-alive\n\n"
+
+        await asyncio.sleep(ATTENDANCE_COUNTERS_PUSH_SECONDS)
+        idle += ATTENDANCE_COUNTERS_PUSH_SECONDS
@@ -0,0 +1,118 @@
+# app/attendance_index.py
+"""
+In-memory set of already-scanned guards per miqaat
+
+A repeated scan is by far the most common rejected attendance insert.
+The set of its_ids with attendance in a miqaat is loaded with one query
+the first time the miqaat is scanned and then grown as inserts commit,
+so a known duplicate is answered without a database round trip.
+
+Only "already present" answers are served from memory; a miss always
+goes to spr_attendance_insert, which stays authoritative. Inserts made
+by other workers are therefore just misses, and the set is reloaded
+after ATTENDANCE_SCAN_INDEX_RESYNC_SECONDS to drop rows deleted directly
+in the database.
+"""
+from app.config import pg_table
+from typing import Optional, Iterable, Set, Tuple
+from collections import OrderedDict
+import threading
+import time
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ATTENDANCE_SCAN_INDEX_RESYNC_SECONDS = int(os.getenv("ATTENDANCE_SCAN_INDEX_RESYNC_SECONDS", "300"))
+ATTENDANCE_SCAN_INDEX_MAX_MIQAATS = int(os.getenv("ATTENDANCE_SCAN_INDEX_MAX_MIQAATS", "20"))
+
+
+class AttendanceScanIndex:
+    """
+    miqaat_id -> set of its_ids with attendance, least recently used evicted
+
+    An exact set rather than a Bloom filter: its_ids are small ints, a
+    large miqaat is tens of thousands of them, and an exact answer means
+    a hit never needs a second check.
+    """
+
+    def __init__(
+        self,
+        resync_seconds: int = ATTENDANCE_SCAN_INDEX_RESYNC_SECONDS,
+        max_miqaats: int = ATTENDANCE_SCAN_INDEX_MAX_MIQAATS
+    ):
+        self.resync_seconds = resync_seconds
+        self.max_miqaats = max_miqaats
+        self._lock = threading.Lock()
+        self._miqaats: "OrderedDict[int, Tuple[float, Set[int]]]" = OrderedDict()
+
+    def _load(self, conn, miqaat_id: int) -> Set[int]:
+        """Read every its_id with attendance in one miqaat"""
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT its_id FROM {pg_table('attendance')} WHERE miqaat_id = %s",
+                (miqaat_id,)
+            )
+            its_ids = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+        logger.debug(f"Attendance scan index loaded for miqaat {miqaat_id}: {len(its_ids)} guards")
+        return its_ids
+
+    def _scanned(self, conn, miqaat_id: int) -> Set[int]:
+        """The miqaat's set, loading or resyncing it first if needed"""
+        with self._lock:
+            entry = self._miqaats.get(miqaat_id)
+            if entry and time.monotonic() - entry[0] < self.resync_seconds:
+                self._miqaats.move_to_end(miqaat_id)
+                return entry[1]
+
+        its_ids = self._load(conn, miqaat_id)
+        with self._lock:
+            self._miqaats[miqaat_id] = (time.monotonic(), its_ids)
+            self._miqaats.move_to_end(miqaat_id)
+            while len(self._miqaats) > self.max_miqaats:
+                self._miqaats.popitem(last=False)
+        return its_ids
+
+    def contains(self, conn, miqaat_id: int, its_id: int) -> bool:
+        """True if the guard is known to have attendance in the miqaat"""
+        scanned = self._scanned(conn, miqaat_id)
+        with self._lock:
+            return its_id in scanned
+
+    def known(self, pairs: Iterable[Tuple[int, int]], conn=None) -> Set[Tuple[int, int]]:
+        """
+        The (its_id, miqaat_id) pairs known to have attendance
+
+        With a connection, miqaats that are not loaded yet are loaded;
+        without one only what is already in memory is consulted.
+        """
+        pairs = set(pairs)
+        known = set()
+        for miqaat_id in {m for _, m in pairs}:
+            if conn is not None:
+                scanned = self._scanned(conn, miqaat_id)
+            else:
+                with self._lock:
+                    entry = self._miqaats.get(miqaat_id)
+                scanned = entry[1] if entry else set()
+            with self._lock:
+                known.update(p for p in pairs if p[1] == miqaat_id and p[0] in scanned)
+        return known
+
+    def add(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """Record committed (or DB-confirmed duplicate) attendance for loaded miqaats"""
+        with self._lock:
+            for its_id, miqaat_id in pairs:
+                entry = self._miqaats.get(miqaat_id)
+                if entry:
+                    entry[1].add(its_id)
+
+    def invalidate(self, *miqaat_ids: Optional[int]) -> None:
+        """Drop cached miqaats so they reload on next use"""
+        with self._lock:
+            for miqaat_id in miqaat_ids:
+                self._miqaats.pop(miqaat_id, None)
+
+
+attendance_scans = AttendanceScanIndex()
@@ -0,0 +1,70 @@
+# app/cache.py
+"""
+Per-key versioned response cache
+
+Writers call bump(key) when the underlying data changes; readers build a
+payload once per version and serve it (and its ETag) until the next bump
+or until the entry is older than ttl_seconds. Versions are per process,
+so the TTL bounds staleness from writes handled by other workers.
+"""
+from typing import Any, Callable, Dict, Hashable, Tuple
+import threading
+import time
+import uuid
+import os
+
+
+class VersionedCache:
+    """key -> (version, payload), invalidated by version bumps and a TTL"""
+
+    def __init__(self, ttl_seconds: int, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._versions: Dict[Hashable, int] = {}
+        self._entries: Dict[Hashable, Tuple[str, float, Any]] = {}
+
+    def version(self, key: Hashable) -> str:
+        """Current version tag of a key (opaque, changes on every bump)"""
+        with self._lock:
+            return f"{self._epoch}.{self._versions.get(key, 0)}"
+
+    def bump(self, *keys: Hashable) -> None:
+        """Mark keys as changed; their cached payloads are discarded"""
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Tuple[str, Any]:
+        """Return (version, payload), calling build() on a miss or expiry"""
+        now = time.monotonic()
+        with self._lock:
+            version = f"{self._epoch}.{self._versions.get(key, 0)}"
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                if now - entry[1] < self.ttl_seconds:
+                    return version, entry[2]
+                # Expired: the data may have changed elsewhere, so it gets a new version
+                self._versions[key] = self._versions.get(key, 0) + 1
+                version = f"{self._epoch}.{self._versions[key]}"
+
+        payload = build()
+
+        with self._lock:
+            # Only store if nothing changed while we were building
+            if f"{self._epoch}.{self._versions.get(key, 0)}" == version:
+                if len(self._entries) >= self.max_entries and key not in self._entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][1])
+                    self._entries.pop(oldest, None)
+                self._entries[key] = (version, now, payload)
+        return version, payload
+
+
+# Miqaat roster payloads (GetMiqaatRoster), keyed by miqaat_id
+miqaat_roster_cache = VersionedCache(
+    ttl_seconds=int(os.getenv("MIQAAT_ROSTER_CACHE_SECONDS", "60"))
+)
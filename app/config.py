@@ -15,6 +15,23 @@ PG_CONFIG = {
     "schema": os.getenv("PG_SCHEMA", "bg")
 }
 
+# Table names used by direct SQL (stored procedures use their own)
+# Override via env if the deployed schema uses different names
+PG_TABLES = {
+    "mumin": os.getenv("PG_TABLE_MUMIN", "mumin_master"),
+    "duty": os.getenv("PG_TABLE_DUTY", "duty_master"),
+    "guard_duty": os.getenv("PG_TABLE_GUARD_DUTY", "guard_duties"),
+    "miqaat": os.getenv("PG_TABLE_MIQAAT", "miqaat_master"),
+    "team": os.getenv("PG_TABLE_TEAM", "team_master"),
+    "team_jamaat": os.getenv("PG_TABLE_TEAM_JAMAAT", "team_jamaat_link"),
+    "attendance": os.getenv("PG_TABLE_ATTENDANCE", "attendance"),
+    "idempotency": os.getenv("PG_TABLE_IDEMPOTENCY", "api_idempotency_key")
+}
+
+def pg_table(name: str) -> str:
+    """Schema-qualified table name, e.g. pg_table('duty') -> 'bg.duty_master'"""
+    return f"{PG_CONFIG['schema']}.{PG_TABLES[name]}"
+
 # API Configuration
 API_BASE_PATH = os.getenv("API_BASE_PATH", "/BURHANI_GUARDS_API_TEST/api")
 
@@ -4,7 +4,9 @@ from psycopg2 import pool
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
 from app.config import get_pg_connection_string, PG_CONFIG
+import threading
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +50,85 @@ def get_db_connection():
     finally:
         pool.putconn(conn)
 
+# Separate, bounded pool for member sync (bulk sync, refresh scheduler, jobs)
+# so long-running syncs can never take connections from interactive traffic.
+# ThreadedConnectionPool because sync work runs in background threads.
+sync_connection_pool = None
+sync_pool_slots = None
+_sync_pool_init_lock = threading.Lock()
+
+def initialize_sync_connection_pool(minconn=None, maxconn=None):
+    """Initialize the PostgreSQL connection pool used by member sync"""
+    global sync_connection_pool, sync_pool_slots
+    minconn = minconn if minconn is not None else int(os.getenv("SYNC_PG_POOL_MIN", "1"))
+    maxconn = maxconn if maxconn is not None else int(os.getenv("SYNC_PG_POOL_MAX", "4"))
+    try:
+        sync_connection_pool = pool.ThreadedConnectionPool(
+            minconn,
+            maxconn,
+            get_pg_connection_string()
+        )
+        sync_pool_slots = threading.BoundedSemaphore(maxconn)
+        logger.info(f"Sync connection pool created successfully (max {maxconn})")
+    except Exception as e:
+        logger.error(f"Error creating sync connection pool: {e}")
+        raise
+
+def get_sync_connection_pool():
+    """Get the sync connection pool, initialize if needed"""
+    global sync_connection_pool
+    if sync_connection_pool is None:
+        with _sync_pool_init_lock:
+            if sync_connection_pool is None:
+                initialize_sync_connection_pool()
+    return sync_connection_pool
+
+@contextmanager
+def get_sync_db_connection():
+    """
+    Get a connection from the sync pool using context manager
+    Blocks until a connection is free instead of failing when the pool is full.
+    Search path is set to the app schema; session advisory locks and any
+    open transaction are released before the connection goes back.
+    Usage:
+        with get_sync_db_connection() as conn:
+            # use connection
+    """
+    sync_pool = get_sync_connection_pool()
+    sync_pool_slots.acquire()
+    conn = None
+    try:
+        conn = sync_pool.getconn()
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {PG_CONFIG['schema']}, public")
+        conn.commit()
+        yield conn
+    finally:
+        try:
+            if conn is not None:
+                broken = bool(conn.closed)
+                if not broken:
+                    try:
+                        conn.rollback()
+                        with conn.cursor() as cursor:
+                            cursor.execute("SELECT pg_advisory_unlock_all()")
+                        conn.commit()
+                    except psycopg2.Error:
+                        broken = True
+                sync_pool.putconn(conn, close=broken)
+        finally:
+            sync_pool_slots.release()
+
+def run_with_sync_connection(fn, *args, **kwargs):
+    """
+    Call fn(conn, *args, **kwargs) on a sync pool connection
+    For run_in_threadpool: the connection is checked out inside the worker
+    thread, so no request pool connection is held across the await and
+    callers beyond the pool size wait for a slot instead of failing.
+    """
+    with get_sync_db_connection() as conn:
+        return fn(conn, *args, **kwargs)
+
 def get_db_connection_direct():
     """
     Get a direct connection (not from pool)
@@ -0,0 +1,208 @@
+# app/events.py
+"""
+In-process publish/subscribe for pushing changes to connected clients
+
+Subscribers (SSE streams) register an asyncio queue on one or more
+channels such as "its:10001001" or "team:2"; publishers send an event to
+a list of channels after their transaction commits. Each subscriber is
+only a small queue, so thousands of idle streams per worker are cheap.
+
+With several uvicorn workers set EVENTS_PG_NOTIFY=true: publish() then
+goes through Postgres NOTIFY and every worker's listener thread fans the
+event out to its own subscribers.
+"""
+from app.config import get_pg_connection_string
+from app.db import get_db_connection
+from typing import Optional, Iterable, Dict, Set
+from datetime import datetime
+import asyncio
+import threading
+import select
+import json
+import logging
+import os
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PG_NOTIFY = os.getenv("EVENTS_PG_NOTIFY", "false").lower() in ("1", "true", "yes")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv("EVENTS_HEARTBEAT_SECONDS", "20"))
+
+
+class EventBroker:
+    """
+    Channel-keyed fan-out to asyncio queues
+
+    subscribe/unsubscribe run on the event loop; publish may be called
+    from any thread. A subscriber whose queue is full (a stalled client)
+    drops events rather than blocking publishers.
+    """
+
+    def __init__(self, notify_channel: str, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.notify_channel = notify_channel
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    # ----- subscribers (event loop) -----
+
+    def subscribe(self, channels: Iterable[str]) -> asyncio.Queue:
+        """Register a new queue on the given channels"""
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        for channel in set(channels):
+            self._subscribers.setdefault(channel, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, channels: Iterable[str]) -> None:
+        """Remove a queue from its channels"""
+        for channel in set(channels):
+            queues = self._subscribers.get(channel)
+            if queues:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[channel]
+
+    def _dispatch(self, channels: Iterable[str], event: dict) -> None:
+        """Deliver one event to every queue on any of the channels (once each)"""
+        targets = set()
+        for channel in channels:
+            targets.update(self._subscribers.get(channel, ()))
+        for queue in targets:
+            try:
+                queue.put_nowait(event)
+                self._stats["delivered"] += 1
+            except asyncio.QueueFull:
+                self._stats["dropped"] += 1
+
+    def _dispatch_threadsafe(self, channels: Iterable[str], event: dict) -> None:
+        """Hand an event to the event loop from whichever thread we are on"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # nobody has subscribed yet
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(channels, event)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, list(channels), event)
+
+    # ----- publishers (any thread) -----
+
+    def publish(self, channels: Iterable[str], event: dict) -> None:
+        """
+        Publish an event to channels; call after the change is committed
+
+        Never raises - a failed push must not fail the write that caused it.
+        """
+        channels = sorted(set(channels))
+        if not channels:
+            return
+        event = {**event, "at": datetime.now().isoformat()}
+        self._stats["published"] += 1
+
+        try:
+            if EVENTS_PG_NOTIFY:
+                message = json.dumps({"channels": channels, "event": event}, default=str)
+                with get_db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.notify_channel, message))
+                    conn.commit()
+            else:
+                self._dispatch_threadsafe(channels, event)
+        except Exception as ex:
+            logger.error(f"Failed to publish event on {channels}: {str(ex)}")
+
+    # ----- cross-worker listener -----
+
+    def start_listener(self) -> None:
+        """Start the LISTEN thread that relays NOTIFY events to local subscribers"""
+        if not EVENTS_PG_NOTIFY or (self._listener and self._listener.is_alive()):
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen, name=f"events-{self.notify_channel}", daemon=True
+        )
+        self._listener.start()
+        logger.info(f"Event listener started on channel {self.notify_channel}")
+
+    def stop_listener(self, timeout: float = 5.0) -> None:
+        """Stop the LISTEN thread"""
+        self._stop.set()
+        if self._listener:
+            self._listener.join(timeout)
+
+    def _listen(self) -> None:
+        """LISTEN on a dedicated connection, reconnecting on failure"""
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(get_pg_connection_string())
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.notify_channel}")
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            message = json.loads(notify.payload)
+                            self._dispatch_threadsafe(message["channels"], message["event"])
+                        except (ValueError, KeyError):
+                            logger.warning(f"Ignoring malformed event on {self.notify_channel}")
+            except Exception as ex:
+                logger.error(f"Event listener error on {self.notify_channel}: {str(ex)}")
+                self._stop.wait(5.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def stats(self) -> dict:
+        """Counters plus current subscription numbers"""
+        queues = set()
+        for subscribers in self._subscribers.values():
+            queues.update(subscribers)
+        return {
+            **self._stats,
+            "channels": len(self._subscribers),
+            "subscribers": len(queues),
+            "pg_notify": EVENTS_PG_NOTIFY
+        }
+
+
+async def sse_stream(broker: EventBroker, request, channels: Iterable[str]):
+    """
+    Server-Sent Events generator for one client
+
+    Sends a comment heartbeat when idle so proxies keep the connection
+    open, and unsubscribes when the client goes away.
+    """
+    channels = list(channels)
+    queue = broker.subscribe(channels)
+    try:
+        yield f"retry: 5000\n: subscribed to {', '.join(channels)}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+    finally:
+        broker.unsubscribe(queue, channels)
+
+
+# Duty assignment changes, channels "its:<its_id>" and "team:<team_id>"
+duty_events = EventBroker(notify_channel="bg_duty_events")
@@ -0,0 +1,56 @@
+# app/fieldsets.py
+"""
+Sparse fieldsets for read endpoints
+
+Clients pass fields=["its_id", "full_name", ...]; each route validates the
+names against its own {field: sql_expression} allow-list and selects only
+those columns, so unrequested fields are never read. Routes backed by
+stored procedures that always return full rows do not take fields.
+"""
+from fastapi import HTTPException, status
+from typing import Optional, List, Dict, Any, Iterable
+
+
+def resolve_fields(
+    requested: Optional[List[str]],
+    allowed: Iterable[str],
+    always: Iterable[str] = ()
+) -> Optional[List[str]]:
+    """
+    Validate requested field names against a route's allow-list
+
+    Returns None when no projection was asked for (full rows), otherwise
+    the de-duplicated field list with the `always` fields first. Unknown
+    names are rejected with 400 so typos do not silently drop data.
+    """
+    if not requested:
+        return None
+
+    allowed = list(allowed)
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+
+    fields = []
+    for name in list(always) + list(requested):
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def select_list(fields: Iterable[str], columns: Dict[str, str]) -> str:
+    """Build a SELECT list from a {field: sql_expression} allow-list"""
+    return ", ".join(f"{columns[name]} AS {name}" for name in fields)
+
+
+def project_rows(data: Any, fields: Optional[List[str]]) -> Any:
+    """Keep only the requested keys of each row (drops helper columns added for filtering)"""
+    if fields is None or not isinstance(data, list):
+        return data
+    return [
+        {name: row[name] for name in fields if name in row} if isinstance(row, dict) else row
+        for row in data
+    ]
@@ -0,0 +1,248 @@
+# app/idempotency.py
+"""
+Idempotency-Key handling for retried writes
+
+A client sends the same Idempotency-Key header on every retry of one
+logical request. The first response with a final outcome (status < 500)
+is stored and later retries get it back without running the write again.
+Entries live in a bounded in-process LRU, which is all a single worker
+needs. With several workers (or to survive restarts) set
+IDEMPOTENCY_DB_FALLBACK=true: responses are then also written to the
+api_idempotency_key table (migrations/004) and read back on a memory
+miss. Both expire after IDEMPOTENCY_TTL_SECONDS; expired rows are
+deleted by a background thread every IDEMPOTENCY_CLEANUP_SECONDS rather
+than on the request path.
+"""
+from fastapi import HTTPException, status
+from app.config import pg_table
+from app.db import get_db_connection, get_sync_db_connection
+from typing import Optional, Dict, Tuple, Any
+from collections import OrderedDict
+import threading
+import hashlib
+import time
+import json
+import logging
+import os
+
+from psycopg2.extras import Json
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_DB_FALLBACK = os.getenv("IDEMPOTENCY_DB_FALLBACK", "false").lower() in ("1", "true", "yes")
+IDEMPOTENCY_CLEANUP_SECONDS = int(os.getenv("IDEMPOTENCY_CLEANUP_SECONDS", "3600"))
+
+
+class IdempotencyStore:
+    """
+    (scope, user_id, key) -> (fingerprint, response), memory first then DB
+
+    Keys are per user and per endpoint scope, so two users (or two
+    endpoints) can never see each other's responses. Reusing a key with
+    a different body is rejected with 422; a retry that arrives while the
+    first attempt is still running gets 409.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS,
+        max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+        db_fallback: bool = IDEMPOTENCY_DB_FALLBACK
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.db_fallback = db_fallback
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[str, float, dict]]" = OrderedDict()
+        self._in_flight: set = set()
+        self._stop = threading.Event()
+        self._cleanup_thread: Optional[threading.Thread] = None
+        self._stats = {"replayed": 0, "stored": 0, "db_hits": 0, "db_errors": 0, "db_expired": 0}
+
+    @staticmethod
+    def fingerprint(body: Any) -> str:
+        """Stable hash of a request body"""
+        return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+    # ----- DB fallback -----
+
+    def _db_get(self, entry_key: Tuple) -> Optional[Tuple[str, dict]]:
+        scope, user_id, key = entry_key
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT fingerprint, response
+                    FROM {pg_table('idempotency')}
+                    WHERE scope = %s AND user_id = %s AND idempotency_key = %s
+                      AND created_at > NOW() - make_interval(secs => %s)
+                    """,
+                    (scope, user_id, key, self.ttl_seconds)
+                )
+                row = cursor.fetchone()
+            conn.commit()
+        return (row[0], row[1]) if row else None
+
+    def _db_put(self, entry_key: Tuple, fingerprint: str, response: dict) -> None:
+        scope, user_id, key = entry_key
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {pg_table('idempotency')}
+                        (scope, user_id, idempotency_key, fingerprint, response)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (scope, user_id, idempotency_key) DO UPDATE
+                        SET fingerprint = EXCLUDED.fingerprint,
+                            response = EXCLUDED.response,
+                            created_at = NOW()
+                    """,
+                    (scope, user_id, key, fingerprint, Json(response))
+                )
+            conn.commit()
+
+    def _db_cleanup(self) -> int:
+        """Delete rows older than the TTL; returns how many"""
+        with get_sync_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    DELETE FROM {pg_table('idempotency')}
+                    WHERE created_at < NOW() - make_interval(secs => %s)
+                    """,
+                    (self.ttl_seconds,)
+                )
+                deleted = cursor.rowcount
+            conn.commit()
+        return deleted
+
+    def _run_cleanup(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                deleted = self._db_cleanup()
+                self._stats["db_expired"] += deleted
+                if deleted:
+                    logger.info(f"Deleted {deleted} expired idempotency keys")
+            except Exception as ex:
+                self._stats["db_errors"] += 1
+                logger.error(f"Idempotency key cleanup failed: {str(ex)}")
+
+    def start_cleanup(self, interval: float = IDEMPOTENCY_CLEANUP_SECONDS) -> None:
+        """Start the expired-row cleanup thread (only needed with the DB fallback)"""
+        if not self.db_fallback or (self._cleanup_thread and self._cleanup_thread.is_alive()):
+            return
+        self._stop.clear()
+        self._cleanup_thread = threading.Thread(
+            target=self._run_cleanup, args=(interval,), name="idempotency-cleanup", daemon=True
+        )
+        self._cleanup_thread.start()
+
+    def stop_cleanup(self, timeout: float = 5.0) -> None:
+        """Signal the cleanup thread to stop and wait for it"""
+        self._stop.set()
+        if self._cleanup_thread:
+            self._cleanup_thread.join(timeout)
+
+    # ----- request lifecycle -----
+
+    def begin(self, scope: str, user_id, key: Optional[str], body: Any) -> Optional[dict]:
+        """
+        Start an idempotent request
+
+        Returns the stored response for a completed earlier attempt, or
+        None when the caller should run the write and then call finish()
+        (or abandon() if it did not produce a final outcome).
+        """
+        if not key:
+            return None
+
+        entry_key = (scope, int(user_id or 0), key)
+        fingerprint = self.fingerprint(body)
+        now = time.monotonic()
+
+        with self._lock:
+            stored = self._entries.get(entry_key)
+            if stored and now - stored[1] >= self.ttl_seconds:
+                del self._entries[entry_key]
+                stored = None
+            if stored:
+                self._entries.move_to_end(entry_key)
+            elif entry_key in self._in_flight:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still being processed"
+                )
+            else:
+                self._in_flight.add(entry_key)
+
+        if not stored and self.db_fallback:
+            try:
+                row = self._db_get(entry_key)
+            except Exception as ex:
+                self._stats["db_errors"] += 1
+                logger.error(f"Idempotency lookup failed, processing request: {str(ex)}")
+                row = None
+            if row:
+                self._stats["db_hits"] += 1
+                stored = (row[0], now, row[1])
+                with self._lock:
+                    self._in_flight.discard(entry_key)
+                    self._remember(entry_key, stored)
+
+        if not stored:
+            return None
+
+        if stored[0] != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request body"
+            )
+        self._stats["replayed"] += 1
+        return stored[2]
+
+    def finish(self, scope: str, user_id, key: Optional[str], body: Any, response: dict) -> None:
+        """Store the outcome of a request started with begin()"""
+        if not key:
+            return
+        entry_key = (scope, int(user_id or 0), key)
+
+        if (response.get("status_code") or 200) >= 500:
+            # Server-side failure: let the client's retry run the write again
+            self.abandon(scope, user_id, key)
+            return
+
+        fingerprint = self.fingerprint(body)
+        with self._lock:
+            self._in_flight.discard(entry_key)
+            self._remember(entry_key, (fingerprint, time.monotonic(), response))
+        self._stats["stored"] += 1
+
+        if self.db_fallback:
+            try:
+                self._db_put(entry_key, fingerprint, response)
+            except Exception as ex:
+                self._stats["db_errors"] += 1
+                logger.error(f"Failed to persist idempotency key: {str(ex)}")
+
+    def abandon(self, scope: str, user_id, key: Optional[str]) -> None:
+        """Release a key whose request failed before producing a response"""
+        if not key:
+            return
+        with self._lock:
+            self._in_flight.discard((scope, int(user_id or 0), key))
+
+    def _remember(self, entry_key: Tuple, stored: Tuple[str, float, dict]) -> None:
+        """Insert into the LRU; caller holds the lock"""
+        self._entries[entry_key] = stored
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "in_flight": len(self._in_flight)}
+
+
+idempotency_store = IdempotencyStore()
@@ -1,9 +1,17 @@
 # app/main.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import Login_controller, ITS_API_controller, Duty_controller, Team_controller, Guards_controller, Attendance_controller, Miqaat_controller  
+from app.routers import Login_controller, ITS_API_controller, Duty_controller, Team_controller, Guards_controller, Attendance_controller, Miqaat_controller, mumin_sync
 from app.config import API_BASE_PATH
-from app.db import initialize_connection_pool
+from app.db import initialize_connection_pool, initialize_sync_connection_pool, get_db_connection
+from app.routers.mumin_sync import (
+    refresh_scheduler, sync_job_runner,
+    MUMIN_REFRESH_ENABLED, MUMIN_SYNC_JOBS_RESUME
+)
+from app.events import duty_events
+from app.routers.Attendance_controller import attendance_write_behind, ATTENDANCE_WRITE_BEHIND
+from app.attendance_counters import attendance_counters
+from app.idempotency import idempotency_store
 import logging
 
 # Configure logging
@@ -38,14 +46,46 @@ async def startup_event():
     """Initialize resources on startup"""
     try:
         initialize_connection_pool(minconn=2, maxconn=10)
+        initialize_sync_connection_pool()
         logger.info("Database connection pool initialized")
     except Exception as e:
         logger.error(f"Failed to initialize database connection pool: {e}")
+    
+    if MUMIN_REFRESH_ENABLED:
+        refresh_scheduler.start()
+    
+    if MUMIN_SYNC_JOBS_RESUME:
+        try:
+            sync_job_runner.resume_pending()
+        except Exception as e:
+            logger.error(f"Failed to resume mumin sync jobs: {e}")
+    
+    # Relays duty events between workers when EVENTS_PG_NOTIFY is set
+    duty_events.start_listener()
+    
+    # Rebuild live attendance counters for miqaats in progress
+    try:
+        with get_db_connection() as conn:
+            warmed = attendance_counters.warm(conn)
+        logger.info(f"Attendance counters loaded for {warmed} active miqaats")
+    except Exception as e:
+        logger.error(f"Failed to load attendance counters: {e}")
+    
+    if ATTENDANCE_WRITE_BEHIND:
+        attendance_write_behind.start()
+    
+    # Expired Idempotency-Key rows (no-op unless IDEMPOTENCY_DB_FALLBACK is set)
+    idempotency_store.start_cleanup()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup resources on shutdown"""
+    refresh_scheduler.stop()
+    sync_job_runner.stop()
+    duty_events.stop_listener()
+    attendance_write_behind.stop()
+    idempotency_store.stop_cleanup()
     logger.info("Application shutting down")
 
 
@@ -108,6 +148,11 @@ app.include_router(
     prefix=API_BASE_PATH
 )
 
+app.include_router(
+    mumin_sync.router,
+    prefix=API_BASE_PATH
+)
+
 # You can add more routers here as you develop them
 # app.include_router(
 #     another_controller.router,
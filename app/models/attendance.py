@@ -1,6 +1,7 @@
 # app/models/attendance.py
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List, Any
+from datetime import datetime
 
 class AttendanceInsertRequest(BaseModel):
     """Request model for inserting attendance record"""
@@ -22,6 +23,106 @@ class AttendanceInsertRequest(BaseModel):
         }
 
 
+class GateScanRequest(BaseModel):
+    """Request model for a gate scan: guard check plus attendance insert"""
+    form_name: str = Field(..., description="Name of the form calling this endpoint")
+    user_id: int = Field(..., description="User ID performing the scan")
+    its_id: int = Field(..., description="ITS ID of the scanned person")
+    miqaat_id: int = Field(..., description="Miqaat ID")
+    team_id: int = Field(..., description="Team ID")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "form_name": "GATE_SCANNER",
+                "user_id": 3,
+                "its_id": 10001002,
+                "miqaat_id": 17,
+                "team_id": 2
+            }
+        }
+
+
+class AttendanceBatchRecord(BaseModel):
+    """One scanned attendance record in a batch"""
+    its_id: int = Field(..., description="ITS ID of the person")
+    miqaat_id: int = Field(..., description="Miqaat ID")
+    team_id: int = Field(..., description="Team ID")
+    scanned_at: Optional[datetime] = Field(None, description="Device scan time (offline scans)")
+    device_id: Optional[str] = Field(None, description="Scanner device identifier", max_length=100)
+
+
+class AttendanceBatchRequest(BaseModel):
+    """Request model for inserting many attendance records in one call"""
+    form_name: str = Field(..., description="Name of the form calling this endpoint")
+    user_id: int = Field(..., description="User ID performing the insert")
+    records: List[AttendanceBatchRecord] = Field(..., description="Scanned records", min_length=1, max_length=2000)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "form_name": "GATE_SCANNER",
+                "user_id": 3,
+                "records": [
+                    {"its_id": 10001002, "miqaat_id": 17, "team_id": 2, "scanned_at": "2025-01-15T18:05:12", "device_id": "gate-1"},
+                    {"its_id": 10001003, "miqaat_id": 17, "team_id": 2, "scanned_at": "2025-01-15T18:05:20", "device_id": "gate-1"}
+                ]
+            }
+        }
+
+
+class AttendanceBatchItemResult(BaseModel):
+    """Outcome of one record: 1 inserted, 4 duplicate, 0 failed"""
+    index: int
+    its_id: int
+    miqaat_id: int
+    result: int
+    message: str
+
+
+class AttendanceBatchResponse(BaseModel):
+    """Response model for batched attendance ingestion"""
+    success: bool
+    status_code: int
+    message: str
+    summary: dict
+    results: List[AttendanceBatchItemResult]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "status_code": 200,
+                "message": "Processed 2 attendance records",
+                "summary": {"inserted": 1, "duplicate": 1, "failed": 0},
+                "results": [
+                    {"index": 0, "its_id": 10001002, "miqaat_id": 17, "result": 1, "message": "Attendance record inserted successfully"},
+                    {"index": 1, "its_id": 10001003, "miqaat_id": 17, "result": 4, "message": "Attendance record already exists for this member"}
+                ]
+            }
+        }
+
+
+class GateScanResponse(BaseModel):
+    """Response model for a gate scan: guard details and attendance outcome"""
+    success: bool
+    status_code: int
+    message: str
+    result: Optional[int] = None
+    guard: Optional[Any] = None
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "status_code": 200,
+                "message": "Attendance record inserted successfully",
+                "result": 1,
+                "guard": {"its_id": 10001002, "full_name": "Guard Name", "team_id": 2}
+            }
+        }
+
+
 class AttendanceResponse(BaseModel):
     """Response model for attendance operations"""
     success: bool
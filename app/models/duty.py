@@ -1,6 +1,6 @@
 # app/models/duty.py
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, Any
+from typing import Optional, Any, List
 
 class TeamDutyRequest(BaseModel):
     """Request model for team duty queries"""
@@ -100,6 +100,36 @@ class DutyDeleteRequest(BaseModel):
         }
 
 
+class DutyBulkInsertRequest(BaseModel):
+    """Request model for creating many duties in one transaction"""
+    items: List[DutyInsertRequest] = Field(..., description="Duty definitions", min_length=1, max_length=500)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {"team_id": 2, "miqaat_id": 5, "quota": 10, "location": "Main Gate"},
+                    {"team_id": 2, "miqaat_id": 5, "quota": 6, "location": "Ladies Gate"}
+                ]
+            }
+        }
+
+
+class DutyBulkUpdateRequest(BaseModel):
+    """Request model for updating many duties in one transaction"""
+    items: List[DutyUpdateRequest] = Field(..., description="Duty updates", min_length=1, max_length=500)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {"duty_id": 1, "team_id": 2, "miqaat_id": 5, "quota": 12, "location": "Main Gate"},
+                    {"duty_id": 2, "team_id": 2, "miqaat_id": 5, "quota": 8, "location": "Ladies Gate"}
+                ]
+            }
+        }
+
+
 class GuardDutyInsertRequest(BaseModel):
     """
     Request model for guard duty insert/delete operations
@@ -160,6 +190,73 @@ class GuardDutyInsertRequest(BaseModel):
         }
 
 
+class GuardDutyBulkItem(BaseModel):
+    """
+    One assignment or removal inside a bulk guard duty request
+
+    Same fields and rules as GuardDutyInsertRequest without form_name.
+    """
+    flag: str = Field(..., description="Operation flag: 'I' for Insert, 'D' for Delete")
+    duty_id: Optional[int] = Field(None, description="Duty ID (required for INSERT)")
+    team_id: Optional[int] = Field(None, description="Team ID (required for INSERT)")
+    miqaat_id: Optional[int] = Field(None, description="Miqaat ID (required for INSERT)")
+    its_id: Optional[int] = Field(None, description="ITS ID of the guard (required for INSERT)")
+    guard_duty_id: Optional[int] = Field(None, description="Guard Duty ID (required for DELETE)")
+    
+    @field_validator('flag')
+    @classmethod
+    def validate_flag(cls, v):
+        """Validate that flag is either 'I' or 'D'"""
+        if v.upper() not in ['I', 'D']:
+            raise ValueError("Flag must be 'I' (Insert) or 'D' (Delete)")
+        return v.upper()
+
+
+class GuardDutyBulkRequest(BaseModel):
+    """
+    Request model for bulk guard duty insert/delete operations
+
+    All items are applied in one transaction; each item reports its own
+    result code and a failed item does not undo the others.
+    """
+    form_name: str = Field(..., description="Form name for activity logging")
+    items: List[GuardDutyBulkItem] = Field(..., description="Assignments and removals", min_length=1, max_length=1000)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "form_name": "GUARD_DUTY_FORM",
+                "items": [
+                    {"flag": "I", "duty_id": 1, "team_id": 2, "miqaat_id": 17, "its_id": 10001002},
+                    {"flag": "I", "duty_id": 1, "team_id": 2, "miqaat_id": 17, "its_id": 10001003},
+                    {"flag": "D", "guard_duty_id": 15}
+                ]
+            }
+        }
+
+
+class AutoAllocateRequest(BaseModel):
+    """
+    Request model for automatic guard-to-duty allocation
+
+    With dry_run=True (default) the plan is only previewed; with
+    dry_run=False it is written in one bulk transaction.
+    """
+    miqaat_id: int = Field(..., description="Miqaat ID to allocate guards for")
+    team_id: Optional[int] = Field(None, description="Limit allocation to one team's duties")
+    dry_run: bool = Field(True, description="Preview the plan without writing it")
+    form_name: str = Field("AUTO_ALLOCATION", description="Form name for activity logging")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "miqaat_id": 17,
+                "team_id": 2,
+                "dry_run": True
+            }
+        }
+
+
 class DutyResponse(BaseModel):
     """Response model for duty queries"""
     success: bool
@@ -282,6 +379,24 @@ class GuardDutyInsertResponse(BaseModel):
                         "result": 4
                     }
                 },
+                {
+                    "summary": "Quota Full",
+                    "value": {
+                        "success": False,
+                        "status_code": 409,
+                        "message": "Duty quota is full",
+                        "result": 5
+                    }
+                },
+                {
+                    "summary": "Time Conflict",
+                    "value": {
+                        "success": False,
+                        "status_code": 409,
+                        "message": "Guard has an overlapping duty in another miqaat",
+                        "result": 6
+                    }
+                },
                 {
                     "summary": "Error",
                     "value": {
@@ -292,4 +407,71 @@ class GuardDutyInsertResponse(BaseModel):
                     }
                 }
             ]
-        }
\ No newline at end of file
+        }
+
+
+class DutyBulkItemResult(BaseModel):
+    """Outcome of one item in a bulk duty insert/update"""
+    index: int
+    duty_id: Optional[int] = None
+    location: str
+    result_code: int
+    message: str
+
+
+class DutyBulkResponse(BaseModel):
+    """Response model for bulk duty insert/update"""
+    success: bool
+    status_code: int
+    message: str
+    summary: dict
+    results: List[DutyBulkItemResult]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": False,
+                "status_code": 200,
+                "message": "Processed 3 duties",
+                "summary": {"created": 2, "updated": 0, "duplicate": 1, "failed": 0},
+                "results": [
+                    {"index": 0, "location": "Main Gate", "result_code": 1, "message": "Duty created successfully"},
+                    {"index": 1, "location": "Ladies Gate", "result_code": 1, "message": "Duty created successfully"},
+                    {"index": 2, "location": "main gate", "result_code": 4, "message": "Duplicate team, miqaat and location in this request"}
+                ]
+            }
+        }
+
+
+class GuardDutyBulkItemResult(BaseModel):
+    """Outcome of one item in a bulk guard duty request"""
+    index: int
+    flag: str
+    its_id: Optional[int] = None
+    guard_duty_id: Optional[int] = None
+    result: int
+    message: str
+
+
+class GuardDutyBulkResponse(BaseModel):
+    """Response model for bulk guard duty operations"""
+    success: bool
+    status_code: int
+    message: str
+    summary: dict
+    results: List[GuardDutyBulkItemResult]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "status_code": 200,
+                "message": "Processed 3 guard duty operations",
+                "summary": {"assigned": 1, "removed": 1, "duplicate": 1, "quota_full": 0, "conflict": 0, "failed": 0},
+                "results": [
+                    {"index": 0, "flag": "I", "its_id": 10001002, "result": 1, "message": "Guard duty assigned successfully"},
+                    {"index": 1, "flag": "I", "its_id": 10001003, "result": 4, "message": "Guard already assigned to this duty"},
+                    {"index": 2, "flag": "D", "guard_duty_id": 15, "result": 3, "message": "Guard duty removed successfully"}
+                ]
+            }
+        }
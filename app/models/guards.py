@@ -1,7 +1,7 @@
 # app/models/guards.py
 from pydantic import BaseModel, Field
-from typing import Optional, Any
-from datetime import date as DateType
+from typing import Optional, Any, List
+from datetime import date as DateType, datetime as DateTimeType
 
 class GuardsByDateRequest(BaseModel):
     """Request model for getting guards by miqaat date"""
@@ -33,13 +33,71 @@ class GuardsWithDutyRequest(BaseModel):
     miqaat_id: int = Field(..., description="Miqaat ID")
     duty_id: int = Field(..., description="Duty ID")
     team_id: int = Field(..., description="Team ID")
+    limit: Optional[int] = Field(None, ge=1, le=500, description="Page size; enables keyset pagination")
+    cursor: Optional[str] = Field(None, description="next_cursor from the previous page")
+    assigned: Optional[bool] = Field(None, description="Only guards with (true) / without (false) a duty in this miqaat")
+    fields: Optional[List[str]] = Field(None, description="Return only these fields per guard")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "miqaat_id": 1,
                 "duty_id": 3,
-                "team_id": 2
+                "team_id": 2,
+                "limit": 100,
+                "assigned": False
+            }
+        }
+
+
+class GuardAvailabilityRequest(BaseModel):
+    """
+    Request model for checking which guards are free in a time window
+
+    Give either miqaat_id (its start/end window is used) or both
+    start_date and end_date.
+    """
+    its_ids: List[int] = Field(..., description="Guards to check", min_length=1, max_length=5000)
+    miqaat_id: Optional[int] = Field(None, description="Use this miqaat's window")
+    start_date: Optional[DateTimeType] = Field(None, description="Window start")
+    end_date: Optional[DateTimeType] = Field(None, description="Window end")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "its_ids": [10001001, 10001002],
+                "start_date": "2025-01-15T18:00:00",
+                "end_date": "2025-01-15T22:00:00"
+            }
+        }
+
+
+class GuardAvailabilitySearchRequest(BaseModel):
+    """
+    Request model for searching free guards of a team or jamaat
+
+    Give team_id or jamaat_id, and either miqaat_id or start_date/end_date.
+    Guards with max_duties or more assignments starting in the
+    period_days before the window end are left out.
+    """
+    team_id: Optional[int] = Field(None, description="Guards from this team's jamaats")
+    jamaat_id: Optional[int] = Field(None, description="Guards from this jamaat")
+    miqaat_id: Optional[int] = Field(None, description="Use this miqaat's window")
+    start_date: Optional[DateTimeType] = Field(None, description="Window start")
+    end_date: Optional[DateTimeType] = Field(None, description="Window end")
+    max_duties: Optional[int] = Field(None, ge=1, description="Per-period duty cap")
+    period_days: int = Field(30, ge=1, le=365, description="Length of the cap / workload period")
+    limit: int = Field(100, ge=1, le=500, description="Page size")
+    cursor: Optional[str] = Field(None, description="next_cursor from the previous page")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "team_id": 2,
+                "miqaat_id": 17,
+                "max_duties": 4,
+                "period_days": 30,
+                "limit": 50
             }
         }
 
@@ -1,37 +1,65 @@
 # app/models/its_api.py
 from pydantic import BaseModel, Field
-from typing import Optional, Any
+from typing import Optional, Any, Literal, List, Dict, Union
 
 class ITSAPIRequest(BaseModel):
     """Request model for ITS API calls"""
     its_id: str = Field(..., description="ITS ID to query")
-    
+    response_mode: Literal["compact", "full"] = Field(
+        "compact",
+        description="'compact' returns a projected member summary, 'full' returns the parsed ITS payload"
+    )
+    debug: bool = Field(False, description="Include the raw ITS response body (debugging only)")
+
     class Config:
         json_schema_extra = {
             "example": {
-                "its_id": "10001001"
+                "its_id": "10001001",
+                "response_mode": "compact",
+                "debug": False
             }
         }
 
 
+class ITSMemberCompact(BaseModel):
+    """Projected subset of the ITS member record returned in compact mode"""
+    its_id: Optional[str] = None
+    full_name: Optional[str] = None
+    prefix: Optional[str] = None
+    gender: Optional[str] = None
+    age: Optional[int] = None
+    mobile: Optional[str] = None
+    email: Optional[str] = None
+    jamaat_id: Optional[int] = None
+    jamaat: Optional[str] = None
+    jamiaat_id: Optional[int] = None
+    jamiaat: Optional[str] = None
+
+
 class ITSAPIResponse(BaseModel):
     """Response model for ITS API calls"""
     success: bool
     message: Optional[str] = None
     its_id: Optional[str] = None
-    data: Optional[Any] = None
+    data: Optional[Union[List[ITSMemberCompact], Dict[str, Any]]] = Field(
+        None,
+        description="compact: list of projected members (empty if none); full: the parsed ITS payload"
+    )
     raw_response: Optional[str] = None
-    
+
     class Config:
         json_schema_extra = {
             "example": {
                 "success": True,
                 "message": "Data retrieved successfully",
                 "its_id": "10001001",
-                "data": {
-                    "field1": "value1",
-                    "field2": "value2"
-                },
-                "raw_response": "<?xml version='1.0'?>..."
+                "data": [
+                    {
+                        "its_id": "10001001",
+                        "full_name": "Ali Hussain",
+                        "jamaat": "Mumbai Central"
+                    }
+                ],
+                "raw_response": None
             }
-        }
\ No newline at end of file
+        }
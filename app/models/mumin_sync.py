@@ -1,6 +1,6 @@
 # app/models/mumin_sync.py
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 
@@ -21,7 +21,7 @@ class MuminSyncResponse(BaseModel):
     success: bool
     message: str
     its_id: Optional[str] = None
-    operation: Optional[str] = None  # "INSERT" or "UPDATE"
+    operation: Optional[str] = None  # "INSERT", "UPDATE" or "UNCHANGED"
     data: Optional[dict] = None
     
     class Config:
@@ -37,4 +37,139 @@ class MuminSyncResponse(BaseModel):
                     "email": "mshergad@gmail.com"
                 }
             }
-        }
\ No newline at end of file
+        }
+
+
+class MuminBulkSyncRequest(BaseModel):
+    """
+    Request model for bulk syncing ITS data to mumin_master table
+
+    Provide either an explicit list of ITS IDs or stale_days to refresh
+    every member whose pull_date is older than that many days.
+    """
+    its_ids: Optional[List[str]] = Field(None, description="ITS IDs to sync")
+    stale_days: Optional[int] = Field(None, description="Sync members whose pull_date is older than N days", ge=0)
+    batch_size: int = Field(500, description="Rows per multi-row upsert", gt=0, le=5000)
+    concurrency: int = Field(8, description="Parallel ITS API requests", gt=0, le=32)
+    
+    class Config:
+        json_schema_extra = {
+            "examples": [
+                {
+                    "its_ids": ["30327082", "30320819"],
+                    "batch_size": 500,
+                    "concurrency": 8
+                },
+                {
+                    "stale_days": 30,
+                    "batch_size": 500,
+                    "concurrency": 8
+                }
+            ]
+        }
+
+
+class MuminBulkSyncResponse(BaseModel):
+    """Response model for bulk mumin sync operation"""
+    success: bool
+    message: str
+    requested: int = 0
+    fetched: int = 0
+    upserted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    failures: Optional[List[dict]] = None
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "message": "Bulk sync completed",
+                "requested": 2,
+                "fetched": 1,
+                "upserted": 1,
+                "skipped": 0,
+                "failed": 1,
+                "failures": [
+                    {"its_id": "30320819", "error": "No data found for ITS_ID: 30320819"}
+                ]
+            }
+        }
+
+
+
+class MuminSyncJobCreateRequest(BaseModel):
+    """
+    Request model for creating a resumable member sync job
+
+    Provide either an explicit list of ITS IDs or stale_days to snapshot
+    every member whose pull_date is older than that many days.
+    """
+    its_ids: Optional[List[str]] = Field(None, description="ITS IDs to sync")
+    stale_days: Optional[int] = Field(None, description="Sync members whose pull_date is older than N days", ge=0)
+    chunk_size: int = Field(200, description="IDs processed (and checkpointed) per chunk", gt=0, le=5000)
+    concurrency: int = Field(8, description="Parallel ITS API requests", gt=0, le=32)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "stale_days": 30,
+                "chunk_size": 200,
+                "concurrency": 8
+            }
+        }
+
+
+class MuminSyncJobResponse(BaseModel):
+    """Response model for sync job operations"""
+    success: bool
+    message: str
+    job: Optional[dict] = None
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "message": "Sync job status retrieved",
+                "job": {
+                    "job_id": 12,
+                    "status": "RUNNING",
+                    "total": 20000,
+                    "done": 8400,
+                    "failed": 12,
+                    "pending": 11588,
+                    "percent_complete": 42.06,
+                    "eta_seconds": 1380,
+                    "failures": [
+                        {"its_id": "30320819", "error": "No data found for ITS_ID: 30320819"}
+                    ]
+                }
+            }
+        }
+
+
+
+class MuminImportResponse(BaseModel):
+    """Response model for bulk import of an ITS member dump"""
+    success: bool
+    message: str
+    read: int = 0
+    invalid: int = 0
+    staged: int = 0
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "message": "Import completed: 120 inserted, 340 updated, 19540 unchanged, 2 invalid",
+                "read": 20002,
+                "invalid": 2,
+                "staged": 20000,
+                "inserted": 120,
+                "updated": 340,
+                "skipped": 19540
+            }
+        }
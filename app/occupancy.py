@@ -0,0 +1,118 @@
+# app/occupancy.py
+"""
+In-memory duty occupancy (assigned vs quota) per miqaat
+
+A miqaat's duties are loaded with one aggregate query the first time
+they are asked for, then kept current by apply() on every committed
+guard duty insert/delete. Entries are reloaded after
+DUTY_OCCUPANCY_RESYNC_SECONDS so changes made by other workers or
+directly in the database are picked up.
+"""
+from app.config import pg_table
+from psycopg2.extras import RealDictCursor
+from typing import Optional, Dict
+from datetime import datetime
+import threading
+import time
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DUTY_OCCUPANCY_RESYNC_SECONDS = int(os.getenv("DUTY_OCCUPANCY_RESYNC_SECONDS", "300"))
+
+
+class DutyOccupancyIndex:
+    """
+    miqaat_id -> {duty_id -> quota/assigned}, updated incrementally
+
+    Reads are O(duties in the miqaat) and never touch guard rows once the
+    miqaat is loaded. Deltas for miqaats that are not loaded are ignored;
+    the next load counts them anyway.
+    """
+
+    def __init__(self, resync_seconds: int = DUTY_OCCUPANCY_RESYNC_SECONDS):
+        self.resync_seconds = resync_seconds
+        self._lock = threading.Lock()
+        self._miqaats: Dict[int, dict] = {}
+        self._duty_miqaat: Dict[int, int] = {}
+
+    def _load(self, conn, miqaat_id: int) -> dict:
+        """Count active assignments per duty of one miqaat"""
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(
+                f"""
+                SELECT d.duty_id, d.team_id, d.location, d.quota,
+                       COUNT(g.its_id) AS assigned
+                FROM {pg_table('duty')} d
+                LEFT JOIN {pg_table('guard_duty')} g
+                       ON g.duty_id = d.duty_id AND g.status = 1
+                WHERE d.miqaat_id = %s
+                GROUP BY d.duty_id, d.team_id, d.location, d.quota
+                """,
+                (miqaat_id,)
+            )
+            rows = cursor.fetchall()
+        conn.commit()
+
+        return {
+            "loaded_at": time.monotonic(),
+            "synced_at": datetime.now(),
+            "duties": {row["duty_id"]: dict(row) for row in rows}
+        }
+
+    def get(self, conn, miqaat_id: int) -> dict:
+        """Occupancy of every duty in a miqaat, loading or resyncing if needed"""
+        with self._lock:
+            entry = self._miqaats.get(miqaat_id)
+            fresh = entry and time.monotonic() - entry["loaded_at"] < self.resync_seconds
+
+        if not fresh:
+            entry = self._load(conn, miqaat_id)
+            with self._lock:
+                self._miqaats[miqaat_id] = entry
+                for duty_id in entry["duties"]:
+                    self._duty_miqaat[duty_id] = miqaat_id
+            logger.debug(f"Duty occupancy loaded for miqaat {miqaat_id}: {len(entry['duties'])} duties")
+
+        with self._lock:
+            duties = [
+                {
+                    **duty,
+                    "available": None if duty["quota"] is None else max(duty["quota"] - duty["assigned"], 0)
+                }
+                for duty in entry["duties"].values()
+            ]
+            synced_at = entry["synced_at"]
+
+        duties.sort(key=lambda d: d["duty_id"])
+        return {
+            "miqaat_id": miqaat_id,
+            "synced_at": synced_at,
+            "total_quota": sum(d["quota"] or 0 for d in duties),
+            "total_assigned": sum(d["assigned"] for d in duties),
+            "duties": duties
+        }
+
+    def apply(self, duty_id: Optional[int], delta: int) -> None:
+        """Add delta (+1 assign / -1 remove) to a loaded duty's count"""
+        if not duty_id:
+            return
+        with self._lock:
+            miqaat_id = self._duty_miqaat.get(duty_id)
+            entry = self._miqaats.get(miqaat_id)
+            duty = entry["duties"].get(duty_id) if entry else None
+            if duty:
+                duty["assigned"] = max(duty["assigned"] + delta, 0)
+
+    def invalidate(self, *miqaat_ids: Optional[int]) -> None:
+        """Drop cached miqaats (duties added, edited or deleted) so they reload"""
+        with self._lock:
+            for miqaat_id in miqaat_ids:
+                entry = self._miqaats.pop(miqaat_id, None)
+                if entry:
+                    for duty_id in entry["duties"]:
+                        self._duty_miqaat.pop(duty_id, None)
+
+
+duty_occupancy = DutyOccupancyIndex()
@@ -0,0 +1,103 @@
+# app/pagination.py
+"""
+Keyset pagination for the list endpoints
+
+Pages are addressed by an opaque cursor holding the sort key of the last
+row returned, so fetching page N costs the same as page 1 (no OFFSET
+scan). Filters are applied in SQL on the columns the base query exposes.
+"""
+from fastapi import HTTPException, status
+from psycopg2.extras import RealDictCursor
+from typing import Optional, List, Tuple, Any, Sequence
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key of the last row as an opaque URL-safe token"""
+    raw = json.dumps(list(values), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, width: int) -> list:
+    """Decode a cursor token; raises 400 if it is malformed"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        values = None
+
+    if not isinstance(values, list) or len(values) != width:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    return values
+
+
+def keyset_page(
+    conn,
+    base_query: str,
+    base_params: Sequence[Any],
+    filters: List[Tuple[str, Any]],
+    key_columns: List[str],
+    limit: Optional[int],
+    cursor: Optional[str],
+    descending: bool = False
+) -> dict:
+    """
+    Run one page of base_query ordered by key_columns
+
+    filters is a list of (sql_condition, value) pairs on the base query's
+    output columns, each with one %s placeholder; pairs whose value is None
+    are skipped. key_columns must be unique together (end with the primary
+    key) so the cursor position is unambiguous.
+
+    Returns {"items", "next_cursor", "has_more", "limit"}.
+    """
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+    conditions = []
+    params = list(base_params)
+    for condition, value in filters:
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+
+    if cursor:
+        after = decode_cursor(cursor, len(key_columns))
+        keys = ", ".join(key_columns)
+        marks = ", ".join(["%s"] * len(key_columns))
+        conditions.append(f"({keys}) {'<' if descending else '>'} ({marks})")
+        params.extend(after)
+
+    direction = " DESC" if descending else ""
+    order_by = ", ".join(f"{column}{direction}" for column in key_columns)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    query = f"""
+        SELECT * FROM ({base_query}) AS page
+        {where}
+        ORDER BY {order_by}
+        LIMIT {limit + 1}
+    """
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(query, params)
+        rows = [dict(row) for row in cur.fetchall()]
+
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([items[-1][column] for column in key_columns])
+
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "limit": limit
+    }
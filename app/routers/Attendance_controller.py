@@ -1,17 +1,50 @@
 # app/routers/Attendance_controller.py
-from fastapi import APIRouter, HTTPException, status, Depends
-from app.models.attendance import AttendanceInsertRequest, AttendanceResponse
-from app.db import get_db_connection
-from app.config import PG_CONFIG
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from app.models.attendance import (
+    AttendanceInsertRequest,
+    AttendanceBatchRequest,
+    AttendanceBatchRecord,
+    GateScanRequest,
+    GateScanResponse,
+    AttendanceBatchItemResult,
+    AttendanceBatchResponse,
+    AttendanceResponse
+)
+from app.db import get_db_connection, get_sync_db_connection, call_function
+from app.config import PG_CONFIG, pg_table
 from app.auth import get_current_user
+from app.idempotency import idempotency_store
+from app.attendance_index import attendance_scans
+from app.attendance_counters import attendance_counters, counter_stream, load_counters
+from typing import Optional
+from collections import deque
+from datetime import datetime
 import traceback
 import logging
+import threading
+import json
+import glob
+import os
 from psycopg2.extras import RealDictCursor
 
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/Attendance", tags=["Attendance"])
 
+# Write-behind mode: AttendanceInsert acknowledges after full validation and
+# a durable local append; a background thread flushes to Postgres in batches
+ATTENDANCE_WRITE_BEHIND = os.getenv("ATTENDANCE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+ATTENDANCE_WAL_DIR = os.getenv("ATTENDANCE_WAL_DIR", "attendance_wal")
+ATTENDANCE_FLUSH_INTERVAL_MS = int(os.getenv("ATTENDANCE_FLUSH_INTERVAL_MS", "500"))
+ATTENDANCE_FLUSH_MAX_RECORDS = int(os.getenv("ATTENDANCE_FLUSH_MAX_RECORDS", "500"))
+ATTENDANCE_WAL_COMPACT_BYTES = int(os.getenv("ATTENDANCE_WAL_COMPACT_BYTES", str(1024 * 1024)))
+
 
 # ============================================================================
 # INSERT ATTENDANCE RECORD
@@ -20,8 +53,34 @@ router = APIRouter(prefix="/Attendance", tags=["Attendance"])
 @router.post("/AttendanceInsert", response_model=AttendanceResponse)
 async def attendance_insert(
     payload: AttendanceInsertRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    Insert one attendance record
+
+    Retries that repeat the Idempotency-Key header get the first
+    attempt's response back without calling spr_attendance_insert again.
+    """
+    user_id = current_user.get("its_id")
+    body = payload.model_dump()
+    
+    replay = idempotency_store.begin("AttendanceInsert", user_id, idempotency_key, body)
+    if replay is not None:
+        logger.info(f"Replaying attendance response for Idempotency-Key {idempotency_key}")
+        return AttendanceResponse(**replay)
+    
+    try:
+        response = await run_attendance_insert(payload, current_user)
+    except Exception:
+        idempotency_store.abandon("AttendanceInsert", user_id, idempotency_key)
+        raise
+    
+    idempotency_store.finish("AttendanceInsert", user_id, idempotency_key, body, response.model_dump())
+    return response
+
+
+async def run_attendance_insert(payload: AttendanceInsertRequest, current_user: dict) -> AttendanceResponse:
     try:
         # Log the request
         logger.info(
@@ -29,7 +88,31 @@ async def attendance_insert(
             f"for its_id: {payload.its_id}, miqaat_id: {payload.miqaat_id}, team_id: {payload.team_id}"
         )
         
+        if attendance_write_behind.running:
+            with get_db_connection() as conn:
+                result_value, status_code, message = buffer_attendance(
+                    conn, payload.form_name, payload.user_id, payload.its_id, payload.miqaat_id, payload.team_id
+                )
+            if result_value != 1:
+                logger.warning(f"Buffered attendance for ITS {payload.its_id} not accepted: {message}")
+            return AttendanceResponse(
+                success=result_value == 1,
+                status_code=status_code,
+                message=message,
+                result=result_value
+            )
+        
         with get_db_connection() as conn:
+            # Known repeat scan: answer without calling the procedure
+            if attendance_scans.contains(conn, payload.miqaat_id, payload.its_id):
+                logger.info(f"Duplicate attendance for ITS {payload.its_id} answered from scan index")
+                return AttendanceResponse(
+                    success=False,
+                    status_code=409,
+                    message="Attendance record already exists for this member",
+                    result=4
+                )
+            
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 # Call the PostgreSQL function
                 # IMPORTANT: Pass all parameters explicitly
@@ -56,6 +139,8 @@ async def attendance_insert(
                     if result_value == 1:
                         # Success - COMMIT the transaction
                         conn.commit()
+                        attendance_scans.add([(payload.its_id, payload.miqaat_id)])
+                        attendance_counters.record_attendance(payload.miqaat_id, payload.its_id, payload.team_id)
                         logger.info(f"Attendance record committed: attendance for ITS {payload.its_id}")
                         return AttendanceResponse(
                             success=True,
@@ -66,6 +151,7 @@ async def attendance_insert(
                     elif result_value == 4:
                         # Duplicate entry - ROLLBACK the transaction
                         conn.rollback()
+                        attendance_scans.add([(payload.its_id, payload.miqaat_id)])
                         logger.warning(f"Duplicate attendance detected for ITS {payload.its_id}")
                         return AttendanceResponse(
                             success=False,
@@ -111,6 +197,741 @@ async def attendance_insert(
         )
 
 
+# ============================================================================
+# BATCH ATTENDANCE INSERT
+# ============================================================================
+
+# Result codes of spr_attendance_insert, per batch record
+ATTENDANCE_MESSAGES = {
+    1: "Attendance record inserted successfully",
+    4: "Attendance record already exists for this member",
+    0: "Failed to insert attendance record"
+}
+
+# Advisory lock class serialising attendance writes per its_id
+ATTENDANCE_LOCK_CLASS = 720_283
+
+
+def find_existing_attendance(cursor, pairs) -> set:
+    """(its_id, miqaat_id) pairs that already have attendance - one query"""
+    if not pairs:
+        return set()
+    its_ids, miqaat_ids = zip(*pairs)
+    cursor.execute(
+        f"""
+        SELECT DISTINCT a.its_id, a.miqaat_id
+        FROM {pg_table('attendance')} a
+        JOIN unnest(%s::bigint[], %s::bigint[]) AS p(its_id, miqaat_id)
+          ON a.its_id = p.its_id AND a.miqaat_id = p.miqaat_id
+        """,
+        (list(its_ids), list(miqaat_ids))
+    )
+    return {(row["its_id"], row["miqaat_id"]) for row in cursor.fetchall()}
+
+
+def apply_attendance_batch(conn, form_name: str, user_id: int, records) -> tuple:
+    """
+    Insert many attendance records in one transaction and commit
+
+    Duplicates are settled set-based before any insert: repeats inside the
+    batch, pairs in the attendance scan index and pairs already in the
+    attendance table get 4 without calling the procedure. The rest go
+    through spr_attendance_insert in their own savepoint so one failure
+    only undoes that record; a record's scanned_at/device_id are stored
+    on the row it inserted. Per-its_id advisory locks keep concurrent
+    batches from both inserting the same guard. Returns (results, summary).
+    """
+    results = []
+    summary = {"inserted": 0, "duplicate": 0, "failed": 0}
+    
+    try:
+        pairs = {(r.its_id, r.miqaat_id) for r in records}
+        seen = attendance_scans.known(pairs, conn)
+        unresolved = pairs - seen
+        
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            for its_id in sorted({its_id for its_id, _ in unresolved}):
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (ATTENDANCE_LOCK_CLASS, its_id))
+            
+            if unresolved:
+                seen |= find_existing_attendance(cursor, unresolved)
+            
+            for index, record in enumerate(records):
+                key = (record.its_id, record.miqaat_id)
+                if key in seen:
+                    result_value = 4
+                else:
+                    seen.add(key)
+                    cursor.execute("SAVEPOINT attendance_item")
+                    try:
+                        cursor.execute(
+                            f"SELECT * FROM {PG_CONFIG['schema']}.spr_attendance_insert(%s, %s, %s, %s, %s)",
+                            (form_name, user_id, record.its_id, record.miqaat_id, record.team_id)
+                        )
+                        row = cursor.fetchone()
+                        result_value = (row.get('o_result', 0) if row else 0) or 0
+                        if result_value == 1 and (record.scanned_at or record.device_id):
+                            cursor.execute(
+                                f"""
+                                UPDATE {pg_table('attendance')}
+                                SET scanned_at = %s, device_id = %s
+                                WHERE its_id = %s AND miqaat_id = %s
+                                """,
+                                (record.scanned_at, record.device_id, record.its_id, record.miqaat_id)
+                            )
+                    except Exception as item_ex:
+                        logger.error(f"Attendance batch record {index} failed: {str(item_ex)}")
+                        result_value = 0
+                    
+                    if result_value == 1:
+                        cursor.execute("RELEASE SAVEPOINT attendance_item")
+                    else:
+                        result_value = 4 if result_value == 4 else 0
+                        cursor.execute("ROLLBACK TO SAVEPOINT attendance_item")
+                
+                summary[{1: "inserted", 4: "duplicate"}.get(result_value, "failed")] += 1
+                results.append(AttendanceBatchItemResult(
+                    index=index,
+                    its_id=record.its_id,
+                    miqaat_id=record.miqaat_id,
+                    result=result_value,
+                    message=ATTENDANCE_MESSAGES[result_value]
+                ))
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    attendance_scans.add((r.its_id, r.miqaat_id) for r in results if r.result in (1, 4))
+    for result in results:
+        if result.result == 1:
+            attendance_counters.record_attendance(result.miqaat_id, result.its_id, records[result.index].team_id)
+    return results, summary
+
+
+@router.post("/AttendanceBatchInsert", response_model=AttendanceBatchResponse)
+async def attendance_batch_insert(
+    payload: AttendanceBatchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Insert a scanner's buffered attendance records in one transaction
+    
+    Per-record result: 1 inserted, 4 duplicate (already recorded, or
+    repeated in this batch), 0 failed. Safe to resend after offline
+    scanning - records already stored come back as 4.
+    """
+    try:
+        logger.info(
+            f"Attendance batch requested by user {current_user.get('its_id')}: "
+            f"{len(payload.records)} records"
+        )
+        
+        with get_db_connection() as conn:
+            results, summary = apply_attendance_batch(
+                conn, payload.form_name, payload.user_id, payload.records
+            )
+        
+        logger.info(f"Attendance batch completed: {summary}")
+        
+        return AttendanceBatchResponse(
+            success=summary["failed"] == 0,
+            status_code=200,
+            message=f"Processed {len(results)} attendance records",
+            summary=summary,
+            results=results
+        )
+    
+    except Exception as ex:
+        logger.error(f"Error in attendance batch insert: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+
+# ============================================================================
+# GATE SCAN (GUARD CHECK + ATTENDANCE)
+# ============================================================================
+
+def apply_gate_scan(conn, payload: GateScanRequest) -> GateScanResponse:
+    """
+    Verify a guard and record their attendance on one connection
+    
+    spr_guards GUARD-CHECK and spr_attendance_insert run in the same
+    transaction, and attendance is only inserted for a guard the check
+    accepts. Repeat scans known to the scan index skip the insert; in
+    write-behind mode buffer_attendance validates the scan and buffers the
+    insert instead.
+    """
+    try:
+        duplicate = attendance_scans.contains(conn, payload.miqaat_id, payload.its_id)
+        
+        guard = call_function(
+            conn,
+            f"{PG_CONFIG['schema']}.spr_guards",
+            {
+                "p_query_type": "GUARD-CHECK",
+                "p_date": None,
+                "p_its_id": payload.its_id,
+                "p_miqaat_id": None,
+                "p_duty_id": None,
+                "p_team_id": None
+            }
+        )
+        if isinstance(guard, str):
+            guard = json.loads(guard)
+        if not isinstance(guard, dict):
+            conn.rollback()
+            return GateScanResponse(
+                success=False,
+                status_code=500,
+                message="Invalid response format from database"
+            )
+        if not guard.get("success", False):
+            conn.rollback()
+            return GateScanResponse(
+                success=False,
+                status_code=guard.get("status_code", 404),
+                message=guard.get("message", "Guard check failed"),
+                guard=guard.get("data")
+            )
+        
+        if duplicate:
+            conn.rollback()
+            result_value = 4
+        elif attendance_write_behind.running:
+            result_value, status_code, message = buffer_attendance(
+                conn, payload.form_name, payload.user_id, payload.its_id, payload.miqaat_id, payload.team_id
+            )
+            return GateScanResponse(
+                success=result_value == 1,
+                status_code=status_code,
+                message=message,
+                result=result_value,
+                guard=guard.get("data")
+            )
+        else:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    f"SELECT * FROM {PG_CONFIG['schema']}.spr_attendance_insert(%s, %s, %s, %s, %s)",
+                    (payload.form_name, payload.user_id, payload.its_id, payload.miqaat_id, payload.team_id)
+                )
+                row = cursor.fetchone()
+            result_value = (row.get('o_result', 0) if row else 0) or 0
+            
+            if result_value == 1:
+                conn.commit()
+                attendance_counters.record_attendance(payload.miqaat_id, payload.its_id, payload.team_id)
+            else:
+                conn.rollback()
+            if result_value in (1, 4):
+                attendance_scans.add([(payload.its_id, payload.miqaat_id)])
+    except Exception:
+        conn.rollback()
+        raise
+    
+    if result_value not in ATTENDANCE_MESSAGES:
+        result_value = 0
+    return GateScanResponse(
+        success=result_value == 1,
+        status_code={1: 200, 4: 409}.get(result_value, 500),
+        message=ATTENDANCE_MESSAGES[result_value],
+        result=result_value,
+        guard=guard.get("data")
+    )
+
+
+@router.post("/GateScan", response_model=GateScanResponse)
+async def gate_scan(
+    payload: GateScanRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Guard check and attendance insert in one request
+    
+    Replaces calling Guards/GuardCheck and then AttendanceInsert at the
+    gate: one pool checkout, one transaction. Returns the guard details
+    with result 1 (recorded), 4 (already recorded) or 0 (failed); a guard
+    the check rejects gets its status code and no attendance.
+    """
+    try:
+        logger.info(
+            f"Gate scan by user {current_user.get('its_id')} "
+            f"for its_id: {payload.its_id}, miqaat_id: {payload.miqaat_id}, team_id: {payload.team_id}"
+        )
+        
+        with get_db_connection() as conn:
+            response = apply_gate_scan(conn, payload)
+        
+        logger.info(f"Gate scan for ITS {payload.its_id}: status={response.status_code}, result={response.result}")
+        return response
+    
+    except Exception as ex:
+        logger.error(f"Error processing gate scan: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+
+# ============================================================================
+# WRITE-BEHIND ATTENDANCE BUFFER
+# ============================================================================
+
+class AttendanceWriteBehind:
+    """
+    Durable local buffer in front of the attendance table
+
+    append() writes one JSON line to attendance.<pid>.wal and fsyncs it
+    before returning, so an acknowledged scan survives a crash. A daemon
+    thread flushes pending records through apply_attendance_batch every
+    flush_interval_ms or as soon as flush_max_records are waiting, then
+    records the last flushed sequence number in attendance.<pid>.checkpoint.
+    On start, WAL entries after the checkpoint are replayed; a replay
+    after a crash between commit and checkpoint is harmless because the
+    batch path reports already-stored records as duplicates.
+
+    Each worker owns its files and holds an flock on attendance.<pid>.lock
+    while running, so workers never share a sequence or truncate each
+    other's WAL. A WAL whose lock nobody holds was left by a dead worker
+    and is adopted by the next worker to start.
+
+    Records the database rejects at flush time (result 0) were already
+    acknowledged, so they are appended to attendance.deadletter.jsonl
+    and listed in WriteBehindStatus rather than dropped.
+    """
+    
+    def __init__(
+        self,
+        wal_dir: str = ATTENDANCE_WAL_DIR,
+        flush_interval_ms: int = ATTENDANCE_FLUSH_INTERVAL_MS,
+        flush_max_records: int = ATTENDANCE_FLUSH_MAX_RECORDS
+    ):
+        self.wal_dir = wal_dir
+        self.wal_path: Optional[str] = None
+        self.checkpoint_path: Optional[str] = None
+        self.dead_letter_path = os.path.join(wal_dir, "attendance.deadletter.jsonl")
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_max_records = flush_max_records
+        
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._wal = None
+        self._wal_lock = None
+        self._seq = 0
+        self._pending: deque = deque()
+        self._pending_keys: set = set()
+        self._dead_letters: deque = deque(maxlen=100)
+        self._metrics = {
+            "accepted": 0,
+            "duplicate_in_buffer": 0,
+            "replayed": 0,
+            "adopted": 0,
+            "flushed": 0,
+            "inserted": 0,
+            "duplicate": 0,
+            "failed": 0,
+            "dead_lettered": 0,
+            "flush_errors": 0,
+            "last_flush_at": None,
+            "last_error": None
+        }
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    # ----- WAL -----
+    
+    def _paths(self, name: str) -> tuple:
+        """(wal, checkpoint, lock) paths for a WAL name such as attendance.1234"""
+        base = os.path.join(self.wal_dir, name)
+        return f"{base}.wal", f"{base}.checkpoint", f"{base}.lock"
+    
+    @staticmethod
+    def _try_lock(lock_path: str):
+        """Open and flock a lock file; None if a live worker already holds it"""
+        fh = open(lock_path, "a")
+        if fcntl is None:
+            return fh
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return None
+        return fh
+    
+    @staticmethod
+    def _read_checkpoint(checkpoint_path: str) -> int:
+        try:
+            with open(checkpoint_path) as fh:
+                return int(fh.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+    
+    def _write_checkpoint(self, seq: int) -> None:
+        """Atomically replace the checkpoint (write temp, fsync, rename)"""
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as fh:
+            fh.write(str(seq))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+    
+    @staticmethod
+    def _read_wal(wal_path: str, checkpoint: int) -> tuple:
+        """(highest seq, entries after the checkpoint) of one WAL file"""
+        last_seq, entries = checkpoint, []
+        if not os.path.exists(wal_path):
+            return last_seq, entries
+        
+        with open(wal_path) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn final line from a crash mid-append - never acknowledged
+                    logger.warning(f"Skipping unreadable line in {wal_path}")
+                    continue
+                last_seq = max(last_seq, entry["seq"])
+                if entry["seq"] > checkpoint:
+                    entries.append(entry)
+        return last_seq, entries
+    
+    def _write_dead_letters(self, entries: list) -> None:
+        """Append records that failed at flush to the dead-letter file (fsynced)"""
+        with open(self.dead_letter_path, "a") as fh:
+            for entry in entries:
+                fh.write(json.dumps(entry, default=str) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+    
+    def _replay(self) -> None:
+        """Queue this worker's WAL entries written after its last checkpoint"""
+        self._seq, entries = self._read_wal(self.wal_path, self._read_checkpoint(self.checkpoint_path))
+        for entry in entries:
+            self._pending.append(entry)
+            self._pending_keys.add((entry["its_id"], entry["miqaat_id"]))
+        self._metrics["replayed"] += len(entries)
+        
+        if entries:
+            logger.info(f"Replaying {len(entries)} unflushed attendance records")
+    
+    def _adopt_orphans(self) -> None:
+        """
+        Take over WALs of workers that are gone (their lock is free)
+
+        Unflushed entries are re-appended to this worker's WAL before the
+        orphan's files are removed, so a crash in between only replays
+        them twice, which the batch path reports as duplicates.
+        """
+        if fcntl is None:
+            # No flock (Windows): other workers' files cannot be told apart from live ones
+            return
+        
+        for wal_path in sorted(glob.glob(os.path.join(self.wal_dir, "attendance.*.wal"))):
+            if wal_path == self.wal_path:
+                continue
+            _, checkpoint_path, lock_path = self._paths(os.path.basename(wal_path)[:-len(".wal")])
+            lock = self._try_lock(lock_path)
+            if lock is None:
+                continue
+            try:
+                _, entries = self._read_wal(wal_path, self._read_checkpoint(checkpoint_path))
+                with self._lock:
+                    for entry in entries:
+                        if (entry["its_id"], entry["miqaat_id"]) not in self._pending_keys:
+                            self._append_entry({k: v for k, v in entry.items() if k != "seq"})
+                    self._metrics["adopted"] += len(entries)
+                for path in (wal_path, checkpoint_path, lock_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            finally:
+                lock.close()
+            
+            if entries:
+                logger.warning(f"Adopted {len(entries)} unflushed attendance records from {wal_path}")
+    
+    def _append_entry(self, entry: dict) -> None:
+        """Number, write and fsync one entry, then queue it; caller holds the lock"""
+        self._seq += 1
+        entry = {"seq": self._seq, **entry}
+        self._wal.write(json.dumps(entry) + "\n")
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        
+        self._pending.append(entry)
+        self._pending_keys.add((entry["its_id"], entry["miqaat_id"]))
+    
+    def append(self, form_name: str, user_id: int, its_id: int, miqaat_id: int, team_id: int) -> int:
+        """
+        Durably buffer one scan; returns 1 (accepted) or 4 (already pending)
+        """
+        with self._lock:
+            key = (its_id, miqaat_id)
+            if key in self._pending_keys:
+                self._metrics["duplicate_in_buffer"] += 1
+                return 4
+            
+            self._append_entry({
+                "form_name": form_name,
+                "user_id": user_id,
+                "its_id": its_id,
+                "miqaat_id": miqaat_id,
+                "team_id": team_id,
+                "received_at": datetime.now().isoformat()
+            })
+            self._metrics["accepted"] += 1
+            should_wake = len(self._pending) >= self.flush_max_records
+        
+        if should_wake:
+            self._wake.set()
+        return 1
+    
+    # ----- flushing -----
+    
+    def flush(self) -> int:
+        """Write up to flush_max_records pending entries; returns how many were flushed"""
+        with self._lock:
+            batch = [self._pending[i] for i in range(min(len(self._pending), self.flush_max_records))]
+        if not batch:
+            return 0
+        
+        groups = {}
+        for entry in batch:
+            groups.setdefault((entry["form_name"], entry["user_id"]), []).append(entry)
+        
+        summary = {"inserted": 0, "duplicate": 0, "failed": 0}
+        dead_letters = []
+        with get_sync_db_connection() as conn:
+            for (form_name, user_id), entries in groups.items():
+                records = [
+                    AttendanceBatchRecord(
+                        its_id=entry["its_id"],
+                        miqaat_id=entry["miqaat_id"],
+                        team_id=entry["team_id"],
+                        scanned_at=entry["received_at"]
+                    )
+                    for entry in entries
+                ]
+                results, group_summary = apply_attendance_batch(conn, form_name, user_id, records)
+                for key in summary:
+                    summary[key] += group_summary[key]
+                dead_letters.extend(
+                    {**entries[r.index], "failed_at": datetime.now().isoformat(), "message": r.message}
+                    for r in results if r.result == 0
+                )
+        
+        # Before the checkpoint: a crash in between re-flushes the batch, never loses a failure
+        if dead_letters:
+            self._write_dead_letters(dead_letters)
+        self._write_checkpoint(batch[-1]["seq"])
+        
+        with self._lock:
+            for entry in batch:
+                self._pending.popleft()
+                self._pending_keys.discard((entry["its_id"], entry["miqaat_id"]))
+            self._metrics["flushed"] += len(batch)
+            for key, value in summary.items():
+                self._metrics[key] += value
+            self._metrics["dead_lettered"] += len(dead_letters)
+            self._dead_letters.extend(dead_letters)
+            self._metrics["last_flush_at"] = datetime.now()
+            
+            # Nothing left to replay: start a fresh WAL so it does not grow forever
+            if not self._pending and self._wal.tell() > ATTENDANCE_WAL_COMPACT_BYTES:
+                self._wal.truncate(0)
+                self._wal.seek(0)
+                os.fsync(self._wal.fileno())
+        
+        if dead_letters:
+            logger.error(f"Attendance flush: {len(dead_letters)} records failed, written to {self.dead_letter_path}")
+        return len(batch)
+    
+    def _run(self) -> None:
+        backoff = self.flush_interval
+        while not self._stop.is_set():
+            self._wake.wait(backoff)
+            self._wake.clear()
+            try:
+                while self.flush() >= self.flush_max_records:
+                    pass
+                backoff = self.flush_interval
+            except Exception as ex:
+                # Keep everything pending and retry; the WAL still has it
+                self._metrics["flush_errors"] += 1
+                self._metrics["last_error"] = str(ex)
+                logger.error(f"Attendance flush failed: {str(ex)}")
+                backoff = min(backoff * 2, 30.0)
+    
+    def start(self) -> None:
+        """Replay unflushed entries, open the WAL and start the flush thread"""
+        if self.running:
+            return
+        os.makedirs(self.wal_dir, exist_ok=True)
+        self.wal_path, self.checkpoint_path, lock_path = self._paths(f"attendance.{os.getpid()}")
+        self._wal_lock = self._try_lock(lock_path)
+        if self._wal_lock is None:
+            logger.error(f"Attendance write-behind not started: {lock_path} is held by another process")
+            return
+        self._replay()
+        self._wal = open(self.wal_path, "a")
+        self._adopt_orphans()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="attendance-write-behind", daemon=True)
+        self._thread.start()
+        self._wake.set()
+        logger.info(f"Attendance write-behind started (WAL {self.wal_path})")
+    
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flush thread after a final flush attempt"""
+        if not self.running:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        try:
+            while self.flush():
+                pass
+        except Exception as ex:
+            logger.error(f"Final attendance flush failed, will replay on restart: {str(ex)}")
+        if self._wal:
+            self._wal.close()
+        if not self._pending:
+            # Everything is in Postgres: leave no files behind for adoption
+            for path in (self.wal_path, self.checkpoint_path, f"{self.checkpoint_path}.tmp", self._wal_lock.name):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._wal_lock.close()
+        logger.info("Attendance write-behind stopped")
+    
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                **self._metrics,
+                "running": self.running,
+                "pending": len(self._pending),
+                "dead_letter_path": self.dead_letter_path,
+                "recent_dead_letters": list(self._dead_letters)
+            }
+
+
+attendance_write_behind = AttendanceWriteBehind()
+
+
+def buffer_attendance(conn, form_name: str, user_id: int, its_id: int, miqaat_id: int, team_id: int) -> tuple:
+    """
+    Validate a scan like the synchronous insert, then hand it to the write-behind buffer
+
+    Only the commit is deferred, never the validation. A repeat scan
+    known to the scan index and a team that differs from the guard's
+    assignment in the live counters are rejected from memory; everything
+    else spr_attendance_insert enforces is checked by running it and
+    rolling it back. Returns (result, status_code, message): (1, 202)
+    buffered, (4, 409) already recorded, (0, 422) rejected.
+    """
+    if attendance_scans.contains(conn, miqaat_id, its_id):
+        return 4, 409, ATTENDANCE_MESSAGES[4]
+    
+    assignment = attendance_counters.assignment(conn, miqaat_id, its_id)
+    if assignment and assignment[0] is not None and assignment[0] != team_id:
+        return 0, 422, f"Guard is assigned to team {assignment[0]} in this miqaat, not team {team_id}"
+    
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(
+                f"SELECT * FROM {PG_CONFIG['schema']}.spr_attendance_insert(%s, %s, %s, %s, %s)",
+                (form_name, user_id, its_id, miqaat_id, team_id)
+            )
+            row = cursor.fetchone()
+        result_value = (row.get('o_result', 0) if row else 0) or 0
+    finally:
+        # Validation only - the buffered record is inserted at flush
+        conn.rollback()
+    
+    if result_value == 4:
+        attendance_scans.add([(its_id, miqaat_id)])
+        return 4, 409, ATTENDANCE_MESSAGES[4]
+    if result_value != 1:
+        return 0, 422, "Attendance rejected: guard is not eligible for this miqaat and team"
+    
+    if attendance_write_behind.append(form_name, user_id, its_id, miqaat_id, team_id) == 4:
+        return 4, 409, ATTENDANCE_MESSAGES[4]
+    return 1, 202, "Attendance record accepted"
+
+
+@router.get("/WriteBehindStatus")
+async def attendance_write_behind_status(current_user: dict = Depends(get_current_user)):
+    """Pending count, flush metrics and recent dead letters of the write-behind buffer"""
+    return {
+        "success": True,
+        "status_code": 200,
+        "message": "Write-behind enabled" if ATTENDANCE_WRITE_BEHIND else "Write-behind disabled",
+        "data": attendance_write_behind.metrics()
+    }
+
+
+# ============================================================================
+# LIVE ATTENDANCE COUNTERS
+# ============================================================================
+
+@router.get("/LiveCounters")
+async def get_live_attendance_counters(
+    miqaat_id: int = Query(..., description="Miqaat to report"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Reported vs expected guards for a miqaat, per team and per duty
+    
+    Served from in-memory counters kept current by the attendance and
+    guard duty write paths; the database is only read to (re)build them.
+    """
+    try:
+        snapshot = await load_counters(miqaat_id)
+        
+        return {
+            "success": True,
+            "status_code": 200,
+            "message": f"{snapshot['reported']} of {snapshot['expected']} reported",
+            "data": snapshot
+        }
+    
+    except Exception as ex:
+        logger.error(f"Error retrieving attendance counters: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+
+@router.get("/LiveCounters/Stream")
+async def attendance_counter_stream(
+    request: Request,
+    miqaat_id: int = Query(..., description="Miqaat to follow"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Server-Sent Events stream of a miqaat's attendance counters
+    
+    Sends an attendance.counters event with the full snapshot whenever
+    the counters change, at most once per ATTENDANCE_COUNTERS_PUSH_SECONDS.
+    """
+    logger.info(f"Attendance counter stream opened by user {current_user.get('its_id')} for miqaat {miqaat_id}")
+    
+    return StreamingResponse(
+        counter_stream(request, miqaat_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ============================================================================
 # HEALTH CHECK
 # ============================================================================
@@ -127,6 +948,11 @@ async def attendance_health_check():
         "service": "Attendance Management",
         "endpoints": [
             "POST /Attendance/AttendanceInsert",
+            "POST /Attendance/AttendanceBatchInsert",
+            "POST /Attendance/GateScan",
+            "GET /Attendance/WriteBehindStatus",
+            "GET /Attendance/LiveCounters",
+            "GET /Attendance/LiveCounters/Stream",
             "POST /Attendance/InsertMyAttendance"
         ]
     }
\ No newline at end of file
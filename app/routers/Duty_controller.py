@@ -1,5 +1,7 @@
 # app/routers/Duty_controller.py
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Header
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from app.models.duty import (
     TeamDutyRequest, 
     GuardDutyRequest,
@@ -8,15 +10,32 @@ from app.models.duty import (
     DutyInsertRequest,
     DutyUpdateRequest,
     DutyDeleteRequest,
+    DutyBulkInsertRequest,
+    DutyBulkUpdateRequest,
     GuardDutyInsertRequest,
+    GuardDutyBulkRequest,
+    GuardDutyBulkItem,
+    AutoAllocateRequest,
     DutyResponse,
     DutyCRUDResponse,
-    GuardDutyInsertResponse
+    GuardDutyInsertResponse,
+    GuardDutyBulkItemResult,
+    GuardDutyBulkResponse,
+    DutyBulkItemResult,
+    DutyBulkResponse
 )
-from app.db import get_db_connection, call_function
-from app.config import PG_CONFIG
+from app.db import get_db_connection, run_with_sync_connection, call_function
+from app.config import PG_CONFIG, pg_table
 from app.auth import get_current_user
-import psycopg2
+from app.pagination import keyset_page, MAX_PAGE_SIZE
+from app.events import duty_events, sse_stream
+from app.occupancy import duty_occupancy
+from app.cache import miqaat_roster_cache
+from app.schedule import guard_schedule
+from app.idempotency import idempotency_store
+from app.attendance_counters import attendance_counters
+from typing import Optional, Iterable, List
+from datetime import datetime
 from psycopg2.extras import RealDictCursor
 import traceback
 import logging
@@ -169,12 +188,64 @@ async def get_guard_duties_assigned(
 # GET ALL DUTIES
 # ============================================================================
 
-@router.get("/GetAllDuties", response_model=DutyResponse)
-async def get_all_duties(current_user: dict = Depends(get_current_user)):
+DUTY_LIST_QUERY = f"""
+    SELECT d.duty_id, d.team_id, t.team_name, t.jamiaat_id,
+           d.miqaat_id, mq.miqaat_name, mq.start_date, mq.end_date, mq.is_active,
+           d.quota, d.location,
+           (SELECT COUNT(*) FROM {pg_table('guard_duty')} g
+             WHERE g.duty_id = d.duty_id AND g.status = 1) AS assigned
+    FROM {pg_table('duty')} d
+    JOIN {pg_table('team')} t ON t.team_id = d.team_id
+    JOIN {pg_table('miqaat')} mq ON mq.miqaat_id = d.miqaat_id
+"""
+
 
+@router.get("/GetAllDuties", response_model=DutyResponse)
+async def get_all_duties(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables keyset pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    miqaat_id: Optional[int] = Query(None),
+    team_id: Optional[int] = Query(None),
+    jamiaat_id: Optional[int] = Query(None),
+    from_date: Optional[datetime] = Query(None, description="Miqaats ending on/after this time"),
+    to_date: Optional[datetime] = Query(None, description="Miqaats starting on/before this time"),
+    is_active: Optional[bool] = Query(None, description="Filter on the miqaat active flag"),
+    filled: Optional[bool] = Query(None, description="true: duties with assigned >= quota; false: duties with open slots"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get duties, newest first
+    
+    Without any query parameters the full list is returned as before.
+    With a page size, cursor or filter the list is paginated in SQL and
+    data is {"items", "next_cursor", "has_more", "limit"}.
+    """
     try:
         logger.info(f"Get all duties requested by user {current_user.get('its_id')}")
         
+        filters = [
+            ("miqaat_id = %s", miqaat_id),
+            ("team_id = %s", team_id),
+            ("jamiaat_id = %s", jamiaat_id),
+            ("end_date >= %s", from_date),
+            ("start_date <= %s", to_date),
+            ("is_active = %s", is_active),
+            ("(assigned >= COALESCE(quota, 0)) = %s", filled)
+        ]
+        
+        if limit is not None or cursor or any(value is not None for _, value in filters):
+            with get_db_connection() as conn:
+                page = keyset_page(
+                    conn, DUTY_LIST_QUERY, [], filters,
+                    key_columns=["duty_id"], limit=limit, cursor=cursor, descending=True
+                )
+            return DutyResponse(
+                success=True,
+                status_code=200,
+                message=f"{len(page['items'])} duties retrieved",
+                data=page
+            )
+        
         with get_db_connection() as conn:
             result = call_function(
                 conn,
@@ -216,6 +287,8 @@ async def get_all_duties(current_user: dict = Depends(get_current_user)):
                     data=None
                 )
             
+    except HTTPException:
+        raise
     except Exception as ex:
         logger.error(f"Error retrieving all duties: {str(ex)}")
         logger.error(traceback.format_exc())
@@ -470,6 +543,7 @@ async def insert_duty(
                 conn.commit()
                 
                 if result_code == 1:
+                    miqaat_duties_changed(payload.miqaat_id)
                     return DutyCRUDResponse(
                         success=True,
                         status_code=201,
@@ -520,6 +594,8 @@ async def update_duty(
         
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
+                audience = get_duty_audience(cursor, payload.duty_id)
+                
                 cursor.execute(
                     f"""
                     SELECT * FROM {PG_CONFIG['schema']}.spr_duty_update(
@@ -545,6 +621,16 @@ async def update_duty(
                 conn.commit()
                 
                 if result_code == 2:
+                    miqaat_duties_changed(audience["miqaat_id"], payload.miqaat_id)
+                    publish_duty_event(
+                        "duty.updated",
+                        audience["its_ids"],
+                        [audience["team_id"], payload.team_id],
+                        duty_id=payload.duty_id,
+                        team_id=payload.team_id,
+                        miqaat_id=payload.miqaat_id,
+                        location=payload.location
+                    )
                     return DutyCRUDResponse(
                         success=True,
                         status_code=200,
@@ -602,6 +688,8 @@ async def delete_duty(
         
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
+                audience = get_duty_audience(cursor, payload.duty_id)
+                
                 cursor.execute(
                     f"""
                     SELECT * FROM {PG_CONFIG['schema']}.spr_duty_delete(
@@ -623,6 +711,15 @@ async def delete_duty(
                 conn.commit()
                 
                 if result_code == 3:
+                    miqaat_duties_changed(audience["miqaat_id"])
+                    publish_duty_event(
+                        "duty.deleted",
+                        audience["its_ids"],
+                        [audience["team_id"]],
+                        duty_id=payload.duty_id,
+                        team_id=audience["team_id"],
+                        miqaat_id=audience["miqaat_id"]
+                    )
                     return DutyCRUDResponse(
                         success=True,
                         status_code=200,
@@ -654,62 +751,535 @@ async def delete_duty(
 
 
 # ============================================================================
-# GUARD DUTY INSERT/DELETE
+# BULK DUTY INSERT/UPDATE
 # ============================================================================
 
-@router.post("/GuardDutyInsert", response_model=GuardDutyInsertResponse)
-async def guard_duty_insert(
-    payload: GuardDutyInsertRequest,
-    current_user: dict = Depends(get_current_user)
-):
+# Result codes of spr_duty_insert (1) / spr_duty_update (2), per bulk item
+DUTY_INSERT_MESSAGES = {
+    1: "Duty created successfully",
+    4: "Duty already exists with same team, miqaat, and location",
+    0: "Failed to create duty"
+}
+DUTY_UPDATE_MESSAGES = {
+    2: "Duty updated successfully",
+    4: "Duty already exists with same team, miqaat, and location for another duty",
+    0: "Duty not found or update failed"
+}
+
+
+def duty_key(item) -> tuple:
+    """team/miqaat/location identity of a duty, ignoring case and outer spaces"""
+    return (item.team_id, item.miqaat_id, item.location.strip().casefold())
+
+
+def find_local_duty_conflicts(items) -> dict:
+    """
+    index -> message for items that clash with an earlier item in the batch
+
+    Catches repeated team/miqaat/location combinations (and, for updates,
+    the same duty_id twice) without a database round trip.
+    """
+    conflicts = {}
+    seen_keys = set()
+    seen_ids = set()
+    for index, item in enumerate(items):
+        duty_id = getattr(item, "duty_id", None)
+        if duty_id is not None:
+            if duty_id in seen_ids:
+                conflicts[index] = "Duty listed more than once in this request"
+                continue
+            seen_ids.add(duty_id)
+        key = duty_key(item)
+        if key in seen_keys:
+            conflicts[index] = "Duplicate team, miqaat and location in this request"
+            continue
+        seen_keys.add(key)
+    return conflicts
+
+
+def apply_duty_operations(conn, user_id, items, update: bool):
+    """
+    Insert or update many duties in one transaction and commit
 
-    conn = None
+    Items that clash inside the batch get 4 without touching the database;
+    the rest run spr_duty_insert / spr_duty_update in their own savepoint so
+    one rejected duty does not undo the others. Returns (results, summary).
+    """
+    messages = DUTY_UPDATE_MESSAGES if update else DUTY_INSERT_MESSAGES
+    success_code = 2 if update else 1
+    conflicts = find_local_duty_conflicts(items)
+    results = []
+    summary = {"created": 0, "updated": 0, "duplicate": 0, "failed": 0}
+    audiences = {}
+    
     try:
-        user_id = current_user.get("its_id")
-        
-        if payload.flag == 'I':
-            if not all([payload.duty_id, payload.team_id, payload.miqaat_id, payload.its_id]):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="INSERT operation requires: duty_id, team_id, miqaat_id, and its_id"
-                )
+        with conn.cursor() as cursor:
+            if update:
+                audiences = get_duty_audiences(cursor, [i.duty_id for i in items])
             
-            logger.info(
-                f"Guard duty INSERT requested by user {user_id}: "
-                f"duty_id={payload.duty_id}, team_id={payload.team_id}, "
-                f"miqaat_id={payload.miqaat_id}, its_id={payload.its_id}"
-            )
+            for index, item in enumerate(items):
+                if index in conflicts:
+                    result_code, message = 4, conflicts[index]
+                else:
+                    cursor.execute("SAVEPOINT duty_item")
+                    try:
+                        if update:
+                            cursor.execute(
+                                f"""
+                                SELECT * FROM {PG_CONFIG['schema']}.spr_duty_update(
+                                    %s, %s, %s, %s, %s, %s, %s
+                                )
+                                """,
+                                ('Duty_Management', user_id, item.duty_id, item.team_id,
+                                 item.miqaat_id, item.quota, item.location)
+                            )
+                        else:
+                            cursor.execute(
+                                f"""
+                                SELECT * FROM {PG_CONFIG['schema']}.spr_duty_insert(
+                                    %s, %s, %s, %s, %s, %s
+                                )
+                                """,
+                                ('Duty_Management', user_id, item.team_id,
+                                 item.miqaat_id, item.quota, item.location)
+                            )
+                        row = cursor.fetchone()
+                        result_code = (row[0] if row else 0) or 0
+                    except Exception as item_ex:
+                        logger.error(f"Bulk duty item {index} failed: {str(item_ex)}")
+                        result_code = 0
+                    
+                    if result_code == success_code:
+                        cursor.execute("RELEASE SAVEPOINT duty_item")
+                    else:
+                        result_code = 4 if result_code == 4 else 0
+                        cursor.execute("ROLLBACK TO SAVEPOINT duty_item")
+                    message = messages[result_code]
+                
+                summary[{1: "created", 2: "updated", 4: "duplicate"}.get(result_code, "failed")] += 1
+                results.append(DutyBulkItemResult(
+                    index=index,
+                    duty_id=getattr(item, "duty_id", None),
+                    location=item.location,
+                    result_code=result_code,
+                    message=message
+                ))
         
-        elif payload.flag == 'D':
-            if not payload.guard_duty_id:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="DELETE operation requires: guard_duty_id"
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    changed = [item for item, result in zip(items, results) if result.result_code in (1, 2)]
+    miqaat_duties_changed(
+        *{item.miqaat_id for item in changed},
+        *{audiences[item.duty_id]["miqaat_id"] for item in changed if update and item.duty_id in audiences}
+    )
+    
+    if update:
+        for item, result in zip(items, results):
+            if result.result_code == 2:
+                audience = audiences.get(item.duty_id, {"team_id": None, "its_ids": []})
+                publish_duty_event(
+                    "duty.updated",
+                    audience["its_ids"],
+                    [audience["team_id"], item.team_id],
+                    duty_id=item.duty_id,
+                    team_id=item.team_id,
+                    miqaat_id=item.miqaat_id,
+                    location=item.location
                 )
-            
-            logger.info(
-                f"Guard duty DELETE requested by user {user_id}: "
-                f"guard_duty_id={payload.guard_duty_id}"
-            )
+    
+    return results, summary
+
+
+async def run_bulk_duty_request(items, current_user: dict, update: bool) -> DutyBulkResponse:
+    """Shared body of BulkInsertDuty / BulkUpdateDuty"""
+    action = "update" if update else "insert"
+    try:
+        user_id = current_user.get("its_id")
+        
+        logger.info(f"Bulk duty {action} requested by user {user_id}: {len(items)} items")
+        
+        with get_db_connection() as conn:
+            results, summary = apply_duty_operations(conn, user_id, items, update)
         
-        conn = psycopg2.connect(
-            host=PG_CONFIG['host'],
-            database=PG_CONFIG['database'],
-            user=PG_CONFIG['user'],
-            password=PG_CONFIG['password'],
-            port=PG_CONFIG['port']
+        logger.info(f"Bulk duty {action} completed: {summary}")
+        
+        return DutyBulkResponse(
+            success=summary["duplicate"] == 0 and summary["failed"] == 0,
+            status_code=200,
+            message=f"Processed {len(results)} duties",
+            summary=summary,
+            results=results
+        )
+    
+    except Exception as ex:
+        logger.error(f"Error in bulk duty {action}: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+
+@router.post("/BulkInsertDuty", response_model=DutyBulkResponse)
+async def bulk_insert_duty(
+    payload: DutyBulkInsertRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Create many duties (e.g. every location of a miqaat) in one transaction
+    
+    Per-item result_code: 1 created, 4 duplicate (in this request or
+    already in the database), 0 failed.
+    """
+    return await run_bulk_duty_request(payload.items, current_user, update=False)
+
+
+@router.put("/BulkUpdateDuty", response_model=DutyBulkResponse)
+async def bulk_update_duty(
+    payload: DutyBulkUpdateRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Update many duties in one transaction
+    
+    Per-item result_code: 2 updated, 4 duplicate (in this request or
+    clashing with another duty), 0 not found / failed.
+    """
+    return await run_bulk_duty_request(payload.items, current_user, update=True)
+
+
+# ============================================================================
+# DUTY OCCUPANCY
+# ============================================================================
+
+def miqaat_duties_changed(*miqaat_ids) -> None:
+    """Drop cached occupancy and rosters of miqaats whose duties were added, edited or deleted"""
+    duty_occupancy.invalidate(*miqaat_ids)
+    miqaat_roster_cache.bump(*miqaat_ids)
+    guard_schedule.invalidate()
+    attendance_counters.invalidate(*miqaat_ids)
+
+
+@router.get("/Occupancy", response_model=DutyResponse)
+async def get_duty_occupancy(
+    miqaat_id: int = Query(..., description="Miqaat to report"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Filled vs quota for every duty of a miqaat
+    
+    Served from the in-memory occupancy index: loaded from the database on
+    first use, kept current by guard duty inserts/deletes and resynced
+    periodically.
+    """
+    try:
+        logger.info(
+            f"Duty occupancy requested by user {current_user.get('its_id')} "
+            f"for miqaat_id: {miqaat_id}"
         )
         
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        with get_db_connection() as conn:
+            occupancy = duty_occupancy.get(conn, miqaat_id)
         
+        return DutyResponse(
+            success=True,
+            status_code=200,
+            message=f"Occupancy for {len(occupancy['duties'])} duties",
+            data=occupancy
+        )
+    
+    except Exception as ex:
+        logger.error(f"Error retrieving duty occupancy: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+
+# ============================================================================
+# DUTY CHANGE EVENTS
+# ============================================================================
+
+def publish_duty_event(event_type: str, its_ids: Iterable, team_ids: Iterable, **details) -> None:
+    """Push a committed duty change to the guards and teams it affects"""
+    channels = [f"its:{i}" for i in its_ids if i] + [f"team:{t}" for t in team_ids if t]
+    duty_events.publish(channels, {"type": event_type, **details})
+
+
+def get_duty_audiences(cursor, duty_ids: Iterable[int]) -> dict:
+    """duty_id -> team, miqaat and actively assigned guards (read before changing duties)"""
+    ids = sorted(set(duty_ids))
+    if not ids:
+        return {}
+    cursor.execute(
+        f"""
+        SELECT d.duty_id, d.team_id, d.miqaat_id,
+               COALESCE(array_agg(g.its_id) FILTER (WHERE g.its_id IS NOT NULL), '{{}}') AS its_ids
+        FROM {pg_table('duty')} d
+        LEFT JOIN {pg_table('guard_duty')} g ON g.duty_id = d.duty_id AND g.status = 1
+        WHERE d.duty_id = ANY(%s)
+        GROUP BY d.duty_id, d.team_id, d.miqaat_id
+        """,
+        (ids,)
+    )
+    audiences = {}
+    for row in cursor.fetchall():
+        if not isinstance(row, dict):
+            row = dict(zip(("duty_id", "team_id", "miqaat_id", "its_ids"), row))
+        audiences[row["duty_id"]] = {
+            "team_id": row["team_id"],
+            "miqaat_id": row["miqaat_id"],
+            "its_ids": list(row["its_ids"])
+        }
+    return audiences
+
+
+def get_duty_audience(cursor, duty_id: int) -> dict:
+    """Team, miqaat and actively assigned guards of one duty"""
+    return get_duty_audiences(cursor, [duty_id]).get(
+        duty_id, {"team_id": None, "miqaat_id": None, "its_ids": []}
+    )
+
+
+def get_guard_duty_targets(cursor, guard_duty_ids: Iterable[int]) -> dict:
+    """guard_duty_id -> {its_id, team_id, duty_id, miqaat_id} for rows about to be removed"""
+    ids = sorted({i for i in guard_duty_ids if i})
+    if not ids:
+        return {}
+    cursor.execute(
+        f"""
+        SELECT guard_duty_id, its_id, team_id, duty_id, miqaat_id
+        FROM {pg_table('guard_duty')}
+        WHERE guard_duty_id = ANY(%s)
+        """,
+        (ids,)
+    )
+    return {row["guard_duty_id"]: dict(row) for row in cursor.fetchall()}
+
+
+def record_guard_duty_change(flag: str, its_id, team_id, duty_id, miqaat_id, guard_duty_id=None) -> None:
+    """Update occupancy and push the event for one committed guard duty insert (I) or removal (D)"""
+    duty_occupancy.apply(duty_id, 1 if flag == 'I' else -1)
+    if flag == 'D':
+        guard_schedule.release(its_id, miqaat_id)
+    attendance_counters.record_assignment(flag, miqaat_id, its_id, team_id, duty_id)
+    miqaat_roster_cache.bump(miqaat_id)
+    publish_duty_event(
+        "guard_duty.assigned" if flag == 'I' else "guard_duty.removed",
+        [its_id],
+        [team_id],
+        its_id=its_id,
+        team_id=team_id,
+        duty_id=duty_id,
+        miqaat_id=miqaat_id,
+        guard_duty_id=guard_duty_id
+    )
+
+
+@router.get("/Events")
+async def duty_event_stream(
+    request: Request,
+    team_id: List[int] = Query([], description="Also receive events for these teams"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Server-Sent Events stream of duty changes for the caller
+    
+    Always subscribed to the caller's own its_id; add team_id=... to
+    follow teams. Events: guard_duty.assigned, guard_duty.removed,
+    duty.updated, duty.deleted. Replaces polling GetGuardDutiesAssigned /
+    GetActiveAssignedMiqaatDuties.
+    """
+    its_id = current_user.get("its_id")
+    channels = [f"its:{its_id}"] + [f"team:{t}" for t in team_id]
+    
+    logger.info(f"Duty event stream opened by user {its_id}: {channels}")
+    
+    return StreamingResponse(
+        sse_stream(duty_events, request, channels),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ============================================================================
+# GUARD DUTY INSERT/DELETE
+# ============================================================================
+
+# Result codes returned by spr_guard_duty_insert
+GUARD_DUTY_MESSAGES = {
+    1: "Guard duty assigned successfully",
+    3: "Guard duty removed successfully",
+    4: "Guard already assigned to this duty",
+    5: "Duty quota is full",
+    6: "Guard has an overlapping duty in another miqaat",
+    0: "Failed to process guard duty operation"
+}
+
+# Advisory lock class for quota reservation - paired with duty_id
+DUTY_QUOTA_LOCK_CLASS = 720_282
+
+
+def lock_duties(cursor, duty_ids: Iterable[int]) -> None:
+    """
+    Take the transaction-scoped quota lock for several duties
+
+    Locks are taken in ascending duty_id order so concurrent bulk requests
+    cannot deadlock each other. Released on commit/rollback.
+    """
+    for duty_id in sorted(set(duty_ids)):
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (DUTY_QUOTA_LOCK_CLASS, duty_id))
+
+
+def reserve_duty_slot(cursor, duty_id: int) -> bool:
+    """
+    Serialize assigners of one duty and check there is room left
+
+    Only requests for the same duty_id wait on each other (never the whole
+    miqaat), and the lock is held just until the surrounding transaction
+    ends, right after the insert.
+    """
+    lock_duties(cursor, [duty_id])
+    cursor.execute(
+        f"""
+        SELECT d.quota,
+               (SELECT COUNT(*) FROM {pg_table('guard_duty')} g
+                WHERE g.duty_id = d.duty_id AND g.status = 1) AS assigned
+        FROM {pg_table('duty')} d
+        WHERE d.duty_id = %s
+        """,
+        (duty_id,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        # Unknown duty - let spr_guard_duty_insert report it
+        return True
+    quota, assigned = (row['quota'], row['assigned']) if isinstance(row, dict) else row
+    return quota is None or assigned < quota
+
+
+def has_active_assignment(cursor, duty_id: int, its_id: int) -> bool:
+    """True if the guard already holds an active slot on the duty"""
+    cursor.execute(
+        f"""
+        SELECT 1 FROM {pg_table('guard_duty')}
+        WHERE duty_id = %s AND its_id = %s AND status = 1
+        LIMIT 1
+        """,
+        (duty_id, its_id)
+    )
+    return cursor.fetchone() is not None
+
+
+def validate_guard_duty_operation(flag: str, duty_id, team_id, miqaat_id, its_id, guard_duty_id) -> Optional[str]:
+    """Return an error message if required fields for the flag are missing"""
+    if flag == 'I' and not all([duty_id, team_id, miqaat_id, its_id]):
+        return "INSERT operation requires: duty_id, team_id, miqaat_id, and its_id"
+    if flag == 'D' and not guard_duty_id:
+        return "DELETE operation requires: guard_duty_id"
+    return None
+
+
+def execute_guard_duty_operation(
+    cursor, form_name: str, flag: str, user_id,
+    duty_id, team_id, miqaat_id, its_id, guard_duty_id
+) -> int:
+    """
+    Run spr_guard_duty_insert on an open cursor and return its o_result (0 if none)
+
+    Inserts are first checked for an existing assignment to the same duty
+    (4, so a retry on a full duty is reported as a duplicate, not as
+    quota full), then against the guard schedule index (6 if the guard is
+    already on duty in an overlapping miqaat), and then reserve a quota
+    slot (5 if the duty is full), without touching the procedure. The
+    schedule entry is kept only if the insert succeeds.
+    """
+    if flag == 'I':
+        if has_active_assignment(cursor, duty_id, its_id):
+            return 4
+        if guard_schedule.reserve(cursor.connection, its_id, miqaat_id):
+            return 6
+        if not reserve_duty_slot(cursor, duty_id):
+            guard_schedule.release(its_id, miqaat_id)
+            return 5
+    
+    try:
         cursor.execute(
-            """
+            f"""
             SELECT o_result 
-            FROM bg.spr_guard_duty_insert(
+            FROM {PG_CONFIG['schema']}.spr_guard_duty_insert(
                 %s, %s, %s, %s, %s, %s, %s, %s
             )
             """,
-            (
+            (form_name, flag, user_id, duty_id, team_id, miqaat_id, its_id, guard_duty_id)
+        )
+        result = cursor.fetchone()
+        result_value = ((result['o_result'] if isinstance(result, dict) else result[0]) or 0) if result else 0
+    except Exception:
+        if flag == 'I':
+            guard_schedule.release(its_id, miqaat_id)
+        raise
+    
+    if flag == 'I' and result_value != 1:
+        guard_schedule.release(its_id, miqaat_id)
+    return result_value
+
+
+@router.post("/GuardDutyInsert", response_model=GuardDutyInsertResponse)
+async def guard_duty_insert(
+    payload: GuardDutyInsertRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Assign (flag I) or remove (flag D) one guard duty
+
+    Retries that repeat the Idempotency-Key header get the first
+    attempt's response back without calling spr_guard_duty_insert again.
+    """
+    user_id = current_user.get("its_id")
+    body = payload.model_dump()
+    
+    replay = idempotency_store.begin("GuardDutyInsert", user_id, idempotency_key, body)
+    if replay is not None:
+        logger.info(f"Replaying guard duty response for Idempotency-Key {idempotency_key}")
+        return GuardDutyInsertResponse(**replay)
+    
+    try:
+        response = await run_guard_duty_insert(payload, current_user)
+    except Exception:
+        idempotency_store.abandon("GuardDutyInsert", user_id, idempotency_key)
+        raise
+    
+    idempotency_store.finish("GuardDutyInsert", user_id, idempotency_key, body, response.model_dump())
+    return response
+
+
+def apply_guard_duty_insert(conn, payload: GuardDutyInsertRequest, user_id) -> tuple:
+    """
+    Run one guard duty insert/delete in its own transaction
+
+    Blocking (advisory quota lock), so endpoints call it through
+    run_in_threadpool with run_with_sync_connection. Returns (result_value, target) where target holds
+    the its_id/team_id/duty_id/miqaat_id the change applies to.
+    """
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            target = {
+                "its_id": payload.its_id,
+                "team_id": payload.team_id,
+                "duty_id": payload.duty_id,
+                "miqaat_id": payload.miqaat_id
+            }
+            if payload.flag == 'D':
+                target = get_guard_duty_targets(cursor, [payload.guard_duty_id]).get(payload.guard_duty_id, {})
+            
+            result_value = execute_guard_duty_operation(
+                cursor,
                 payload.form_name,
                 payload.flag,
                 user_id,
@@ -719,54 +1289,120 @@ async def guard_duty_insert(
                 payload.its_id,
                 payload.guard_duty_id
             )
+        
+        if result_value in (1, 3):
+            conn.commit()
+        else:
+            conn.rollback()
+    except Exception:
+        conn.rollback()
+        guard_schedule.invalidate()
+        raise
+    
+    return result_value, target
+
+
+async def run_guard_duty_insert(payload: GuardDutyInsertRequest, current_user: dict) -> GuardDutyInsertResponse:
+    try:
+        user_id = current_user.get("its_id")
+        
+        error = validate_guard_duty_operation(
+            payload.flag, payload.duty_id, payload.team_id,
+            payload.miqaat_id, payload.its_id, payload.guard_duty_id
         )
+        if error:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=error
+            )
         
-        result = cursor.fetchone()
-        result_value = result['o_result'] if result else 0
+        if payload.flag == 'I':
+            logger.info(
+                f"Guard duty INSERT requested by user {user_id}: "
+                f"duty_id={payload.duty_id}, team_id={payload.team_id}, "
+                f"miqaat_id={payload.miqaat_id}, its_id={payload.its_id}"
+            )
+        else:
+            logger.info(
+                f"Guard duty DELETE requested by user {user_id}: "
+                f"guard_duty_id={payload.guard_duty_id}"
+            )
         
-        cursor.close()
+        # The quota lock may wait on other assigners - keep it off the event loop,
+        # on a connection checked out by the worker thread
+        result_value, target = await run_in_threadpool(
+            run_with_sync_connection, apply_guard_duty_insert, payload, user_id
+        )
+        
+        if result_value in (1, 3):
+            record_guard_duty_change(
+                payload.flag,
+                target.get("its_id"),
+                target.get("team_id"),
+                target.get("duty_id"),
+                target.get("miqaat_id"),
+                payload.guard_duty_id
+            )
         
         if result_value == 1:
-            conn.commit()
             logger.info(f"Guard duty INSERT successful")
             
             return GuardDutyInsertResponse(
                 success=True,
                 status_code=201,
-                message="Guard duty assigned successfully",
+                message=GUARD_DUTY_MESSAGES[1],
                 result=1
             )
         
         elif result_value == 3:
-            conn.commit()
             logger.info(f"Guard duty DELETE successful")
             
             return GuardDutyInsertResponse(
                 success=True,
                 status_code=200,
-                message="Guard duty removed successfully",
+                message=GUARD_DUTY_MESSAGES[3],
                 result=3
             )
         
         elif result_value == 4:
-            conn.rollback()
             logger.warning(f"Duplicate guard duty assignment attempt")
             
             return GuardDutyInsertResponse(
                 success=False,
                 status_code=409,
-                message="Guard already assigned to this duty",
+                message=GUARD_DUTY_MESSAGES[4],
                 result=4
             )
         
+        elif result_value == 5:
+            logger.warning(f"Guard duty quota full for duty_id={payload.duty_id}")
+            
+            return GuardDutyInsertResponse(
+                success=False,
+                status_code=409,
+                message=GUARD_DUTY_MESSAGES[5],
+                result=5
+            )
+        
+        elif result_value == 6:
+            logger.warning(
+                f"Guard {payload.its_id} has an overlapping duty, miqaat_id={payload.miqaat_id}"
+            )
+            
+            return GuardDutyInsertResponse(
+                success=False,
+                status_code=409,
+                message=GUARD_DUTY_MESSAGES[6],
+                result=6
+            )
+        
         else:
-            conn.rollback()
             logger.error(f"Guard duty operation failed with result={result_value}")
             
             return GuardDutyInsertResponse(
                 success=False,
                 status_code=500,
-                message="Failed to process guard duty operation",
+                message=GUARD_DUTY_MESSAGES[0],
                 result=0
             )
     
@@ -774,9 +1410,6 @@ async def guard_duty_insert(
         raise
     
     except Exception as ex:
-        if conn:
-            conn.rollback()
-        
         logger.error(f"Unexpected error in guard_duty_insert: {str(ex)}")
         logger.error(traceback.format_exc())
         
@@ -784,10 +1417,362 @@ async def guard_duty_insert(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal server error: {str(ex)}"
         )
+
+
+# ============================================================================
+# GUARD DUTY BULK INSERT/DELETE
+# ============================================================================
+
+def apply_guard_duty_operations(conn, form_name: str, user_id, items: List[GuardDutyBulkItem]):
+    """
+    Apply many guard duty inserts/deletes in one transaction and commit
+
+    Each item runs in its own savepoint so a duplicate (4), full quota (5),
+    time conflict (6) or failure (0) only undoes that item. Returns
+    (results, summary).
+    """
+    results = []
+    events = []
+    summary = {"assigned": 0, "removed": 0, "duplicate": 0, "quota_full": 0, "conflict": 0, "failed": 0}
     
-    finally:
-        if conn:
-            conn.close()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            # Take every quota lock up front, in order, to avoid deadlocks
+            lock_duties(cursor, [i.duty_id for i in items if i.flag == 'I' and i.duty_id])
+            removal_targets = get_guard_duty_targets(
+                cursor, [i.guard_duty_id for i in items if i.flag == 'D']
+            )
+            
+            for index, item in enumerate(items):
+                error = validate_guard_duty_operation(
+                    item.flag, item.duty_id, item.team_id,
+                    item.miqaat_id, item.its_id, item.guard_duty_id
+                )
+                
+                if error:
+                    result_value = 0
+                    message = error
+                else:
+                    cursor.execute("SAVEPOINT guard_duty_item")
+                    try:
+                        result_value = execute_guard_duty_operation(
+                            cursor,
+                            form_name,
+                            item.flag,
+                            user_id,
+                            item.duty_id,
+                            item.team_id,
+                            item.miqaat_id,
+                            item.its_id,
+                            item.guard_duty_id
+                        )
+                    except Exception as item_ex:
+                        logger.error(f"Guard duty bulk item {index} failed: {str(item_ex)}")
+                        result_value = 0
+                    
+                    if result_value in (1, 3):
+                        cursor.execute("RELEASE SAVEPOINT guard_duty_item")
+                        target = item.model_dump() if item.flag == 'I' else removal_targets.get(item.guard_duty_id, {})
+                        events.append((item.flag, target, item.guard_duty_id))
+                    else:
+                        result_value = result_value if result_value in (4, 5, 6) else 0
+                        cursor.execute("ROLLBACK TO SAVEPOINT guard_duty_item")
+                    message = GUARD_DUTY_MESSAGES[result_value]
+                
+                summary[{1: "assigned", 3: "removed", 4: "duplicate", 5: "quota_full", 6: "conflict"}.get(result_value, "failed")] += 1
+                results.append(GuardDutyBulkItemResult(
+                    index=index,
+                    flag=item.flag,
+                    its_id=item.its_id,
+                    guard_duty_id=item.guard_duty_id,
+                    result=result_value,
+                    message=message
+                ))
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        guard_schedule.invalidate()
+        raise
+    
+    for flag, target, guard_duty_id in events:
+        record_guard_duty_change(
+            flag,
+            target.get("its_id"),
+            target.get("team_id"),
+            target.get("duty_id"),
+            target.get("miqaat_id"),
+            guard_duty_id
+        )
+    
+    return results, summary
+
+
+@router.post("/GuardDutyBulkInsert", response_model=GuardDutyBulkResponse)
+async def guard_duty_bulk_insert(
+    payload: GuardDutyBulkRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Assign and remove many guards in one pooled transaction
+    
+    Each item goes through spr_guard_duty_insert inside its own savepoint,
+    so a duplicate (4), full quota (5), time conflict (6) or failure (0)
+    only undoes that item. Everything else is committed once at the end.
+    """
+    try:
+        user_id = current_user.get("its_id")
+        
+        logger.info(
+            f"Guard duty BULK requested by user {user_id}: {len(payload.items)} items"
+        )
+        
+        # Blocks on per-duty quota locks - run off the event loop
+        results, summary = await run_in_threadpool(
+            run_with_sync_connection, apply_guard_duty_operations, payload.form_name, user_id, payload.items
+        )
+        
+        logger.info(f"Guard duty BULK completed: {summary}")
+        
+        return GuardDutyBulkResponse(
+            success=summary["failed"] == 0,
+            status_code=200,
+            message=f"Processed {len(results)} guard duty operations",
+            summary=summary,
+            results=results
+        )
+    
+    except Exception as ex:
+        logger.error(f"Unexpected error in guard_duty_bulk_insert: {str(ex)}")
+        logger.error(traceback.format_exc())
+        
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+
+# ============================================================================
+# AUTOMATIC GUARD ALLOCATION
+# ============================================================================
+
+def load_allocation_inputs(conn, miqaat_id: int, team_id: Optional[int]):
+    """
+    Load everything the allocator needs with three set-based queries
+
+    Returns (miqaat, duties, guards). Guards are members of the duty teams'
+    jamaats who are not yet assigned in this miqaat and have no active
+    assignment in another miqaat whose window overlaps this one; each
+    carries a workload count used to spread duties fairly.
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(
+            f"""
+            SELECT miqaat_id, start_date, end_date
+            FROM {pg_table('miqaat')}
+            WHERE miqaat_id = %s
+            """,
+            (miqaat_id,)
+        )
+        miqaat = cursor.fetchone()
+        if not miqaat:
+            return None, [], []
+        
+        cursor.execute(
+            f"""
+            SELECT d.duty_id, d.team_id, d.quota, d.location,
+                   COUNT(g.its_id) AS assigned
+            FROM {pg_table('duty')} d
+            LEFT JOIN {pg_table('guard_duty')} g
+                   ON g.duty_id = d.duty_id AND g.status = 1
+            WHERE d.miqaat_id = %s
+              AND (%s::int IS NULL OR d.team_id = %s::int)
+            GROUP BY d.duty_id, d.team_id, d.quota, d.location
+            ORDER BY d.duty_id
+            """,
+            (miqaat_id, team_id, team_id)
+        )
+        duties = [dict(row) for row in cursor.fetchall()]
+        
+        team_ids = sorted({d["team_id"] for d in duties})
+        if not team_ids:
+            return dict(miqaat), duties, []
+        
+        cursor.execute(
+            f"""
+            WITH workload AS (
+                SELECT its_id, COUNT(*) AS duty_count
+                FROM {pg_table('guard_duty')}
+                WHERE status = 1
+                GROUP BY its_id
+            ),
+            busy AS (
+                SELECT DISTINCT g.its_id
+                FROM {pg_table('guard_duty')} g
+                JOIN {pg_table('miqaat')} mq ON mq.miqaat_id = g.miqaat_id
+                WHERE g.status = 1
+                  AND (g.miqaat_id = %(miqaat_id)s
+                       OR (mq.start_date < %(end_date)s AND mq.end_date > %(start_date)s))
+            )
+            SELECT tj.team_id, m.its_id, COALESCE(w.duty_count, 0) AS workload
+            FROM {pg_table('mumin')} m
+            JOIN {pg_table('team_jamaat')} tj ON tj.jamaat_id = m.jamaat_id
+            LEFT JOIN workload w ON w.its_id = m.its_id
+            WHERE tj.team_id = ANY(%(team_ids)s)
+              AND m.status = 1
+              AND NOT EXISTS (SELECT 1 FROM busy b WHERE b.its_id = m.its_id)
+            ORDER BY workload, m.its_id
+            """,
+            {
+                "miqaat_id": miqaat_id,
+                "start_date": miqaat["start_date"],
+                "end_date": miqaat["end_date"],
+                "team_ids": team_ids
+            }
+        )
+        guards = [dict(row) for row in cursor.fetchall()]
+    
+    conn.commit()
+    return dict(miqaat), duties, guards
+
+
+def plan_guard_allocation(duties: List[dict], guards: List[dict]) -> List[dict]:
+    """
+    Fill open duty slots with eligible guards - O(duties + guards)
+
+    Guards arrive sorted by workload, so the least-used guards are placed
+    first. Slots are dealt round-robin across a team's duties so every
+    location gets people before any is topped up, and a guard gets at
+    most one duty in the miqaat.
+    """
+    open_slots = {}
+    for duty in duties:
+        remaining = max((duty["quota"] or 0) - duty["assigned"], 0)
+        if remaining:
+            open_slots.setdefault(duty["team_id"], []).append([duty, remaining])
+    
+    queues = {}
+    for guard in guards:
+        queues.setdefault(guard["team_id"], []).append(guard["its_id"])
+    
+    placed = set()
+    plan = []
+    for team_id, slots in open_slots.items():
+        queue = iter(queues.get(team_id, []))
+        while slots:
+            for slot in list(slots):
+                its_id = next((g for g in queue if g not in placed), None)
+                if its_id is None:
+                    slots = []
+                    break
+                duty, _ = slot
+                placed.add(its_id)
+                plan.append({
+                    "duty_id": duty["duty_id"],
+                    "team_id": team_id,
+                    "its_id": its_id
+                })
+                slot[1] -= 1
+                if slot[1] == 0:
+                    slots.remove(slot)
+    
+    return plan
+
+
+@router.post("/AutoAllocateGuards", response_model=DutyResponse)
+async def auto_allocate_guards(
+    payload: AutoAllocateRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Fill a miqaat's duties with eligible guards automatically
+    
+    Respects existing assignments, duty quotas and time conflicts with
+    other miqaats. dry_run=True returns the plan only; dry_run=False
+    writes it through the bulk guard duty path in one transaction.
+    """
+    try:
+        user_id = current_user.get("its_id")
+        
+        logger.info(
+            f"Auto allocation requested by user {user_id}: miqaat_id={payload.miqaat_id}, "
+            f"team_id={payload.team_id}, dry_run={payload.dry_run}"
+        )
+        
+        with get_db_connection() as conn:
+            miqaat, duties, guards = load_allocation_inputs(conn, payload.miqaat_id, payload.team_id)
+            
+            if not miqaat:
+                return DutyResponse(
+                    success=False,
+                    status_code=404,
+                    message="Miqaat not found",
+                    data=None
+                )
+            
+            plan = plan_guard_allocation(duties, guards)
+            
+            allocated = {}
+            for item in plan:
+                allocated[item["duty_id"]] = allocated.get(item["duty_id"], 0) + 1
+            
+            data = {
+                "miqaat_id": payload.miqaat_id,
+                "dry_run": payload.dry_run,
+                "eligible_guards": len({g["its_id"] for g in guards}),
+                "duties": [
+                    {
+                        "duty_id": d["duty_id"],
+                        "team_id": d["team_id"],
+                        "location": d["location"],
+                        "quota": d["quota"],
+                        "assigned_before": d["assigned"],
+                        "allocated": allocated.get(d["duty_id"], 0),
+                        "unfilled": max((d["quota"] or 0) - d["assigned"] - allocated.get(d["duty_id"], 0), 0)
+                    }
+                    for d in duties
+                ],
+                "assignments": plan
+            }
+        
+        if not payload.dry_run and plan:
+            items = [
+                GuardDutyBulkItem(
+                    flag="I",
+                    duty_id=item["duty_id"],
+                    team_id=item["team_id"],
+                    miqaat_id=payload.miqaat_id,
+                    its_id=item["its_id"]
+                )
+                for item in plan
+            ]
+            results, summary = await run_in_threadpool(
+                run_with_sync_connection, apply_guard_duty_operations, payload.form_name, user_id, items
+            )
+            data["summary"] = summary
+            data["results"] = [r.model_dump() for r in results if r.result != 1]
+        
+        message = (
+            f"Allocation preview: {len(plan)} guards for {len(duties)} duties"
+            if payload.dry_run else
+            f"Allocation committed: {data.get('summary', {}).get('assigned', 0)} guards assigned"
+        )
+        logger.info(message)
+        
+        return DutyResponse(
+            success=True,
+            status_code=200,
+            message=message,
+            data=data
+        )
+    
+    except Exception as ex:
+        logger.error(f"Error in auto allocation: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
 
 
 # ============================================================================
@@ -814,6 +1799,12 @@ async def duty_health_check():
             "POST /Duty/InsertDuty",
             "PUT /Duty/UpdateDuty",
             "DELETE /Duty/DeleteDuty",
-            "POST /Duty/GuardDutyInsert"
+            "POST /Duty/BulkInsertDuty",
+            "PUT /Duty/BulkUpdateDuty",
+            "POST /Duty/GuardDutyInsert",
+            "POST /Duty/GuardDutyBulkInsert",
+            "POST /Duty/AutoAllocateGuards",
+            "GET /Duty/Events",
+            "GET /Duty/Occupancy"
         ]
     }
\ No newline at end of file
@@ -4,11 +4,20 @@ from app.models.guards import (
     GuardsByDateRequest, 
     GuardCheckRequest, 
     GuardsWithDutyRequest,  # ← Add this
+    GuardAvailabilityRequest,
+    GuardAvailabilitySearchRequest,
     GuardsResponse
 )
 from app.db import get_db_connection, call_function
-from app.config import PG_CONFIG
+from app.config import PG_CONFIG, pg_table
 from app.auth import get_current_user
+from app.pagination import keyset_page, encode_cursor, decode_cursor
+from app.fieldsets import resolve_fields, select_list, project_rows
+from app.schedule import guard_schedule
+from typing import List, Optional
+from datetime import timedelta
+from bisect import bisect_right
+from psycopg2.extras import RealDictCursor
 import traceback
 import logging
 import json
@@ -170,6 +179,37 @@ async def guard_check(
 # GET ALL GUARDS WITH DUTY ASSIGNMENT STATUS
 # ============================================================================
 
+# Selectable columns of the GetAllGuardsWithDuty query (field -> SQL)
+GUARD_WITH_DUTY_COLUMNS = {
+    "its_id": "m.its_id",
+    "full_name": "m.full_name",
+    "jamaat_id": "m.jamaat_id",
+    "jamaat": "m.jamaat",
+    "mobile": "m.mobile",
+    "guard_duty_id": "gd.guard_duty_id",
+    "assigned_duty_id": "gd.duty_id",
+    "is_assigned": "(gd.guard_duty_id IS NOT NULL)",
+    "is_assigned_to_duty": "COALESCE(gd.on_duty, FALSE)"
+}
+
+
+def guards_with_duty_query(fields: List[str]) -> str:
+    """Guards-with-duty query selecting only the given fields"""
+    return f"""
+        SELECT {select_list(fields, GUARD_WITH_DUTY_COLUMNS)}
+        FROM {pg_table('mumin')} m
+        JOIN {pg_table('team_jamaat')} tj ON tj.jamaat_id = m.jamaat_id AND tj.team_id = %s
+        LEFT JOIN LATERAL (
+            SELECT g.guard_duty_id, g.duty_id, (g.duty_id = %s) AS on_duty
+            FROM {pg_table('guard_duty')} g
+            WHERE g.its_id = m.its_id AND g.miqaat_id = %s AND g.status = 1
+            ORDER BY g.guard_duty_id
+            LIMIT 1
+        ) gd ON TRUE
+        WHERE m.status = 1
+    """
+
+
 @router.post("/GetAllGuardsWithDuty", response_model=GuardsResponse)
 async def get_all_guards_with_duty(
     payload: GuardsWithDutyRequest,
@@ -186,6 +226,47 @@ async def get_all_guards_with_duty(
             f"for miqaat_id: {miqaat_id}, duty_id: {duty_id}, team_id: {team_id}"
         )
         
+        fields = resolve_fields(payload.fields, GUARD_WITH_DUTY_COLUMNS, always=["its_id"])
+        
+        # Paged / filtered form: keyset pagination on its_id, filtered in SQL,
+        # selecting only the requested columns
+        if payload.limit is not None or payload.cursor or payload.assigned is not None:
+            selected = list(fields or GUARD_WITH_DUTY_COLUMNS)
+            if payload.assigned is not None and "is_assigned" not in selected:
+                selected.append("is_assigned")
+            
+            with get_db_connection() as conn:
+                page = keyset_page(
+                    conn, guards_with_duty_query(selected), [team_id, duty_id, miqaat_id],
+                    [("is_assigned = %s", payload.assigned)],
+                    key_columns=["its_id"], limit=payload.limit, cursor=payload.cursor
+                )
+            page["items"] = project_rows(page["items"], fields)
+            return GuardsResponse(
+                success=True,
+                status_code=200,
+                message=f"{len(page['items'])} guards retrieved",
+                data=page
+            )
+        
+        # Unpaged with a fieldset: same SQL projection, so unrequested
+        # columns are never read (spr_guards always returns full rows)
+        if fields is not None:
+            with get_db_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    cursor.execute(
+                        guards_with_duty_query(fields) + " ORDER BY m.its_id",
+                        (team_id, duty_id, miqaat_id)
+                    )
+                    rows = cursor.fetchall()
+                conn.commit()
+            return GuardsResponse(
+                success=True,
+                status_code=200,
+                message=f"{len(rows)} guards retrieved",
+                data=rows
+            )
+        
         with get_db_connection() as conn:
             # Call the PostgreSQL function
             # IMPORTANT: Pass ALL parameters in order, set unused ones to None
@@ -232,6 +313,8 @@ async def get_all_guards_with_duty(
                     data=None
                 )
             
+    except HTTPException:
+        raise
     except Exception as ex:
         logger.error(f"Error retrieving guards with duty status: {str(ex)}")
         logger.error(traceback.format_exc())
@@ -240,6 +323,194 @@ async def get_all_guards_with_duty(
             detail=f"Internal server error: {str(ex)}"
         )
 
+# ============================================================================
+# GUARD AVAILABILITY (time conflicts)
+# ============================================================================
+
+def resolve_availability_window(conn, miqaat_id: Optional[int], start_date, end_date):
+    """
+    (start, end) from a miqaat or an explicit window
+
+    Returns None for an unknown miqaat; raises 400 when neither a miqaat
+    nor a valid start/end pair was given.
+    """
+    if miqaat_id is not None:
+        return guard_schedule.window(conn, miqaat_id)
+    if start_date and end_date and start_date < end_date:
+        return start_date, end_date
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Provide miqaat_id or a start_date before end_date"
+    )
+
+
+@router.post("/CheckAvailability", response_model=GuardsResponse)
+async def check_guard_availability(
+    payload: GuardAvailabilityRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Which of the given guards are free in a time window
+    
+    Answered from the in-memory guard schedule index (O(log n) per guard),
+    not by scanning assignments. Busy guards are returned with the
+    overlapping miqaat assignments.
+    """
+    try:
+        logger.info(
+            f"Guard availability requested by user {current_user.get('its_id')} "
+            f"for {len(payload.its_ids)} guards, miqaat_id: {payload.miqaat_id}"
+        )
+        
+        with get_db_connection() as conn:
+            window = resolve_availability_window(conn, payload.miqaat_id, payload.start_date, payload.end_date)
+            if not window:
+                return GuardsResponse(
+                    success=False,
+                    status_code=404,
+                    message="Miqaat not found",
+                    data=None
+                )
+            start_date, end_date = window
+            
+            conflicts = guard_schedule.availability(conn, payload.its_ids, start_date, end_date)
+            conn.commit()
+        
+        free = [its_id for its_id, found in conflicts.items() if not found]
+        busy = [
+            {"its_id": its_id, "conflicts": found}
+            for its_id, found in conflicts.items() if found
+        ]
+        
+        return GuardsResponse(
+            success=True,
+            status_code=200,
+            message=f"{len(free)} of {len(conflicts)} guards are free",
+            data={
+                "start_date": start_date,
+                "end_date": end_date,
+                "free": free,
+                "busy": busy
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as ex:
+        logger.error(f"Error checking guard availability: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+@router.post("/SearchAvailable", response_model=GuardsResponse)
+async def search_available_guards(
+    payload: GuardAvailabilitySearchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Guards of a team or jamaat who are free in a window and under their cap
+    
+    Candidates come from one indexed query; freedom and recent workload
+    come from the in-memory guard timelines (a few bisects per guard).
+    Sorted by recent workload, then its_id, with keyset pagination.
+    """
+    try:
+        if payload.team_id is None and payload.jamaat_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Provide team_id or jamaat_id"
+            )
+        
+        logger.info(
+            f"Available guard search by user {current_user.get('its_id')}: "
+            f"team_id={payload.team_id}, jamaat_id={payload.jamaat_id}, miqaat_id={payload.miqaat_id}"
+        )
+        
+        period_days = min(payload.period_days, guard_schedule.lookback_days)
+        
+        with get_db_connection() as conn:
+            window = resolve_availability_window(conn, payload.miqaat_id, payload.start_date, payload.end_date)
+            if not window:
+                return GuardsResponse(
+                    success=False,
+                    status_code=404,
+                    message="Miqaat not found",
+                    data=None
+                )
+            start_date, end_date = window
+            
+            conditions = ["m.status = 1"]
+            params = []
+            join = ""
+            if payload.team_id is not None:
+                join = f"JOIN {pg_table('team_jamaat')} tj ON tj.jamaat_id = m.jamaat_id AND tj.team_id = %s"
+                params.append(payload.team_id)
+            if payload.jamaat_id is not None:
+                conditions.append("m.jamaat_id = %s")
+                params.append(payload.jamaat_id)
+            
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT m.its_id, m.full_name, m.mobile, m.jamaat_id, m.jamaat
+                    FROM {pg_table('mumin')} m
+                    {join}
+                    WHERE {' AND '.join(conditions)}
+                    """,
+                    params
+                )
+                candidates = {row["its_id"]: dict(row) for row in cursor.fetchall()}
+            
+            stats = guard_schedule.timeline_stats(
+                conn, candidates, start_date, end_date, end_date - timedelta(days=period_days)
+            )
+            conn.commit()
+        
+        ranked = sorted(
+            (workload, its_id)
+            for its_id, (free, workload) in stats.items()
+            if free and (payload.max_duties is None or workload < payload.max_duties)
+        )
+        
+        start = 0
+        if payload.cursor:
+            start = bisect_right(ranked, tuple(decode_cursor(payload.cursor, 2)))
+        page = ranked[start:start + payload.limit]
+        has_more = start + payload.limit < len(ranked)
+        
+        items = [
+            {**candidates[its_id], "recent_duties": workload}
+            for workload, its_id in page
+        ]
+        
+        return GuardsResponse(
+            success=True,
+            status_code=200,
+            message=f"{len(ranked)} of {len(candidates)} guards available",
+            data={
+                "start_date": start_date,
+                "end_date": end_date,
+                "period_days": period_days,
+                "total_available": len(ranked),
+                "items": items,
+                "next_cursor": encode_cursor(page[-1]) if has_more else None,
+                "has_more": has_more,
+                "limit": payload.limit
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as ex:
+        logger.error(f"Error searching available guards: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
 # ============================================================================
 # HEALTH CHECK
 # ============================================================================
@@ -258,6 +529,8 @@ async def guards_health_check():
             "POST /Guards/GetAcceptedGuardsByMiqaatDate",
             "POST /Guards/GuardCheck",
             "POST /Guards/GetAllGuardsWithDuty",  # ← Add this
+            "POST /Guards/CheckAvailability",
+            "POST /Guards/SearchAvailable",
             "GET /Guards/CheckMyGuardInfo"
         ]
     }
\ No newline at end of file
@@ -1,12 +1,13 @@
 # app/routers/ITS_API_controller.py
 from fastapi import APIRouter, HTTPException, status, Depends
-from app.models.its_api import ITSAPIRequest, ITSAPIResponse
+from app.models.its_api import ITSAPIRequest, ITSAPIResponse, ITSMemberCompact
 from app.auth import get_current_user
 import requests
 import traceback
 import logging
 import os
 from dotenv import load_dotenv
+from typing import Any, Optional, List
 import json
 import xml.etree.ElementTree as ET
 
@@ -36,14 +37,16 @@ HANDLERE1_HCODE = os.getenv("HANDLERE1_HCODE", "")
 # HELPER FUNCTIONS
 # ============================================================================
 
-def parse_xml_response(xml_string: str) -> dict:
+def parse_xml_response(content: bytes) -> dict:
     """
     Parse XML response to dictionary
     Handles SOAP/XML responses from ITS API
+
+    Works on the raw response bytes so the encoding declared in the
+    XML prolog is honoured and no intermediate str copy is made.
     """
     try:
-        # Remove XML declaration and parse
-        root = ET.fromstring(xml_string)
+        root = ET.fromstring(content)
         
         # Extract text content
         result = {}
@@ -53,18 +56,69 @@ def parse_xml_response(xml_string: str) -> dict:
         return result
     except Exception as e:
         logger.error(f"XML parsing error: {str(e)}")
-        return {"raw": xml_string}
+        return {"raw": content.decode("utf-8", errors="replace")}
 
 
-def parse_json_response(response_text: str) -> dict:
+def parse_json_response(content: bytes) -> dict:
     """
-    Parse JSON response
+    Parse JSON response directly from the raw response bytes
     """
     try:
-        return json.loads(response_text)
+        return json.loads(content)
     except Exception as e:
         logger.error(f"JSON parsing error: {str(e)}")
-        return {"raw": response_text}
+        return {"raw": content.decode("utf-8", errors="replace")}
+
+
+def _to_int(value) -> Optional[int]:
+    """Convert ITS numeric values (often floats or strings) to int"""
+    try:
+        return int(float(value)) if value not in (None, "") else None
+    except (ValueError, TypeError):
+        return None
+
+
+def project_member_record(record: dict) -> ITSMemberCompact:
+    """Project a raw ITS member record onto the compact response fields"""
+    its_id = record.get("ITS_ID")
+    return ITSMemberCompact(
+        its_id=str(_to_int(its_id) or its_id) if its_id is not None else None,
+        full_name=record.get("Fullname"),
+        prefix=record.get("Prefix"),
+        gender=record.get("Gender"),
+        age=_to_int(record.get("Age")),
+        mobile=record.get("Mobile"),
+        email=record.get("Email"),
+        jamaat_id=_to_int(record.get("Jamaat_ID")),
+        jamaat=record.get("Jamaat"),
+        jamiaat_id=_to_int(record.get("Jamiaat_ID")),
+        jamiaat=record.get("Jamiaat")
+    )
+
+
+def shape_its_data(parsed_data: Any, response_mode: str) -> Any:
+    """
+    Shape parsed ITS data according to the requested response mode
+
+    - full: parsed payload is returned unchanged
+    - compact: always a list of ITSMemberCompact - one per member row
+      under "Table" (HandlerB2 JSON), one for a flat record (HandlerE1
+      XML), empty when the payload holds no member
+    """
+    if response_mode == "full":
+        return parsed_data
+    if not isinstance(parsed_data, dict) or "raw" in parsed_data:
+        return []
+    
+    rows = parsed_data.get("Table")
+    if rows is None:
+        # Flat XML record: drop any namespace from the element names
+        rows = [{tag.rsplit("}", 1)[-1]: value for tag, value in parsed_data.items()}]
+    elif isinstance(rows, dict):
+        rows = [rows]
+    
+    members: List[ITSMemberCompact] = [project_member_record(row) for row in rows if isinstance(row, dict)]
+    return [member for member in members if member.its_id is not None]
 
 
 # ============================================================================
@@ -115,20 +169,20 @@ async def call_handlerb2_api(
         
         # Check if request was successful
         if response.status_code == 200:
-            response_text = response.text
+            content = response.content
             
             # Parse response based on Data_Output format
             if HANDLERB2_DATA_OUTPUT.upper() == "JSON":
-                parsed_data = parse_json_response(response_text)
+                parsed_data = parse_json_response(content)
             else:
-                parsed_data = parse_xml_response(response_text)
+                parsed_data = parse_xml_response(content)
             
             return ITSAPIResponse(
                 success=True,
                 message="Data retrieved successfully from HandlerB2",
                 its_id=its_id,
-                data=parsed_data,
-                raw_response=response_text
+                data=shape_its_data(parsed_data, payload.response_mode),
+                raw_response=response.text if payload.debug else None
             )
         else:
             # API returned error status
@@ -139,7 +193,7 @@ async def call_handlerb2_api(
                 message=f"External API returned error: {response.status_code}",
                 its_id=its_id,
                 data=None,
-                raw_response=response.text
+                raw_response=response.text if payload.debug else None
             )
     
     except requests.exceptions.Timeout:
@@ -212,17 +266,15 @@ async def call_handlere1_api(
         
         # Check if request was successful
         if response.status_code == 200:
-            response_text = response.text
-            
             # Parse response (typically XML from SOAP)
-            parsed_data = parse_xml_response(response_text)
+            parsed_data = parse_xml_response(response.content)
             
             return ITSAPIResponse(
                 success=True,
                 message="Data retrieved successfully from HandlerE1",
                 its_id=its_id,
-                data=parsed_data,
-                raw_response=response_text
+                data=shape_its_data(parsed_data, payload.response_mode),
+                raw_response=response.text if payload.debug else None
             )
         else:
             # API returned error status
@@ -233,7 +285,7 @@ async def call_handlere1_api(
                 message=f"External API returned error: {response.status_code}",
                 its_id=its_id,
                 data=None,
-                raw_response=response.text
+                raw_response=response.text if payload.debug else None
             )
     
     except requests.exceptions.Timeout:
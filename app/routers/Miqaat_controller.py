@@ -1,5 +1,6 @@
 # app/routers/Miqaat_controller.py
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from app.models.miqaat import (
     MiqaatRequest,
     JamaatsByJamiaatMiqaatRequest,
@@ -9,12 +10,20 @@ from app.models.miqaat import (
     MiqaatResponse
 )
 
-from app.db import get_db_connection, call_function
-from app.config import PG_CONFIG
+from app.db import get_db_connection, get_sync_db_connection, call_function, execute_query
+from app.config import PG_CONFIG, pg_table
 from app.auth import get_current_user
+from app.pagination import keyset_page, MAX_PAGE_SIZE
+from app.cache import miqaat_roster_cache
+from app.schedule import guard_schedule
+from psycopg2.extras import RealDictCursor
+from typing import Optional, Iterator
+from datetime import datetime
 import traceback
 import logging
 import json
+import csv
+import io
 
 logger = logging.getLogger(__name__)
 
@@ -25,11 +34,53 @@ router = APIRouter(prefix="/Miqaat", tags=["Miqaat"])
 # GET ALL MIQAAT
 # ============================================================================
 
+MIQAAT_LIST_QUERY = f"""
+    SELECT miqaat_id, miqaat_name, miqaat_type_id, start_date, end_date,
+           reporting_time, venue, jamaat_id, jamiaat_id, quantity, is_active
+    FROM {pg_table('miqaat')}
+"""
+
+
 @router.get("/GetAllMiqaat", response_model=MiqaatResponse)
-async def get_all_miqaat(current_user: dict = Depends(get_current_user)):
+async def get_all_miqaat(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables keyset pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    jamiaat_id: Optional[int] = Query(None),
+    from_date: Optional[datetime] = Query(None, description="Miqaats ending on/after this time"),
+    to_date: Optional[datetime] = Query(None, description="Miqaats starting on/before this time"),
+    is_active: Optional[bool] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get miqaats, latest start date first
+    
+    Without any query parameters the full list is returned as before.
+    With a page size, cursor or filter the list is paginated in SQL and
+    data is {"items", "next_cursor", "has_more", "limit"}.
+    """
     try:
         logger.info(f"Get all miqaat requested by user {current_user.get('its_id')}")
         
+        filters = [
+            ("jamiaat_id = %s", jamiaat_id),
+            ("end_date >= %s", from_date),
+            ("start_date <= %s", to_date),
+            ("is_active = %s", is_active)
+        ]
+        
+        if limit is not None or cursor or any(value is not None for _, value in filters):
+            with get_db_connection() as conn:
+                page = keyset_page(
+                    conn, MIQAAT_LIST_QUERY, [], filters,
+                    key_columns=["start_date", "miqaat_id"], limit=limit, cursor=cursor, descending=True
+                )
+            return MiqaatResponse(
+                success=True,
+                status_code=200,
+                message=f"{len(page['items'])} miqaat retrieved",
+                data=page
+            )
+        
         with get_db_connection() as conn:
             result = call_function(
                 conn,
@@ -69,6 +120,8 @@ async def get_all_miqaat(current_user: dict = Depends(get_current_user)):
                     data=None
                 )
             
+    except HTTPException:
+        raise
     except Exception as ex:
         logger.error(f"Error retrieving all miqaat: {str(ex)}")
         logger.error(traceback.format_exc())
@@ -395,6 +448,8 @@ async def update_miqaat(
                 conn.commit()
                 
                 if result_code == 2:
+                    miqaat_roster_cache.bump(payload.miqaat_id)
+                    guard_schedule.invalidate()
                     return MiqaatResponse(
                         success=True,
                         status_code=200,
@@ -472,6 +527,8 @@ async def delete_miqaat(
                 conn.commit()
                 
                 if result_code == 3:
+                    miqaat_roster_cache.bump(payload.miqaat_id)
+                    guard_schedule.invalidate()
                     return MiqaatResponse(
                         success=True,
                         status_code=200,
@@ -502,6 +559,270 @@ async def delete_miqaat(
         )
 
 
+# ============================================================================
+# MIQAAT ROSTER (miqaat + duties + assigned guards + team jamaats)
+# ============================================================================
+
+def build_miqaat_roster(conn, miqaat_id: int) -> Optional[dict]:
+    """
+    Assemble the nested roster with four set-based queries
+
+    The query count is the same for 1 or 500 duties: miqaat, duties,
+    assigned guards, team jamaats - then nested in Python by id.
+    Returns None if the miqaat does not exist.
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(
+            f"{MIQAAT_LIST_QUERY} WHERE miqaat_id = %s",
+            (miqaat_id,)
+        )
+        miqaat = cursor.fetchone()
+        if not miqaat:
+            conn.commit()
+            return None
+        
+        cursor.execute(
+            f"""
+            SELECT d.duty_id, d.team_id, t.team_name, d.location, d.quota
+            FROM {pg_table('duty')} d
+            JOIN {pg_table('team')} t ON t.team_id = d.team_id
+            WHERE d.miqaat_id = %s
+            ORDER BY d.duty_id
+            """,
+            (miqaat_id,)
+        )
+        duties = [dict(row) for row in cursor.fetchall()]
+        
+        cursor.execute(
+            f"""
+            SELECT g.guard_duty_id, g.duty_id, g.its_id, m.full_name, m.mobile, m.jamaat
+            FROM {pg_table('guard_duty')} g
+            LEFT JOIN {pg_table('mumin')} m ON m.its_id = g.its_id
+            WHERE g.miqaat_id = %s AND g.status = 1
+            ORDER BY g.duty_id, m.full_name
+            """,
+            (miqaat_id,)
+        )
+        guards = cursor.fetchall()
+        
+        team_ids = sorted({duty["team_id"] for duty in duties})
+        cursor.execute(
+            f"""
+            SELECT team_id, array_agg(jamaat_id ORDER BY jamaat_id) AS jamaat_ids
+            FROM {pg_table('team_jamaat')}
+            WHERE team_id = ANY(%s)
+            GROUP BY team_id
+            """,
+            (team_ids,)
+        )
+        team_jamaats = {row["team_id"]: list(row["jamaat_ids"]) for row in cursor.fetchall()}
+    conn.commit()
+    
+    guards_by_duty = {}
+    for guard in guards:
+        guard = dict(guard)
+        guards_by_duty.setdefault(guard.pop("duty_id"), []).append(guard)
+    
+    teams = {}
+    for duty in duties:
+        duty["guards"] = guards_by_duty.get(duty["duty_id"], [])
+        duty["assigned"] = len(duty["guards"])
+        teams.setdefault(duty["team_id"], {
+            "team_id": duty["team_id"],
+            "team_name": duty["team_name"],
+            "jamaat_ids": team_jamaats.get(duty["team_id"], [])
+        })
+    
+    return {
+        "miqaat": dict(miqaat),
+        "teams": list(teams.values()),
+        "duties": duties,
+        "total_quota": sum(duty["quota"] or 0 for duty in duties),
+        "total_assigned": len(guards)
+    }
+
+
+@router.post("/GetMiqaatRoster", response_model=MiqaatResponse)
+async def get_miqaat_roster(
+    payload: MiqaatRequest,
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Miqaat, its duties, assigned guards and team jamaats in one response
+    
+    Replaces GetMiqaatById + GetAllDuties + GetAllGuardsWithDuty per duty +
+    GetJamaatsByTeamId per team. The payload is cached per miqaat version
+    (bumped by any duty, guard duty or miqaat change) and returned with an
+    ETag; send it back as If-None-Match to get 304 when nothing changed.
+    """
+    try:
+        miqaat_id = payload.miqaat_id
+        
+        logger.info(
+            f"Miqaat roster requested by user {current_user.get('its_id')} "
+            f"for miqaat_id: {miqaat_id}"
+        )
+        
+        def build():
+            with get_db_connection() as conn:
+                return build_miqaat_roster(conn, miqaat_id)
+        
+        version, roster = miqaat_roster_cache.get_or_build(miqaat_id, build)
+        
+        if roster is None:
+            return MiqaatResponse(
+                success=False,
+                status_code=404,
+                message="Miqaat not found",
+                data=None
+            )
+        
+        etag = f'"roster-{miqaat_id}-{version}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        
+        response.headers["ETag"] = etag
+        return MiqaatResponse(
+            success=True,
+            status_code=200,
+            message="Miqaat roster retrieved successfully",
+            data={**roster, "version": version}
+        )
+    
+    except Exception as ex:
+        logger.error(f"Error retrieving miqaat roster: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+
+# ============================================================================
+# ROSTER EXPORT
+# ============================================================================
+
+# Rows fetched per round trip from the server-side cursor and flushed as one chunk
+ROSTER_EXPORT_BATCH = 1000
+
+ROSTER_EXPORT_QUERY = f"""
+    SELECT d.duty_id, d.location, d.quota, d.team_id, t.team_name,
+           g.guard_duty_id, g.its_id, m.full_name, m.mobile, m.jamaat,
+           EXISTS (
+               SELECT 1 FROM {pg_table('attendance')} a
+               WHERE a.its_id = g.its_id AND a.miqaat_id = d.miqaat_id
+           ) AS attended
+    FROM {pg_table('duty')} d
+    JOIN {pg_table('team')} t ON t.team_id = d.team_id
+    LEFT JOIN {pg_table('guard_duty')} g ON g.duty_id = d.duty_id AND g.status = 1
+    LEFT JOIN {pg_table('mumin')} m ON m.its_id = g.its_id
+    WHERE d.miqaat_id = %s
+    ORDER BY d.duty_id, g.its_id
+"""
+
+
+def stream_roster(miqaat_id: int, file_format: str) -> Iterator[str]:
+    """
+    Yield the roster in chunks straight from a server-side cursor
+
+    Only one batch is held in memory at a time. Starlette runs this sync
+    generator in its threadpool, so the blocking fetches never stall the
+    event loop; a client disconnect closes the generator, which closes the
+    cursor and returns the connection. Because it runs on worker threads
+    and holds its connection for the whole download, it uses the
+    thread-safe, slot-limited sync pool rather than the request pool.
+    """
+    with get_sync_db_connection() as conn:
+        try:
+            with conn.cursor(name=f"roster_export_{miqaat_id}") as cursor:
+                cursor.itersize = ROSTER_EXPORT_BATCH
+                cursor.execute(ROSTER_EXPORT_QUERY, (miqaat_id,))
+                
+                columns = None
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                
+                while True:
+                    rows = cursor.fetchmany(ROSTER_EXPORT_BATCH)
+                    if columns is None:
+                        columns = [col[0] for col in cursor.description]
+                        if file_format == "csv":
+                            writer.writerow(columns)
+                    if not rows:
+                        break
+                    
+                    if file_format == "csv":
+                        writer.writerows(rows)
+                    else:
+                        for row in rows:
+                            buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+                            buffer.write("\n")
+                    
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                
+                if buffer.tell():
+                    yield buffer.getvalue()
+        finally:
+            conn.rollback()
+
+
+@router.get("/ExportRoster")
+async def export_miqaat_roster(
+    miqaat_id: int = Query(..., description="Miqaat to export"),
+    file_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Stream a miqaat's full duty roster as NDJSON or CSV
+    
+    One row per duty/guard pair (duties without guards appear once with
+    empty guard columns), with the guard's attendance flag. The response
+    starts as soon as the first batch is read and memory stays constant
+    regardless of roster size.
+    """
+    try:
+        logger.info(
+            f"Roster export requested by user {current_user.get('its_id')} "
+            f"for miqaat_id: {miqaat_id}, format: {file_format}"
+        )
+        
+        with get_db_connection() as conn:
+            row = execute_query(
+                conn,
+                f"SELECT 1 FROM {pg_table('miqaat')} WHERE miqaat_id = %s",
+                (miqaat_id,)
+            )
+        
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Miqaat not found"
+            )
+        
+        media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            stream_roster(miqaat_id, file_format),
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f'attachment; filename="roster_miqaat_{miqaat_id}.{file_format}"'
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as ex:
+        logger.error(f"Error exporting roster: {str(ex)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(ex)}"
+        )
+
+
 # ============================================================================
 # HEALTH CHECK
 # ============================================================================
@@ -523,6 +844,8 @@ async def miqaat_health_check():
             "POST /Miqaat/GetJamaatsByJamiaat",
             "POST /Miqaat/InsertMiqaat",
             "PUT /Miqaat/UpdateMiqaat",
-            "DELETE /Miqaat/DeleteMiqaat"
+            "DELETE /Miqaat/DeleteMiqaat",
+            "GET /Miqaat/ExportRoster",
+            "POST /Miqaat/GetMiqaatRoster"
         ]
     }
\ No newline at end of file
@@ -1,31 +1,43 @@
 # app/routers/mumin_sync.py
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Query, Depends
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import logging
 import traceback
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Tuple, Iterator, IO
+import threading
+import hashlib
+import json
+import csv
+import io
+import re
+import time
 import os
 
+from app.db import get_sync_db_connection
+from app.auth import require_admin
+
 # Import models
-from app.models.mumin_sync import MuminSyncRequest, MuminSyncResponse
+from app.models.mumin_sync import (
+    MuminSyncRequest,
+    MuminSyncResponse,
+    MuminBulkSyncRequest,
+    MuminBulkSyncResponse,
+    MuminSyncJobCreateRequest,
+    MuminSyncJobResponse,
+    MuminImportResponse
+)
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create router
-router = APIRouter(prefix="/api/mumin", tags=["Mumin Sync"])
-
-# Database configuration
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "your_database")
-DB_USER = os.getenv("DB_USER", "your_user")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "your_password")
+router = APIRouter(prefix="/Mumin", tags=["Mumin Sync"])
 
 # HandlerB2 API Configuration
 HANDLERB2_URL = os.getenv("HANDLERB2_URL", "http://13.204.161.209:8080/BURHANI_GUARDS_API_TEST/api/ITS-API/HandlerB2")
@@ -33,21 +45,22 @@ HANDLERB2_AUTH_TOKEN = os.getenv("HANDLERB2_AUTH_TOKEN", "your_auth_token")
 HANDLERB2_HCODE = os.getenv("HANDLERB2_HCODE", "your_hcode")
 HANDLERB2_DATA_OUTPUT = os.getenv("HANDLERB2_DATA_OUTPUT", "JSON")
 
+# Background refresh configuration
+MUMIN_REFRESH_ENABLED = os.getenv("MUMIN_REFRESH_ENABLED", "false").lower() == "true"
+MUMIN_REFRESH_RATE_PER_MINUTE = int(os.getenv("MUMIN_REFRESH_RATE_PER_MINUTE", "60"))
+MUMIN_REFRESH_BATCH_SIZE = int(os.getenv("MUMIN_REFRESH_BATCH_SIZE", "50"))
+MUMIN_REFRESH_STALE_DAYS = int(os.getenv("MUMIN_REFRESH_STALE_DAYS", "7"))
+MUMIN_REFRESH_IDLE_SECONDS = int(os.getenv("MUMIN_REFRESH_IDLE_SECONDS", "300"))
+MUMIN_REFRESH_RETRY_SECONDS = int(os.getenv("MUMIN_REFRESH_RETRY_SECONDS", "3600"))
 
-def get_db_connection():
-    """Create database connection"""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        raise
+# Advisory lock key shared by all workers - only the holder runs the refresh loop
+MUMIN_REFRESH_LOCK_KEY = 720_281_001
+
+# Sync job configuration
+MUMIN_SYNC_JOBS_RESUME = os.getenv("MUMIN_SYNC_JOBS_RESUME", "true").lower() == "true"
+
+# Advisory lock class for sync jobs - paired with job_id so one worker runs each job
+MUMIN_SYNC_JOB_LOCK_CLASS = 720_281
 
 
 def extract_last_4_digits(mobile: str) -> str:
@@ -66,8 +79,12 @@ def extract_last_4_digits(mobile: str) -> str:
         return digits.zfill(4)
 
 
-def call_handlerb2_api(its_id: str) -> dict:
-    """Call HandlerB2 API to get member data"""
+def call_handlerb2_api(its_id: str, session: Optional[requests.Session] = None) -> dict:
+    """
+    Call HandlerB2 API to get member data
+
+    Pass a shared requests.Session to reuse HTTP connections across calls.
+    """
     try:
         # Prepare request data
         request_data = {
@@ -79,7 +96,7 @@ def call_handlerb2_api(its_id: str) -> dict:
         
         logger.info(f"Calling HandlerB2 API for ITS_ID: {its_id}")
         
-        response = requests.post(
+        response = (session or requests).post(
             HANDLERB2_URL,
             data=request_data,
             headers={"Content-Type": "application/x-www-form-urlencoded"},
@@ -176,9 +193,62 @@ def transform_api_data(api_data: dict) -> dict:
         "pull_date": datetime.now()
     }
     
+    transformed_data["sync_hash"] = compute_member_hash(transformed_data)
+    
     return transformed_data
 
 
+# Fields left out of the change-detection hash
+# (stored in mumin_master.sync_hash, added by migrations/002_mumin_sync_hash.sql)
+HASH_EXCLUDED_FIELDS = ("pull_date", "sync_hash")
+
+
+def compute_member_hash(data: dict) -> str:
+    """
+    Stable SHA-256 of a transformed member record
+
+    pull_date changes on every pull and is excluded, so identical ITS
+    data always hashes the same.
+    """
+    payload = {k: v for k, v in data.items() if k not in HASH_EXCLUDED_FIELDS}
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def its_id_array(its_ids) -> List[int]:
+    """ITS IDs as ints for `its_id = ANY(%s::bigint[])` (non-numeric IDs cannot match)"""
+    return [int(i) for i in its_ids if str(i).isdigit()]
+
+
+def get_member_hashes(conn, its_ids: List[str]) -> dict:
+    """Map of its_id (as str) -> stored sync_hash for members that already exist"""
+    if not its_ids:
+        return {}
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT its_id, sync_hash FROM mumin_master WHERE its_id = ANY(%s::bigint[])",
+            (its_id_array(its_ids),)
+        )
+        return {str(row[0]): row[1] for row in cursor.fetchall()}
+
+
+def touch_members_pull_date(conn, rows: List[dict]) -> None:
+    """Only advance pull_date for members whose data did not change"""
+    if not rows:
+        return
+    with conn.cursor() as cursor:
+        execute_values(
+            cursor,
+            """
+            UPDATE mumin_master AS m SET pull_date = v.pull_date
+            FROM (VALUES %s) AS v(its_id, pull_date)
+            WHERE m.its_id = v.its_id
+            """,
+            [(int(row["its_id"]), row["pull_date"]) for row in rows],
+            page_size=len(rows)
+        )
+
+
 def check_member_exists(conn, its_id: str) -> bool:
     """Check if member already exists in database"""
     try:
@@ -205,14 +275,14 @@ def insert_member(conn, data: dict) -> None:
                     email, mobile, whatsapp_mobil, address, jamaat_id, jamaat,
                     jamiaat_id, jamiaat, nationality, vatan, city, country,
                     team_id, position_id, role_id, joining_date, status,
-                    password, pull_date
+                    password, pull_date, sync_hash
                 ) VALUES (
                     %(its_id)s, %(full_name)s, %(full_name_arabi)s, %(prefix)s, %(age)s, %(gender)s,
                     %(marital_status)s, %(misaq)s, %(idara)s, %(category)s, %(organization)s,
                     %(email)s, %(mobile)s, %(whatsapp_mobil)s, %(address)s, %(jamaat_id)s, %(jamaat)s,
                     %(jamiaat_id)s, %(jamiaat)s, %(nationality)s, %(vatan)s, %(city)s, %(country)s,
                     %(team_id)s, %(position_id)s, %(role_id)s, %(joining_date)s, %(status)s,
-                    %(password)s, %(pull_date)s
+                    %(password)s, %(pull_date)s, %(sync_hash)s
                 )
             """
             cursor.execute(insert_query, data)
@@ -257,7 +327,8 @@ def update_member(conn, data: dict) -> None:
                     role_id = %(role_id)s,
                     status = %(status)s,
                     password = %(password)s,
-                    pull_date = %(pull_date)s
+                    pull_date = %(pull_date)s,
+                    sync_hash = %(sync_hash)s
                 WHERE its_id = %(its_id)s
             """
             cursor.execute(update_query, data)
@@ -269,8 +340,238 @@ def update_member(conn, data: dict) -> None:
         raise
 
 
+# ============================================================================
+# BULK SYNC
+# ============================================================================
+
+# Columns written for every member, in insert order
+MEMBER_COLUMNS = [
+    "its_id", "full_name", "full_name_arabi", "prefix", "age", "gender",
+    "marital_status", "misaq", "idara", "category", "organization",
+    "email", "mobile", "whatsapp_mobil", "address", "jamaat_id", "jamaat",
+    "jamiaat_id", "jamiaat", "nationality", "vatan", "city", "country",
+    "team_id", "position_id", "role_id", "joining_date", "status",
+    "password", "pull_date", "sync_hash"
+]
+
+# Columns managed in this app (team, position, role, login). The
+# transform_api_data defaults are only for new members; a sync must
+# never overwrite what admins have set on existing ones.
+MEMBER_LOCAL_COLUMNS = ("team_id", "position_id", "role_id", "joining_date", "status", "password")
+
+# Columns overwritten on conflict by bulk sync and dump import: ITS data
+# plus sync bookkeeping
+MEMBER_ITS_COLUMNS = [
+    c for c in MEMBER_COLUMNS if c != "its_id" and c not in MEMBER_LOCAL_COLUMNS
+]
+
+
+def get_stale_member_ids(conn, stale_days: int) -> List[str]:
+    """Get ITS IDs of members whose pull_date is older than stale_days (or never pulled)"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT its_id FROM mumin_master
+            WHERE pull_date IS NULL OR pull_date < NOW() - make_interval(days => %s)
+            ORDER BY pull_date NULLS FIRST
+            """,
+            (stale_days,)
+        )
+        return [str(row[0]) for row in cursor.fetchall()]
+
+
+def fetch_members_concurrently(
+    its_ids: List[str],
+    concurrency: int
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Fetch and transform member data for many ITS IDs in parallel
+
+    Returns (transformed_rows, failures). Each failure is
+    {"its_id": ..., "error": ...}; one bad ID never aborts the batch.
+    """
+    rows = []
+    failures = []
+    
+    def fetch_one(session: requests.Session, its_id: str):
+        try:
+            return its_id, transform_api_data(call_handlerb2_api(its_id, session)), None
+        except HTTPException as e:
+            return its_id, None, str(e.detail)
+        except Exception as e:
+            return its_id, None, str(e)
+    
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for its_id, row, error in executor.map(lambda i: fetch_one(session, i), its_ids):
+                if row is not None:
+                    rows.append(row)
+                else:
+                    failures.append({"its_id": its_id, "error": error})
+    
+    return rows, failures
+
+
+def upsert_members_batch(conn, rows: List[dict], commit: bool = True) -> dict:
+    """
+    Insert or update a batch of transformed members with one
+    multi-row INSERT ... ON CONFLICT statement and a single commit
+
+    New members get every column; existing ones only get the ITS columns
+    (MEMBER_ITS_COLUMNS), so their team, role, position, status and
+    password are kept. Rows whose sync_hash matches the stored one are not
+    rewritten; only their pull_date is advanced.
+    Returns {"written": n, "skipped": n}.
+    Pass commit=False to leave the transaction open for the caller.
+    """
+    counts = {"written": 0, "skipped": 0}
+    if not rows:
+        return counts
+    
+    # Last occurrence wins if the same ITS ID was returned twice
+    unique_rows = list({str(row["its_id"]): row for row in rows}.values())
+    
+    stored_hashes = get_member_hashes(conn, [row["its_id"] for row in unique_rows])
+    unchanged = [r for r in unique_rows if stored_hashes.get(str(r["its_id"])) == r["sync_hash"]]
+    changed = [r for r in unique_rows if stored_hashes.get(str(r["its_id"])) != r["sync_hash"]]
+    
+    columns = ", ".join(MEMBER_COLUMNS)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in MEMBER_ITS_COLUMNS)
+    template = "(" + ", ".join(f"%({c})s" for c in MEMBER_COLUMNS) + ")"
+    
+    try:
+        if changed:
+            with conn.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    f"""
+                    INSERT INTO mumin_master ({columns}) VALUES %s
+                    ON CONFLICT (its_id) DO UPDATE SET {updates}
+                    """,
+                    changed,
+                    template=template,
+                    page_size=len(changed)
+                )
+        touch_members_pull_date(conn, unchanged)
+        if commit:
+            conn.commit()
+        counts["written"] = len(changed)
+        counts["skipped"] = len(unchanged)
+        return counts
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error upserting member batch: {str(e)}")
+        raise
+
+
+def run_bulk_sync(
+    its_ids: Optional[List[str]] = None,
+    stale_days: Optional[int] = None,
+    batch_size: int = 500,
+    concurrency: int = 8
+) -> dict:
+    """
+    Sync many members from ITS into mumin_master
+
+    IDs are fetched concurrently one batch at a time and each batch is
+    written with a single upsert, so memory stays bounded by batch_size.
+    """
+    with get_sync_db_connection() as conn:
+        if its_ids is None:
+            its_ids = get_stale_member_ids(conn, stale_days)
+        
+        # De-duplicate while keeping request order
+        its_ids = list(dict.fromkeys(str(i).strip() for i in its_ids if str(i).strip()))
+        
+        summary = {
+            "requested": len(its_ids), "fetched": 0, "upserted": 0,
+            "skipped": 0, "failed": 0, "failures": []
+        }
+        
+        for start in range(0, len(its_ids), batch_size):
+            batch_ids = its_ids[start:start + batch_size]
+            rows, failures = fetch_members_concurrently(batch_ids, concurrency)
+            
+            summary["fetched"] += len(rows)
+            counts = upsert_members_batch(conn, rows)
+            summary["upserted"] += counts["written"]
+            summary["skipped"] += counts["skipped"]
+            summary["failed"] += len(failures)
+            summary["failures"].extend(failures)
+            
+            logger.info(
+                f"Bulk sync progress: {min(start + batch_size, len(its_ids))}/{len(its_ids)} "
+                f"processed, {summary['upserted']} upserted, {summary['skipped']} unchanged, "
+                f"{summary['failed']} failed"
+            )
+        
+        return summary
+
+
+@router.post("/bulk-sync-from-its", response_model=MuminBulkSyncResponse)
+async def bulk_sync_members_from_its(
+    payload: MuminBulkSyncRequest,
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Bulk sync member data from ITS API to mumin_master table
+    
+    This endpoint:
+    1. Accepts a list of ITS_IDs, or stale_days to select members by pull_date
+    2. Calls HandlerB2 API concurrently for each batch of IDs
+    3. Transforms the data with transform_api_data
+    4. Upserts each batch with one multi-row INSERT ... ON CONFLICT
+    5. Returns counts plus per-ID failures
+    """
+    if payload.its_ids is None and payload.stale_days is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either its_ids or stale_days"
+        )
+    
+    try:
+        summary = await run_in_threadpool(
+            run_bulk_sync,
+            payload.its_ids,
+            payload.stale_days,
+            payload.batch_size,
+            payload.concurrency
+        )
+        
+        return MuminBulkSyncResponse(
+            success=summary["failed"] == 0,
+            message=(
+                f"Bulk sync completed: {summary['upserted']} upserted, "
+                f"{summary['skipped']} unchanged, {summary['failed']} failed"
+            ),
+            **summary
+        )
+        
+    except psycopg2.Error as e:
+        logger.error(f"Database error during bulk sync: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
+        
+    except Exception as e:
+        logger.error(f"Unexpected error during bulk sync: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+
 @router.post("/sync-from-its", response_model=MuminSyncResponse)
-async def sync_member_from_its(payload: MuminSyncRequest):
+def sync_member_from_its(
+    payload: MuminSyncRequest,
+    current_user: dict = Depends(require_admin)
+):
     """
     Sync member data from ITS API to mumin_master table
     
@@ -282,13 +583,12 @@ async def sync_member_from_its(payload: MuminSyncRequest):
     5. Returns success/error response
     
     Password is generated from last 4 digits of mobile number.
+    Runs in the threadpool because it waits on ITS and the sync pool.
     """
-    conn = None
-    
     try:
         its_id = payload.its_id
         
-        logger.info(f"Starting sync process for ITS_ID: {its_id}")
+        logger.info(f"Starting sync process for ITS_ID: {its_id} requested by user {current_user.get('its_id')}")
         
         # Step 1: Call HandlerB2 API
         api_data = call_handlerb2_api(its_id)
@@ -296,21 +596,26 @@ async def sync_member_from_its(payload: MuminSyncRequest):
         # Step 2: Transform data
         transformed_data = transform_api_data(api_data)
         
-        # Step 3: Connect to database
-        conn = get_db_connection()
-        
-        # Step 4: Check if member exists
-        member_exists = check_member_exists(conn, its_id)
-        
-        # Step 5: Insert or Update
-        if member_exists:
-            update_member(conn, transformed_data)
-            operation = "UPDATE"
-            message = f"Member data updated successfully for ITS_ID: {its_id}"
-        else:
-            insert_member(conn, transformed_data)
-            operation = "INSERT"
-            message = f"Member data inserted successfully for ITS_ID: {its_id}"
+        # Step 3: Get a connection from the sync pool
+        with get_sync_db_connection() as conn:
+            # Step 4: Check if member exists and whether its data changed
+            stored_hashes = get_member_hashes(conn, [its_id])
+            member_exists = str(its_id) in stored_hashes
+            
+            # Step 5: Insert, Update, or only refresh pull_date when unchanged
+            if member_exists and stored_hashes[str(its_id)] == transformed_data["sync_hash"]:
+                touch_members_pull_date(conn, [transformed_data])
+                conn.commit()
+                operation = "UNCHANGED"
+                message = f"Member data unchanged for ITS_ID: {its_id}"
+            elif member_exists:
+                update_member(conn, transformed_data)
+                operation = "UPDATE"
+                message = f"Member data updated successfully for ITS_ID: {its_id}"
+            else:
+                insert_member(conn, transformed_data)
+                operation = "INSERT"
+                message = f"Member data inserted successfully for ITS_ID: {its_id}"
         
         # Prepare response data
         response_data = {
@@ -338,8 +643,6 @@ async def sync_member_from_its(payload: MuminSyncRequest):
         
     except psycopg2.IntegrityError as e:
         logger.error(f"Database integrity error: {str(e)}")
-        if conn:
-            conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Database constraint violation: {str(e)}"
@@ -347,8 +650,6 @@ async def sync_member_from_its(payload: MuminSyncRequest):
         
     except psycopg2.Error as e:
         logger.error(f"Database error: {str(e)}")
-        if conn:
-            conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
@@ -357,14 +658,774 @@ async def sync_member_from_its(payload: MuminSyncRequest):
     except Exception as e:
         logger.error(f"Unexpected error during sync: {str(e)}")
         logger.error(traceback.format_exc())
-        if conn:
-            conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal server error: {str(e)}"
         )
+
+
+# ============================================================================
+# BACKGROUND INCREMENTAL REFRESH
+# ============================================================================
+
+class MuminRefreshScheduler:
+    """
+    Continuously refreshes the stalest mumin_master rows from ITS
+
+    Runs in a daemon thread. Only the worker holding the Postgres advisory
+    lock MUMIN_REFRESH_LOCK_KEY refreshes; the others retry the lock every
+    idle period. ITS calls are spaced to stay under rate_per_minute so the
+    refresh never competes with gate traffic in bursts.
+    """
+    
+    def __init__(
+        self,
+        rate_per_minute: int = MUMIN_REFRESH_RATE_PER_MINUTE,
+        batch_size: int = MUMIN_REFRESH_BATCH_SIZE,
+        stale_days: int = MUMIN_REFRESH_STALE_DAYS,
+        idle_seconds: int = MUMIN_REFRESH_IDLE_SECONDS,
+        retry_seconds: int = MUMIN_REFRESH_RETRY_SECONDS
+    ):
+        self.min_interval = 60.0 / max(rate_per_minute, 1)
+        self.batch_size = batch_size
+        self.stale_days = stale_days
+        self.idle_seconds = idle_seconds
+        self.retry_seconds = retry_seconds
+        
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failed_until: dict = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "running": False,
+            "is_leader": False,
+            "rate_per_minute": rate_per_minute,
+            "batches": 0,
+            "refreshed": 0,
+            "unchanged": 0,
+            "failed": 0,
+            "last_batch_at": None,
+            "last_error": None,
+            "started_at": None
+        }
+    
+    def start(self) -> None:
+        """Start the refresh thread (no-op if already running)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mumin-refresh", daemon=True)
+        self._thread.start()
+        self._set_metric(running=True, started_at=datetime.now())
+        logger.info("Mumin refresh scheduler started")
+    
+    def stop(self, timeout: float = 10.0) -> None:
+        """Signal the refresh thread to stop and wait for it"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._set_metric(running=False, is_leader=False)
+        logger.info("Mumin refresh scheduler stopped")
+    
+    def metrics(self) -> dict:
+        """Snapshot of progress metrics"""
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot["backoff_members"] = len(self._failed_until)
+            return snapshot
+    
+    def _set_metric(self, **values) -> None:
+        with self._lock:
+            self._metrics.update(values)
+    
+    def _incr_metric(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._metrics[name] += amount
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            is_leader = False
+            try:
+                with get_sync_db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_try_advisory_lock(%s)", (MUMIN_REFRESH_LOCK_KEY,))
+                        is_leader = cursor.fetchone()[0]
+                    conn.commit()
+                    self._set_metric(is_leader=is_leader)
+                    
+                    if is_leader:
+                        logger.info("Mumin refresh scheduler acquired advisory lock")
+                        
+                        # Session-level lock is held until the connection goes back to the pool
+                        while not self._stop.is_set():
+                            refreshed = self._refresh_batch(conn)
+                            if refreshed == 0:
+                                self._stop.wait(self.idle_seconds)
+                
+                if not is_leader:
+                    self._stop.wait(self.idle_seconds)
+            
+            except Exception as e:
+                logger.error(f"Mumin refresh scheduler error: {str(e)}")
+                logger.error(traceback.format_exc())
+                self._set_metric(last_error=f"{datetime.now().isoformat()}: {str(e)}", is_leader=False)
+                self._stop.wait(self.idle_seconds)
+    
+    def _select_stalest(self, conn) -> List[str]:
+        now = time.monotonic()
+        self._failed_until = {k: v for k, v in self._failed_until.items() if v > now}
+        
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT its_id FROM mumin_master
+                WHERE (pull_date IS NULL OR pull_date < NOW() - make_interval(days => %s))
+                  AND NOT (its_id = ANY(%s::bigint[]))
+                ORDER BY pull_date NULLS FIRST
+                LIMIT %s
+                """,
+                (self.stale_days, its_id_array(self._failed_until), self.batch_size)
+            )
+            its_ids = [str(row[0]) for row in cursor.fetchall()]
+        conn.commit()
+        return its_ids
+    
+    def _refresh_batch(self, conn) -> int:
+        """
+        Refresh one batch of the stalest members; returns the number attempted
+        
+        Goes through upsert_members_batch, so only ITS columns are refreshed
+        and team/role/position/login set in this app are kept.
+        """
+        its_ids = self._select_stalest(conn)
+        if not its_ids:
+            return 0
+        
+        rows = []
+        with requests.Session() as session:
+            for its_id in its_ids:
+                if self._stop.is_set():
+                    break
+                
+                started = time.monotonic()
+                try:
+                    rows.append(transform_api_data(call_handlerb2_api(its_id, session)))
+                except Exception as e:
+                    detail = e.detail if isinstance(e, HTTPException) else str(e)
+                    logger.warning(f"Mumin refresh failed for ITS_ID {its_id}: {detail}")
+                    self._failed_until[its_id] = time.monotonic() + self.retry_seconds
+                    self._incr_metric("failed")
+                
+                # Space out ITS calls to honour the configured rate limit
+                self._stop.wait(max(0.0, self.min_interval - (time.monotonic() - started)))
+        
+        counts = upsert_members_batch(conn, rows)
+        self._incr_metric("refreshed", counts["written"])
+        self._incr_metric("unchanged", counts["skipped"])
+        self._incr_metric("batches")
+        self._set_metric(last_batch_at=datetime.now())
+        return len(its_ids)
+
+
+refresh_scheduler = MuminRefreshScheduler()
+
+
+@router.get("/refresh-status")
+async def mumin_refresh_status(current_user: dict = Depends(require_admin)):
+    """
+    Progress metrics for the background member refresh scheduler
+    """
+    return {
+        "enabled": MUMIN_REFRESH_ENABLED,
+        "stale_days": refresh_scheduler.stale_days,
+        "batch_size": refresh_scheduler.batch_size,
+        **refresh_scheduler.metrics()
+    }
+
+
+# ============================================================================
+# RESUMABLE SYNC JOBS
+# ============================================================================
+
+# Tables mumin_sync_job / mumin_sync_job_item: migrations/001_mumin_sync_jobs.sql
+JOB_STATUS_PENDING = "PENDING"
+JOB_STATUS_RUNNING = "RUNNING"
+JOB_STATUS_COMPLETED = "COMPLETED"
+
+ITEM_STATUS_PENDING = "PENDING"
+ITEM_STATUS_DONE = "DONE"
+ITEM_STATUS_FAILED = "FAILED"
+
+
+def create_sync_job(conn, its_ids: List[str], chunk_size: int, concurrency: int) -> int:
+    """Persist a new job and one PENDING item per ITS ID; returns job_id"""
+    its_ids = list(dict.fromkeys(str(i).strip() for i in its_ids if str(i).strip()))
+    
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO mumin_sync_job (status, total, chunk_size, concurrency)
+                VALUES (%s, %s, %s, %s)
+                RETURNING job_id
+                """,
+                (JOB_STATUS_PENDING, len(its_ids), chunk_size, concurrency)
+            )
+            job_id = cursor.fetchone()[0]
+            
+            execute_values(
+                cursor,
+                "INSERT INTO mumin_sync_job_item (job_id, its_id) VALUES %s",
+                [(job_id, its_id) for its_id in its_ids],
+                page_size=1000
+            )
+        conn.commit()
+        return job_id
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def get_sync_job_progress(conn, job_id: int, failure_limit: int = 100) -> Optional[dict]:
+    """Progress, ETA and recent failures for a job; None if it does not exist"""
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            SELECT j.job_id, j.status, j.total, j.chunk_size, j.concurrency,
+                   j.created_at, j.resumed_at, j.completed_at, j.written, j.skipped,
+                   COUNT(*) FILTER (WHERE i.status = 'DONE') AS done,
+                   COUNT(*) FILTER (WHERE i.status = 'FAILED') AS failed,
+                   COUNT(*) FILTER (WHERE i.status = 'PENDING') AS pending,
+                   COUNT(*) FILTER (WHERE i.status <> 'PENDING' AND i.updated_at >= j.resumed_at)
+                       AS processed_since_resume,
+                   MAX(i.updated_at) AS last_checkpoint_at
+            FROM mumin_sync_job j
+            LEFT JOIN mumin_sync_job_item i ON i.job_id = j.job_id
+            WHERE j.job_id = %s
+            GROUP BY j.job_id
+            """,
+            (job_id,)
+        )
+        job = cursor.fetchone()
+        if not job:
+            conn.commit()
+            return None
+        job = dict(job)
+        
+        cursor.execute(
+            """
+            SELECT its_id, error, updated_at FROM mumin_sync_job_item
+            WHERE job_id = %s AND status = 'FAILED'
+            ORDER BY updated_at DESC
+            LIMIT %s
+            """,
+            (job_id, failure_limit)
+        )
+        job["failures"] = [dict(row) for row in cursor.fetchall()]
+    conn.commit()
+    
+    processed = job["done"] + job["failed"]
+    job["percent_complete"] = round(100.0 * processed / job["total"], 2) if job["total"] else 100.0
+    
+    # ETA from throughput since the job was last (re)started
+    job["eta_seconds"] = None
+    processed_since_resume = job.pop("processed_since_resume")
+    if job["pending"] and processed_since_resume and job["resumed_at"] and job["last_checkpoint_at"]:
+        elapsed = (job["last_checkpoint_at"] - job["resumed_at"]).total_seconds()
+        if elapsed > 0:
+            job["eta_seconds"] = int(job["pending"] * elapsed / processed_since_resume)
+    
+    return job
+
+
+class MuminSyncJobRunner:
+    """
+    Runs sync jobs in background threads, one chunk at a time
+
+    Each chunk's member upsert and item status updates commit together,
+    so a restart resumes from the last checkpoint and never re-fetches
+    IDs already marked DONE or FAILED. A per-job advisory lock keeps two
+    workers from running the same job.
+    """
+    
+    def __init__(self):
+        self._threads: dict = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+    
+    def start(self, job_id: int) -> bool:
+        """Start processing a job in the background; False if already running here"""
+        with self._lock:
+            thread = self._threads.get(job_id)
+            if thread and thread.is_alive():
+                return False
+            thread = threading.Thread(
+                target=self._run, args=(job_id,), name=f"mumin-sync-job-{job_id}", daemon=True
+            )
+            self._threads[job_id] = thread
+            thread.start()
+            return True
+    
+    def resume_pending(self) -> List[int]:
+        """Restart every job that has not completed (called on startup)"""
+        with get_sync_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT job_id FROM mumin_sync_job WHERE status <> %s ORDER BY job_id",
+                    (JOB_STATUS_COMPLETED,)
+                )
+                job_ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+        
+        for job_id in job_ids:
+            self.start(job_id)
+        if job_ids:
+            logger.info(f"Resuming mumin sync jobs: {job_ids}")
+        return job_ids
+    
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop after the current chunk; unfinished jobs resume on next start"""
+        self._stop.set()
+        for thread in list(self._threads.values()):
+            thread.join(timeout)
+    
+    def _run(self, job_id: int) -> None:
+        try:
+            with get_sync_db_connection() as conn:
+                self._run_with_connection(conn, job_id)
+        
+        except Exception as e:
+            logger.error(f"Sync job {job_id} stopped with error: {str(e)}")
+            logger.error(traceback.format_exc())
+    
+    def _run_with_connection(self, conn, job_id: int) -> None:
+        """Returning the connection to the pool releases the job's advisory lock"""
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_try_advisory_lock(%s, %s)", (MUMIN_SYNC_JOB_LOCK_CLASS, job_id)
+            )
+            if not cursor.fetchone()[0]:
+                conn.commit()
+                logger.info(f"Sync job {job_id} is running on another worker")
+                return
+            
+            cursor.execute(
+                """
+                UPDATE mumin_sync_job SET status = %s, resumed_at = NOW()
+                WHERE job_id = %s
+                RETURNING chunk_size, concurrency
+                """,
+                (JOB_STATUS_RUNNING, job_id)
+            )
+            row = cursor.fetchone()
+        conn.commit()
+        
+        if not row:
+            return
+        chunk_size, concurrency = row
+        
+        while not self._stop.is_set():
+            if not self._process_chunk(conn, job_id, chunk_size, concurrency):
+                break
+        
+        if not self._stop.is_set():
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE mumin_sync_job SET status = %s, completed_at = NOW() WHERE job_id = %s",
+                    (JOB_STATUS_COMPLETED, job_id)
+                )
+            conn.commit()
+            logger.info(f"Sync job {job_id} completed")
+    
+    def _process_chunk(self, conn, job_id: int, chunk_size: int, concurrency: int) -> bool:
+        """Process the next chunk of PENDING items; False when nothing is left"""
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT its_id FROM mumin_sync_job_item
+                WHERE job_id = %s AND status = %s
+                ORDER BY its_id
+                LIMIT %s
+                """,
+                (job_id, ITEM_STATUS_PENDING, chunk_size)
+            )
+            its_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        
+        if not its_ids:
+            return False
+        
+        rows, failures = fetch_members_concurrently(its_ids, concurrency)
+        failed_ids = {f["its_id"] for f in failures}
+        
+        # Checkpoint: member rows and item statuses commit atomically
+        try:
+            counts = upsert_members_batch(conn, rows, commit=False)
+            with conn.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    """
+                    UPDATE mumin_sync_job_item AS i
+                    SET status = v.status, error = v.error, updated_at = NOW()
+                    FROM (VALUES %s) AS v(job_id, its_id, status, error)
+                    WHERE i.job_id = v.job_id AND i.its_id = v.its_id
+                    """,
+                    [(job_id, its_id, ITEM_STATUS_DONE, None) for its_id in its_ids if its_id not in failed_ids]
+                    + [(job_id, f["its_id"], ITEM_STATUS_FAILED, f["error"]) for f in failures],
+                    page_size=len(its_ids)
+                )
+                cursor.execute(
+                    "UPDATE mumin_sync_job SET written = written + %s, skipped = skipped + %s WHERE job_id = %s",
+                    (counts["written"], counts["skipped"], job_id)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        logger.info(
+            f"Sync job {job_id} checkpoint: {counts['written']} written, "
+            f"{counts['skipped']} unchanged, {len(failures)} failed"
+        )
+        return True
+
+
+sync_job_runner = MuminSyncJobRunner()
+
+
+@router.post("/sync-jobs", response_model=MuminSyncJobResponse)
+async def create_mumin_sync_job(
+    payload: MuminSyncJobCreateRequest,
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Create a resumable sync job and start processing it in the background
+    
+    The ID set is persisted up front; progress is checkpointed per chunk.
+    Poll GET /Mumin/sync-jobs/{job_id} for progress, ETA and failures.
+    """
+    if payload.its_ids is None and payload.stale_days is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either its_ids or stale_days"
+        )
+    
+    def create() -> int:
+        with get_sync_db_connection() as conn:
+            its_ids = payload.its_ids
+            if its_ids is None:
+                its_ids = get_stale_member_ids(conn, payload.stale_days)
+            return create_sync_job(conn, its_ids, payload.chunk_size, payload.concurrency)
+    
+    try:
+        job_id = await run_in_threadpool(create)
+        sync_job_runner.start(job_id)
+        
+        return MuminSyncJobResponse(
+            success=True,
+            message=f"Sync job {job_id} created",
+            job={"job_id": job_id, "status": JOB_STATUS_PENDING}
+        )
         
-    finally:
-        if conn:
-            conn.close()
-            logger.info("Database connection closed")
\ No newline at end of file
+    except psycopg2.Error as e:
+        logger.error(f"Database error creating sync job: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
+
+
+@router.get("/sync-jobs/{job_id}", response_model=MuminSyncJobResponse)
+async def get_mumin_sync_job(job_id: int, current_user: dict = Depends(require_admin)):
+    """
+    Get progress, ETA and failed IDs for a sync job
+    """
+    def load() -> Optional[dict]:
+        with get_sync_db_connection() as conn:
+            return get_sync_job_progress(conn, job_id)
+    
+    try:
+        job = await run_in_threadpool(load)
+        
+    except psycopg2.Error as e:
+        logger.error(f"Database error reading sync job: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
+    
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sync job {job_id} not found"
+        )
+    
+    return MuminSyncJobResponse(
+        success=True,
+        message="Sync job status retrieved",
+        job=job
+    )
+
+
+@router.post("/sync-jobs/{job_id}/resume", response_model=MuminSyncJobResponse)
+async def resume_mumin_sync_job(job_id: int, current_user: dict = Depends(require_admin)):
+    """
+    Resume a job from its last checkpoint (e.g. after it stopped on an error)
+    """
+    started = sync_job_runner.start(job_id)
+    return MuminSyncJobResponse(
+        success=True,
+        message=f"Sync job {job_id} resumed" if started else f"Sync job {job_id} is already running",
+        job={"job_id": job_id}
+    )
+
+
+# ============================================================================
+# BULK IMPORT FROM ITS DUMP FILES (COPY)
+# ============================================================================
+
+# Leading wrapper of an ITS export: {"Table": [ ... ]}
+_TABLE_WRAPPER = re.compile(r'\s*\{\s*"Table"\s*:\s*\[')
+
+
+def iter_json_records(stream: IO[str], chunk_size: int = 65536) -> Iterator[dict]:
+    """
+    Stream member objects out of a JSON export without loading it whole
+
+    Accepts a JSON array, the ITS {"Table": [...]} wrapper, or NDJSON
+    (one object per line). Only one record is held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size)
+    
+    # Make sure the whole wrapper prefix is buffered before matching it
+    while len(buffer.lstrip()) < 32:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+    
+    match = _TABLE_WRAPPER.match(buffer)
+    if match:
+        buffer = buffer[match.end():]
+    else:
+        buffer = buffer.lstrip()
+        if buffer.startswith("["):
+            buffer = buffer[1:]
+    
+    eof = False
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if buffer.startswith("]"):
+            return
+        
+        if not buffer:
+            if eof:
+                return
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Record spans the chunk boundary - read more and retry
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        
+        buffer = buffer[end:]
+        if isinstance(record, dict):
+            yield record
+
+
+def iter_csv_records(stream: IO[str]) -> Iterator[dict]:
+    """
+    Stream member rows out of a CSV export with ITS column headers
+
+    CSV has no NULL, so empty cells are treated as missing values.
+    """
+    for row in csv.DictReader(stream):
+        yield {k: (v if v != "" else None) for k, v in row.items()}
+
+
+class _CopyStream(io.TextIOBase):
+    """File-like adapter that feeds generated CSV lines to COPY lazily"""
+    
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = ""
+    
+    def readable(self) -> bool:
+        return True
+    
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _copy_lines(records: Iterator[dict], counts: dict) -> Iterator[str]:
+    """Transform raw ITS records and render them as CSV lines for COPY"""
+    out = io.StringIO()
+    writer = csv.writer(out, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+    
+    for record in records:
+        counts["read"] += 1
+        if not record.get("ITS_ID"):
+            counts["invalid"] += 1
+            continue
+        
+        data = transform_api_data(record)
+        # QUOTE_NONNUMERIC leaves None unquoted, which COPY reads as NULL
+        writer.writerow([
+            None if data[c] is None
+            else data[c] if isinstance(data[c], (int, float)) and not isinstance(data[c], bool)
+            else str(data[c])
+            for c in MEMBER_COLUMNS
+        ])
+        line = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        yield line
+
+
+def import_members_from_stream(conn, stream: IO[str], file_format: str) -> dict:
+    """
+    Load an ITS member dump into mumin_master in one transaction
+
+    Records are streamed through transform_api_data into a temp staging
+    table with COPY, then merged with a single INSERT ... ON CONFLICT.
+    Members whose sync_hash is unchanged only get pull_date advanced;
+    existing members only get the ITS columns (MEMBER_ITS_COLUMNS), so
+    local team, role, position, status and password survive an import.
+    """
+    records = iter_csv_records(stream) if file_format == "csv" else iter_json_records(stream)
+    counts = {"read": 0, "invalid": 0, "staged": 0, "inserted": 0, "updated": 0, "skipped": 0}
+    
+    columns = ", ".join(MEMBER_COLUMNS)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in MEMBER_ITS_COLUMNS)
+    
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                CREATE TEMP TABLE mumin_import_staging
+                    (LIKE mumin_master, import_row BIGSERIAL)
+                ON COMMIT DROP
+                """
+            )
+            cursor.copy_expert(
+                f"COPY mumin_import_staging ({columns}) FROM STDIN WITH (FORMAT csv)",
+                _CopyStream(_copy_lines(records, counts))
+            )
+            counts["staged"] = counts["read"] - counts["invalid"]
+            
+            # Last row in the file wins for duplicate ITS IDs
+            cursor.execute(
+                f"""
+                CREATE TEMP VIEW mumin_import_latest AS
+                SELECT DISTINCT ON (its_id) {columns}
+                FROM mumin_import_staging
+                ORDER BY its_id, import_row DESC
+                """
+            )
+            
+            cursor.execute(
+                """
+                UPDATE mumin_master AS m SET pull_date = s.pull_date
+                FROM mumin_import_latest s
+                WHERE m.its_id = s.its_id AND m.sync_hash = s.sync_hash
+                """
+            )
+            counts["skipped"] = cursor.rowcount
+            
+            cursor.execute(
+                f"""
+                INSERT INTO mumin_master ({columns})
+                SELECT {columns} FROM mumin_import_latest
+                ON CONFLICT (its_id) DO UPDATE SET {updates}
+                WHERE mumin_master.sync_hash IS DISTINCT FROM EXCLUDED.sync_hash
+                RETURNING (xmax = 0) AS inserted
+                """
+            )
+            for (inserted,) in cursor:
+                counts["inserted" if inserted else "updated"] += 1
+            
+            cursor.execute("DROP VIEW mumin_import_latest")
+        
+        conn.commit()
+        return counts
+    
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error importing member dump: {str(e)}")
+        raise
+
+
+def detect_import_format(filename: str, file_format: Optional[str] = None) -> str:
+    """Resolve 'json' or 'csv' from an explicit format or the file extension"""
+    if file_format:
+        return file_format.lower()
+    return "csv" if filename.lower().endswith(".csv") else "json"
+
+
+@router.post("/import-dump", response_model=MuminImportResponse)
+async def import_mumin_dump(
+    file: UploadFile = File(..., description="ITS member export (.json, .ndjson or .csv)"),
+    file_format: Optional[str] = Query(None, pattern="^(json|csv)$", description="Override format detection"),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Bulk import a full ITS member export into mumin_master
+    
+    The upload is streamed through transform_api_data into a staging
+    table via COPY and merged into mumin_master in one set-based
+    statement, so memory stays constant regardless of file size.
+    """
+    fmt = detect_import_format(file.filename or "", file_format)
+    
+    def run() -> dict:
+        with get_sync_db_connection() as conn:
+            stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+            try:
+                return import_members_from_stream(conn, stream, fmt)
+            finally:
+                stream.detach()
+    
+    try:
+        counts = await run_in_threadpool(run)
+        
+        return MuminImportResponse(
+            success=True,
+            message=(
+                f"Import completed: {counts['inserted']} inserted, {counts['updated']} updated, "
+                f"{counts['skipped']} unchanged, {counts['invalid']} invalid"
+            ),
+            **counts
+        )
+        
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        logger.error(f"Invalid import file: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {fmt.upper()} file: {str(e)}"
+        )
+        
+    except psycopg2.Error as e:
+        logger.error(f"Database error during import: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
@@ -0,0 +1,243 @@
+# app/schedule.py
+"""
+Guard schedule index for time-conflict checks
+
+Per its_id, the guard's active assignments are kept as a list of
+(start, end, miqaat_id) sorted by start, plus the running maximum of the
+ends. "Does [start, end) overlap anything" is a bisect plus a backward
+scan that stops once no earlier interval can still be open, which stays
+correct when loaded rows overlap each other (legacy data, writes from
+other workers, lookback history): O(log n + conflicts) for disjoint
+timelines.
+
+The index covers miqaats that have not ended more than
+GUARD_SCHEDULE_LOOKBACK_DAYS ago, which also gives each guard a recent
+workload timeline. It is loaded on first use and
+reloaded every GUARD_SCHEDULE_RESYNC_SECONDS, which also picks up
+assignments written by other workers.
+"""
+from app.config import pg_table
+from psycopg2.extras import RealDictCursor
+from typing import Optional, Dict, List, Tuple, Iterable
+from datetime import datetime, date
+from bisect import bisect_left, insort
+import threading
+import time
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+GUARD_SCHEDULE_RESYNC_SECONDS = int(os.getenv("GUARD_SCHEDULE_RESYNC_SECONDS", "300"))
+GUARD_SCHEDULE_LOOKBACK_DAYS = int(os.getenv("GUARD_SCHEDULE_LOOKBACK_DAYS", "30"))
+
+
+def _naive(value):
+    """Normalise DB/request values to naive local datetimes so they compare"""
+    if isinstance(value, datetime):
+        return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+class GuardScheduleIndex:
+    """its_id -> sorted [(start, end, miqaat_id)] of active assignments"""
+
+    def __init__(
+        self,
+        resync_seconds: int = GUARD_SCHEDULE_RESYNC_SECONDS,
+        lookback_days: int = GUARD_SCHEDULE_LOOKBACK_DAYS
+    ):
+        self.resync_seconds = resync_seconds
+        self.lookback_days = lookback_days
+        self._lock = threading.Lock()
+        self._guards: Dict[int, List[Tuple[datetime, datetime, int]]] = {}
+        self._max_ends: Dict[int, List[datetime]] = {}
+        self._windows: Dict[int, Tuple[datetime, datetime]] = {}
+        self._loaded_at: Optional[float] = None
+
+    # ----- loading -----
+
+    def _load(self, conn) -> None:
+        """Read current miqaat windows and active assignments in two queries"""
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(
+                f"""
+                SELECT miqaat_id, start_date, end_date
+                FROM {pg_table('miqaat')}
+                WHERE end_date >= now() - make_interval(days => %s)
+                """,
+                (self.lookback_days,)
+            )
+            windows = {
+                row["miqaat_id"]: (_naive(row["start_date"]), _naive(row["end_date"]))
+                for row in cursor.fetchall()
+            }
+
+            cursor.execute(
+                f"""
+                SELECT g.its_id, g.miqaat_id
+                FROM {pg_table('guard_duty')} g
+                WHERE g.status = 1 AND g.miqaat_id = ANY(%s)
+                """,
+                (list(windows),)
+            )
+            guards: Dict[int, list] = {}
+            for row in cursor.fetchall():
+                start, end = windows[row["miqaat_id"]]
+                guards.setdefault(row["its_id"], []).append((start, end, row["miqaat_id"]))
+
+        for intervals in guards.values():
+            intervals.sort()
+        max_ends = {its_id: self._running_max_ends(intervals) for its_id, intervals in guards.items()}
+
+        with self._lock:
+            self._windows = windows
+            self._guards = guards
+            self._max_ends = max_ends
+            self._loaded_at = time.monotonic()
+        logger.info(f"Guard schedule index loaded: {len(guards)} guards, {len(windows)} miqaats")
+
+    def _ensure_loaded(self, conn) -> None:
+        with self._lock:
+            fresh = self._loaded_at is not None and time.monotonic() - self._loaded_at < self.resync_seconds
+        if not fresh:
+            self._load(conn)
+
+    def window(self, conn, miqaat_id: int) -> Optional[Tuple[datetime, datetime]]:
+        """(start, end) of a miqaat, fetched and cached if not indexed yet"""
+        self._ensure_loaded(conn)
+        with self._lock:
+            window = self._windows.get(miqaat_id)
+        if window:
+            return window
+
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(
+                f"SELECT start_date, end_date FROM {pg_table('miqaat')} WHERE miqaat_id = %s",
+                (miqaat_id,)
+            )
+            row = cursor.fetchone()
+        if not row or row["start_date"] is None or row["end_date"] is None:
+            return None
+        window = (_naive(row["start_date"]), _naive(row["end_date"]))
+        with self._lock:
+            self._windows[miqaat_id] = window
+        return window
+
+    # ----- queries -----
+
+    @staticmethod
+    def _running_max_ends(intervals) -> List[datetime]:
+        """max(end) over intervals[0..i] for every i of a start-sorted list"""
+        max_ends = []
+        for _, end, _ in intervals:
+            max_ends.append(end if not max_ends or end > max_ends[-1] else max_ends[-1])
+        return max_ends
+
+    @staticmethod
+    def _overlapping(intervals, max_ends, start, end, exclude_miqaat_id=None) -> List[dict]:
+        """
+        Intervals in a guard's start-sorted list that overlap [start, end)
+
+        Walks back from the last interval starting before `end` until no
+        earlier interval ends after `start` (per max_ends), so a long
+        interval is found even behind shorter ones that end earlier.
+        """
+        conflicts = []
+        index = bisect_left(intervals, (end,)) - 1
+        while index >= 0 and max_ends[index] > start:
+            s, e, miqaat_id = intervals[index]
+            if e > start and miqaat_id != exclude_miqaat_id:
+                conflicts.append({"miqaat_id": miqaat_id, "start_date": s, "end_date": e})
+            index -= 1
+        return conflicts
+
+    def _timeline(self, its_id: int) -> Tuple[list, list]:
+        """(intervals, max_ends) of one guard; caller holds the lock"""
+        return self._guards.get(its_id, []), self._max_ends.get(its_id, [])
+
+    def conflicts(self, conn, its_id: int, start, end, exclude_miqaat_id: Optional[int] = None) -> List[dict]:
+        """Assignments of one guard overlapping [start, end)"""
+        self._ensure_loaded(conn)
+        start, end = _naive(start), _naive(end)
+        with self._lock:
+            return self._overlapping(*self._timeline(its_id), start, end, exclude_miqaat_id)
+
+    def availability(self, conn, its_ids: Iterable[int], start, end) -> Dict[int, List[dict]]:
+        """its_id -> conflicting assignments (empty list = free) for many guards"""
+        self._ensure_loaded(conn)
+        start, end = _naive(start), _naive(end)
+        with self._lock:
+            return {
+                its_id: self._overlapping(*self._timeline(its_id), start, end)
+                for its_id in its_ids
+            }
+
+    def timeline_stats(self, conn, its_ids: Iterable[int], start, end, since) -> Dict[int, Tuple[bool, int]]:
+        """
+        its_id -> (free during [start, end), assignments starting in [since, end))
+
+        The workload count is two bisects on the guard's sorted timeline.
+        """
+        self._ensure_loaded(conn)
+        start, end, since = _naive(start), _naive(end), _naive(since)
+        stats = {}
+        with self._lock:
+            for its_id in its_ids:
+                intervals, max_ends = self._timeline(its_id)
+                free = not self._overlapping(intervals, max_ends, start, end)
+                workload = bisect_left(intervals, (end,)) - bisect_left(intervals, (since,))
+                stats[its_id] = (free, workload)
+        return stats
+
+    # ----- incremental updates -----
+
+    def reserve(self, conn, its_id: int, miqaat_id: int) -> List[dict]:
+        """
+        Atomically check a new assignment and add it to the index
+
+        Returns the conflicting assignments; the interval is only added
+        when that list is empty. Call release() if the write is then
+        rolled back. Assignments in the same miqaat are not treated as
+        conflicts (spr_guard_duty_insert rules on those).
+        """
+        window = self.window(conn, miqaat_id)
+        if not window:
+            return []
+        start, end = window
+        with self._lock:
+            intervals, max_ends = self._timeline(its_id)
+            conflicts = self._overlapping(intervals, max_ends, start, end, exclude_miqaat_id=miqaat_id)
+            if not conflicts:
+                intervals = self._guards.setdefault(its_id, intervals)
+                insort(intervals, (start, end, miqaat_id))
+                self._max_ends[its_id] = self._running_max_ends(intervals)
+            return conflicts
+
+    def release(self, its_id: Optional[int], miqaat_id: Optional[int]) -> None:
+        """Remove one assignment of a guard in a miqaat (removal or rolled-back reserve)"""
+        if not its_id or not miqaat_id:
+            return
+        with self._lock:
+            intervals = self._guards.get(its_id)
+            if not intervals:
+                return
+            for index, interval in enumerate(intervals):
+                if interval[2] == miqaat_id:
+                    del intervals[index]
+                    break
+            if intervals:
+                self._max_ends[its_id] = self._running_max_ends(intervals)
+            else:
+                del self._guards[its_id]
+                self._max_ends.pop(its_id, None)
+
+    def invalidate(self) -> None:
+        """Force a full reload on next use (miqaat dates changed, failed transaction)"""
+        with self._lock:
+            self._loaded_at = None
+
+
+guard_schedule = GuardScheduleIndex()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+ITS Member Dump Import Script
+Bulk loads a full jamaat export (JSON, NDJSON or CSV) into mumin_master
+
+Usage:
+    python import_mumin_dump.py members.json
+    python import_mumin_dump.py members.csv
+    python import_mumin_dump.py export.txt --format csv
+"""
+
+import argparse
+import sys
+import time
+
+from app.db import get_sync_db_connection
+from app.routers.mumin_sync import import_members_from_stream, detect_import_format
+
+# ANSI colors
+GREEN = '\033[92m'
+RED = '\033[91m'
+BLUE = '\033[94m'
+RESET = '\033[0m'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import an ITS member dump into mumin_master")
+    parser.add_argument("path", help="Path to the JSON / NDJSON / CSV export")
+    parser.add_argument("--format", choices=["json", "csv"], help="Override format detection")
+    args = parser.parse_args()
+    
+    fmt = detect_import_format(args.path, args.format)
+    print(f"{BLUE}Importing {args.path} as {fmt.upper()}...{RESET}")
+    
+    started = time.monotonic()
+    try:
+        with get_sync_db_connection() as conn, \
+                open(args.path, encoding="utf-8-sig", newline="") as stream:
+            counts = import_members_from_stream(conn, stream, fmt)
+    except Exception as e:
+        print(f"{RED}✗ Import failed: {str(e)}{RESET}")
+        return 1
+    
+    elapsed = time.monotonic() - started
+    print(f"{GREEN}✓ Import completed in {elapsed:.1f}s{RESET}")
+    for name, value in counts.items():
+        print(f"  {name:<10} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+-- 001_mumin_sync_jobs.sql
+-- Resumable member sync jobs (POST /Mumin/sync-jobs)
+--
+-- Apply with the app schema on the search path, e.g.
+--   PGOPTIONS="-c search_path=bg,public" psql -v ON_ERROR_STOP=1 -f migrations/001_mumin_sync_jobs.sql
+
+CREATE TABLE IF NOT EXISTS mumin_sync_job (
+    job_id SERIAL PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING',
+    total INTEGER NOT NULL DEFAULT 0,
+    chunk_size INTEGER NOT NULL,
+    concurrency INTEGER NOT NULL,
+    written INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    resumed_at TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS mumin_sync_job_item (
+    job_id INTEGER NOT NULL REFERENCES mumin_sync_job(job_id) ON DELETE CASCADE,
+    its_id VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING',
+    error TEXT,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (job_id, its_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_mumin_sync_job_item_pending
+    ON mumin_sync_job_item (job_id) WHERE status = 'PENDING';
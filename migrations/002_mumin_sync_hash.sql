@@ -0,0 +1,14 @@
+-- 002_mumin_sync_hash.sql
+-- Change-detection hash for member sync (skips no-op member updates)
+--
+-- ADD COLUMN takes an ACCESS EXCLUSIVE lock on mumin_master; adding a
+-- nullable column without a default is metadata-only, so the lock is
+-- brief, but apply this outside gate hours. lock_timeout makes it fail
+-- fast instead of queueing behind long reads.
+--
+-- Apply with the app schema on the search path, e.g.
+--   PGOPTIONS="-c search_path=bg,public" psql -v ON_ERROR_STOP=1 -f migrations/002_mumin_sync_hash.sql
+
+SET lock_timeout = '5s';
+
+ALTER TABLE mumin_master ADD COLUMN IF NOT EXISTS sync_hash VARCHAR(64);
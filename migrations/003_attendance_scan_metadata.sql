@@ -0,0 +1,15 @@
+-- 003_attendance_scan_metadata.sql
+-- Device scan time and scanner id for batched / offline attendance scans
+--
+-- Both columns are nullable without a default, so ADD COLUMN is
+-- metadata-only and the ACCESS EXCLUSIVE lock on attendance is brief;
+-- still apply this outside gate hours. lock_timeout makes it fail fast
+-- instead of queueing behind long reads.
+--
+-- Apply with the app schema on the search path, e.g.
+--   PGOPTIONS="-c search_path=bg,public" psql -v ON_ERROR_STOP=1 -f migrations/003_attendance_scan_metadata.sql
+
+SET lock_timeout = '5s';
+
+ALTER TABLE attendance ADD COLUMN IF NOT EXISTS scanned_at TIMESTAMP;
+ALTER TABLE attendance ADD COLUMN IF NOT EXISTS device_id VARCHAR(100);
@@ -0,0 +1,21 @@
+-- 004_api_idempotency_key.sql
+-- Stored responses for Idempotency-Key retries (IDEMPOTENCY_DB_FALLBACK=true)
+--
+-- Rows older than IDEMPOTENCY_TTL_SECONDS are deleted by the API's
+-- periodic cleanup; the created_at index keeps that delete cheap.
+--
+-- Apply with the app schema on the search path, e.g.
+--   PGOPTIONS="-c search_path=bg,public" psql -v ON_ERROR_STOP=1 -f migrations/004_api_idempotency_key.sql
+
+CREATE TABLE IF NOT EXISTS api_idempotency_key (
+    scope VARCHAR(50) NOT NULL,
+    user_id BIGINT NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    fingerprint CHAR(64) NOT NULL,
+    response JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (scope, user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotency_created_at
+    ON api_idempotency_key (created_at);
@@ -140,6 +140,61 @@ def check_login_function():
         print(f"   {YELLOW}Could not verify: {str(e)}{RESET}")
         return False
 
+# Objects created by migrations/*.sql: (description, information_schema query on the schema)
+MIGRATION_CHECKS = [
+    (
+        "001 mumin sync job tables",
+        "SELECT 1 FROM information_schema.tables WHERE table_schema = %s AND table_name = 'mumin_sync_job_item'",
+    ),
+    (
+        "002 mumin_master.sync_hash",
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = %s AND table_name = 'mumin_master' AND column_name = 'sync_hash'",
+    ),
+    (
+        "003 attendance.scanned_at/device_id",
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = %s AND table_name = 'attendance' AND column_name = 'device_id'",
+    ),
+    (
+        "004 api_idempotency_key table",
+        "SELECT 1 FROM information_schema.tables WHERE table_schema = %s AND table_name = 'api_idempotency_key'",
+    ),
+]
+
+def check_migrations():
+    """Check that every migration in migrations/ has been applied"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+        
+        import psycopg2
+        
+        conn_string = f"host={os.getenv('PG_HOST')} port={os.getenv('PG_PORT')} " \
+                     f"dbname={os.getenv('PG_DATABASE')} user={os.getenv('PG_USER')} " \
+                     f"password={os.getenv('PG_PASSWORD')}"
+        schema = os.getenv('PG_SCHEMA', 'bg')
+        
+        conn = psycopg2.connect(conn_string)
+        cursor = conn.cursor()
+        
+        all_ok = True
+        for description, query in MIGRATION_CHECKS:
+            cursor.execute(query, (schema,))
+            applied = cursor.fetchone() is not None
+            print_check(f"Migration {description}", applied)
+            all_ok = all_ok and applied
+        
+        cursor.close()
+        conn.close()
+        
+        if not all_ok:
+            print(f"   {YELLOW}Apply migrations/*.sql in order (see README){RESET}")
+        
+        return all_ok
+    except Exception as e:
+        print_check("Migration check", False)
+        print(f"   {YELLOW}Could not verify: {str(e)}{RESET}")
+        return False
+
 def check_app_structure():
     """Check if app directory structure is correct"""
     required_files = [
@@ -183,6 +238,7 @@ def main():
     print(f"\n{BOLD}Database Checks:{RESET}")
     checks.append(check_database_connection())
     checks.append(check_login_function())
+    checks.append(check_migrations())
     
     # Summary
     print_header("SUMMARY")
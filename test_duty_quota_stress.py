@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Concurrency Stress Test for Guard Duty Quota Enforcement
+
+Fires many parallel GuardDutyInsert calls at a single duty and checks that
+the number of successful assignments never exceeds the duty quota, then
+reports latency / throughput so runs can be compared over time.
+
+Setup:
+    1. Create a test duty with a small quota (e.g. 10) and note its duty_id
+    2. Set TEST_DUTY / TEST_GUARD_ITS_IDS below (more guards than the quota)
+    3. Run: python test_duty_quota_stress.py
+"""
+
+import requests
+import json
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BASE_URL = "http://localhost:8000/BURHANI_GUARDS_API_TEST/api"
+LOGIN_ENDPOINT = f"{BASE_URL}/Login/CheckLogin"
+GUARD_DUTY_INSERT_ENDPOINT = f"{BASE_URL}/Duty/GuardDutyInsert"
+
+# Test credentials
+TEST_USERNAME = "10001001"
+TEST_PASSWORD = "password"
+
+# Duty under test - quota must be smaller than the number of guards below
+TEST_DUTY = {
+    "duty_id": 1,
+    "team_id": 2,
+    "miqaat_id": 17,
+    "quota": 10
+}
+
+# Guards competing for the duty (one request each)
+TEST_GUARD_ITS_IDS: List[int] = list(range(10009000, 10009060))
+
+# Parallel assigners
+PARALLEL_ASSIGNERS = 60
+
+# ANSI color codes
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    CYAN = '\033[96m'
+    BOLD = '\033[1m'
+    RESET = '\033[0m'
+
+# ============================================================================
+# HELPER FUNCTIONS
+# ============================================================================
+
+def print_header(text: str):
+    """Print a formatted header"""
+    print(f"\n{Colors.BOLD}{Colors.CYAN}{'=' * 80}{Colors.RESET}")
+    print(f"{Colors.BOLD}{Colors.CYAN}{text:^80}{Colors.RESET}")
+    print(f"{Colors.BOLD}{Colors.CYAN}{'=' * 80}{Colors.RESET}\n")
+
+def print_success(message: str):
+    """Print a success message"""
+    print(f"{Colors.GREEN}✓ {message}{Colors.RESET}")
+
+def print_error(message: str):
+    """Print an error message"""
+    print(f"{Colors.RED}✗ {message}{Colors.RESET}")
+
+def print_info(message: str):
+    """Print an info message"""
+    print(f"  {message}")
+
+
+def login() -> Optional[str]:
+    """Login and get JWT token"""
+    try:
+        response = requests.post(
+            LOGIN_ENDPOINT,
+            json={"username": TEST_USERNAME, "password": TEST_PASSWORD},
+            timeout=10
+        )
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("success"):
+                return data["tokens"]["access_token"]
+        print_error(f"Login failed with status {response.status_code}: {response.text}")
+        return None
+    except Exception as ex:
+        print_error(f"Login exception: {str(ex)}")
+        return None
+
+
+def assign_guard(session: requests.Session, token: str, its_id: int) -> Dict[str, Any]:
+    """Send one GuardDutyInsert and return result code + latency"""
+    payload = {
+        "form_name": "QUOTA_STRESS_TEST",
+        "flag": "I",
+        "duty_id": TEST_DUTY["duty_id"],
+        "team_id": TEST_DUTY["team_id"],
+        "miqaat_id": TEST_DUTY["miqaat_id"],
+        "its_id": its_id
+    }
+    started = time.perf_counter()
+    try:
+        response = session.post(
+            GUARD_DUTY_INSERT_ENDPOINT,
+            json=payload,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=30
+        )
+        result = response.json().get("result") if response.status_code in (200, 201, 409) else None
+    except Exception:
+        result = None
+    return {"its_id": its_id, "result": result, "latency": time.perf_counter() - started}
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+def test_no_over_allocation(token: str) -> bool:
+    """All guards race for the duty; successes must not exceed the quota"""
+    print_header(f"{len(TEST_GUARD_ITS_IDS)} GUARDS / {PARALLEL_ASSIGNERS} PARALLEL ASSIGNERS")
+
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=PARALLEL_ASSIGNERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=PARALLEL_ASSIGNERS) as executor:
+            outcomes = list(executor.map(lambda i: assign_guard(session, token, i), TEST_GUARD_ITS_IDS))
+        elapsed = time.perf_counter() - started
+
+    assigned = [o for o in outcomes if o["result"] == 1]
+    quota_full = [o for o in outcomes if o["result"] == 5]
+    duplicates = [o for o in outcomes if o["result"] == 4]
+    errors = [o for o in outcomes if o["result"] not in (1, 4, 5)]
+    latencies = sorted(o["latency"] for o in outcomes)
+
+    print_info(f"Assigned (1):   {len(assigned)}")
+    print_info(f"Quota full (5): {len(quota_full)}")
+    print_info(f"Duplicate (4):  {len(duplicates)}")
+    print_info(f"Errors:         {len(errors)}")
+    print_info(f"Elapsed:        {elapsed:.2f}s ({len(outcomes) / elapsed:.1f} req/s)")
+    print_info(f"Latency p50:    {statistics.median(latencies) * 1000:.0f} ms")
+    print_info(f"Latency p95:    {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms")
+    print_info(f"Latency max:    {latencies[-1] * 1000:.0f} ms")
+
+    ok = True
+    if len(assigned) > TEST_DUTY["quota"]:
+        print_error(f"Over-allocation: {len(assigned)} assigned for quota {TEST_DUTY['quota']}")
+        ok = False
+    else:
+        print_success(f"No over-allocation ({len(assigned)} <= {TEST_DUTY['quota']})")
+
+    if errors:
+        print_error(f"{len(errors)} requests failed unexpectedly")
+        ok = False
+
+    return ok
+
+
+def main():
+    """Run the stress test"""
+    print_header("GUARD DUTY QUOTA STRESS TEST")
+    print(f"Base URL: {BASE_URL}")
+    print(f"Duty: {json.dumps(TEST_DUTY)}")
+    print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    token = login()
+    if not token:
+        print_error("Cannot proceed without authentication token")
+        return 1
+
+    passed = test_no_over_allocation(token)
+
+    print(f"\n{Colors.CYAN}Cleanup SQL:{Colors.RESET}")
+    print(f"""
+    UPDATE bg.guard_duties SET status = 0
+    WHERE duty_id = {TEST_DUTY['duty_id']}
+      AND its_id BETWEEN {min(TEST_GUARD_ITS_IDS)} AND {max(TEST_GUARD_ITS_IDS)};
+    """)
+
+    if passed:
+        print(f"\n{Colors.GREEN}{Colors.BOLD}🎉 STRESS TEST PASSED 🎉{Colors.RESET}")
+        return 0
+    print(f"\n{Colors.RED}{Colors.BOLD}❌ STRESS TEST FAILED{Colors.RESET}")
+    return 1
+
+
+if __name__ == "__main__":
+    exit(main())
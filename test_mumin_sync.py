@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Mumin Sync Test Script
+Checks that a member refresh keeps locally managed columns
+
+Runs upsert_members_batch - the write used by bulk sync and the
+background refresh scheduler - against one existing member inside a
+transaction that is rolled back, so the database is left unchanged.
+The stored sync_hash is cleared first, as on a member's first refresh,
+so the row is really rewritten.
+
+Setup:
+    1. Configure .env for the target database
+    2. Set TEST_ITS_ID below to an existing mumin_master member
+    3. Run: python test_mumin_sync.py
+"""
+
+import sys
+from datetime import datetime
+
+from psycopg2.extras import RealDictCursor
+
+from app.db import get_sync_db_connection
+from app.routers.mumin_sync import (
+    MEMBER_COLUMNS,
+    MEMBER_ITS_COLUMNS,
+    MEMBER_LOCAL_COLUMNS,
+    compute_member_hash,
+    upsert_members_batch
+)
+
+# Configuration
+TEST_ITS_ID = "10001001"
+
+# Values set on the member before the refresh; they must survive it
+LOCAL_MARKERS = {"team_id": 2, "role_id": 2, "position_id": 3}
+
+# Colors
+GREEN = '\033[92m'
+RED = '\033[91m'
+YELLOW = '\033[93m'
+BLUE = '\033[94m'
+RESET = '\033[0m'
+
+def print_header(text):
+    print(f"\n{BLUE}{'='*70}")
+    print(f"{text:^70}")
+    print(f"{'='*70}{RESET}\n")
+
+def print_success(msg):
+    print(f"{GREEN}✓ {msg}{RESET}")
+
+def print_error(msg):
+    print(f"{RED}✗ {msg}{RESET}")
+
+def print_info(msg):
+    print(f"{YELLOW}ℹ {msg}{RESET}")
+
+
+def test_update_columns():
+    """Local columns must never be in the ON CONFLICT update list"""
+    print_header("Test 1: Bulk Sync Update Columns")
+
+    overlap = sorted(set(MEMBER_ITS_COLUMNS) & set(MEMBER_LOCAL_COLUMNS))
+    if overlap:
+        print_error(f"Local columns overwritten by sync: {', '.join(overlap)}")
+        return False
+
+    print_success("Bulk sync only updates ITS columns")
+    return True
+
+
+def test_refresh_keeps_local_columns():
+    """Refresh an existing member and check team/role/position survive"""
+    print_header("Test 2: Refresh Keeps Team, Role and Position")
+
+    with get_sync_db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("SELECT * FROM mumin_master WHERE its_id::text = %s", (TEST_ITS_ID,))
+                member = cursor.fetchone()
+                if not member:
+                    print_error(f"Member {TEST_ITS_ID} not found - set TEST_ITS_ID")
+                    return False
+
+                cursor.execute(
+                    """
+                    UPDATE mumin_master
+                    SET team_id = %(team_id)s, role_id = %(role_id)s,
+                        position_id = %(position_id)s, sync_hash = NULL
+                    WHERE its_id::text = %(its_id)s
+                    """,
+                    {**LOCAL_MARKERS, "its_id": TEST_ITS_ID}
+                )
+
+            # Same shape transform_api_data produces, with its new-member defaults
+            row = {c: member.get(c) for c in MEMBER_COLUMNS}
+            row.update(team_id=-1, position_id=10, role_id=4, status=1, password="0000", pull_date=datetime.now())
+            row["sync_hash"] = compute_member_hash(row)
+
+            counts = upsert_members_batch(conn, [row], commit=False)
+            print_info(f"Upsert counts: {counts}")
+
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    "SELECT team_id, role_id, position_id, password, sync_hash FROM mumin_master WHERE its_id::text = %s",
+                    (TEST_ITS_ID,)
+                )
+                after = cursor.fetchone()
+        finally:
+            conn.rollback()
+
+    ok = True
+    for column, expected in LOCAL_MARKERS.items():
+        if after[column] == expected:
+            print_success(f"{column} kept ({expected})")
+        else:
+            print_error(f"{column} overwritten: expected {expected}, got {after[column]}")
+            ok = False
+
+    if after["password"] == member["password"]:
+        print_success("password kept")
+    else:
+        print_error("password overwritten")
+        ok = False
+
+    if after["sync_hash"] == row["sync_hash"]:
+        print_success("ITS data and sync_hash written")
+    else:
+        print_error("Row was not rewritten - sync_hash not updated")
+        ok = False
+
+    return ok
+
+
+def main():
+    results = [test_update_columns(), test_refresh_keeps_local_columns()]
+
+    print_header("SUMMARY")
+    passed = sum(results)
+    if passed == len(results):
+        print_success(f"All tests passed ({passed}/{len(results)})")
+        return 0
+    print_error(f"{len(results) - passed} test(s) failed ({passed}/{len(results)} passed)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())